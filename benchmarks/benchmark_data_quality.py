@@ -0,0 +1,129 @@
+"""Benchmark of the masterfile data quality rules on a large synthetic masterfile
+
+Builds a masterfile with the typed score, lesson and date columns of the real masterfile, with a known number of
+invalid rows for each rule, and times checking every rule. Run from the repository root, for example:
+
+    python -m benchmarks.benchmark_data_quality --rows 1000000
+"""
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+
+from rred_reports.validation import DATA_QUALITY_RULES, LESSON_COUNT_COLUMNS, log_data_quality_issues
+
+RESULT_COLUMNS = [column for rule in DATA_QUALITY_RULES for column in rule.columns if column.endswith("_result")]
+
+
+@dataclass
+class DataQualityBenchmark:
+    """Timings of a benchmark run"""
+
+    rows: int
+    seconds: float
+    issues: dict[str, int]
+
+    @property
+    def rows_per_second(self) -> float:
+        """Masterfile rows checked per second"""
+        return self.rows / self.seconds
+
+    def summary(self) -> str:
+        """Summary of the run for printing"""
+        issue_lines = [f"  {title}: {count} rows" for title, count in self.issues.items()]
+        return "\n".join(
+            [
+                f"rows checked:        {self.rows:,} against {len(DATA_QUALITY_RULES)} rules",
+                f"time:                {self.seconds:.3f}s",
+                f"rows/second:         {self.rows_per_second:,.0f}",
+                "issues found:",
+                *issue_lines,
+            ]
+        )
+
+
+def _scores(values: np.ndarray) -> pd.arrays.IntegerArray:
+    """Nullable integers, as the masterfile's score columns are read"""
+    return pd.arrays.IntegerArray(values.astype(np.int32), np.zeros(len(values), dtype=bool))
+
+
+def synthetic_masterfile(rows: int, invalid_rows: int = 10, seed: int = 0) -> pd.DataFrame:
+    """Masterfile of valid pupils, with blocks of rows breaking the score range, lesson count and exit date rules
+
+    Args:
+        rows (int): Number of rows
+        invalid_rows (int): Number of rows in each block
+        seed (int): Random seed
+
+    Returns:
+        pd.DataFrame: masterfile with the columns checked by the data quality rules
+    """
+    rng = np.random.default_rng(seed)
+    entry_date = pd.Timestamp("2021-09-01") + pd.to_timedelta(rng.integers(0, 200, rows), unit="D")
+    exit_date = entry_date + pd.to_timedelta(rng.integers(70, 140, rows), unit="D")
+    masterfile = pd.DataFrame(
+        {
+            "pupil_no": [f"{pupil}_2021-22" for pupil in range(rows)],
+            "rred_user_id": np.array([f"teacher_{teacher}" for teacher in range(5000)])[np.arange(rows) % 5000],
+            "school_id": np.array([f"RRS{school}" for school in range(2000)])[np.arange(rows) % 2000],
+            "entry_dob": entry_date - pd.to_timedelta(rng.integers(5 * 365, 7 * 365, rows), unit="D"),
+            "entry_date": entry_date,
+            "exit_date": exit_date,
+            "month3_testdate": exit_date + pd.to_timedelta(90, unit="D"),
+            "month6_testdate": exit_date + pd.to_timedelta(180, unit="D"),
+        }
+    )
+    for column in RESULT_COLUMNS:
+        masterfile[column] = _scores(rng.integers(0, 24, rows))
+    weeks = rng.integers(10, 20, rows)
+    masterfile["exit_num_weeks"] = _scores(weeks)
+    masterfile["exit_num_lessons"] = _scores(weeks * 4)
+    for column in LESSON_COUNT_COLUMNS[2:]:
+        masterfile[column] = _scores(rng.integers(0, 10, rows))
+
+    invalid_values = {
+        "entry_li_result": 55,
+        "exit_cap_result": 25,
+        "exit_hrsw_result": 38,
+        "month3_bas_result": 91,
+        "entry_bl_result": -1,
+        "entry_wt_result": -1,
+        "month6_wv_result": -1,
+        "exit_lessons_missed_ca": -1,
+    }
+    for block, (column, value) in enumerate(invalid_values.items()):
+        masterfile.loc[block * invalid_rows : (block + 1) * invalid_rows - 1, column] = value
+    masterfile.loc[masterfile.index[-invalid_rows:], "exit_date"] = masterfile["entry_date"].iloc[-invalid_rows:] - pd.Timedelta(days=1)
+    return masterfile
+
+
+def run_data_quality_benchmark(rows: int = 1_000_000) -> DataQualityBenchmark:
+    """Check every data quality rule against a synthetic masterfile, timing the check
+
+    Args:
+        rows (int): Number of masterfile rows
+
+    Returns:
+        DataQualityBenchmark: timing and issues found
+    """
+    masterfile = synthetic_masterfile(rows)
+    logger.disable("rred_reports.validation")
+    try:
+        start = time.perf_counter()
+        issues = log_data_quality_issues(masterfile)
+        seconds = time.perf_counter() - start
+    finally:
+        logger.enable("rred_reports.validation")
+    return DataQualityBenchmark(rows, seconds, {issue.title: len(issue.dataframe) for issue in issues})
+
+
+def main(rows: int = 1_000_000):
+    """Benchmark the masterfile data quality rules on a synthetic masterfile"""
+    typer.echo(run_data_quality_benchmark(rows).summary())
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,215 @@
+"""Benchmark of sending school report emails end to end, against a local stand-in mail server
+
+Runs `send_school` for a synthetic dispatch list and report directory, so that the number of workers and the batch
+size can be tuned without a real Exchange tenant or SMTP server. Run from the repository root, for example:
+
+    python -m benchmarks.benchmark_email --schools 500 --workers 8
+    python -m benchmarks.benchmark_email --schools 500 --workers 8 --batch-size 50
+    python -m benchmarks.benchmark_email --schools 500 --workers 8 --transport smtp
+"""
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import tomli_w
+import typer
+from dynaconf import Dynaconf
+
+from rred_reports.reports.emails import ReportEmailer
+from rred_reports.reports.interface import send_school
+from rred_reports.reports.transports import SmtpTransport, TransportType
+from tests.fixtures.test_mail_standin import EwsStandIn, SmtpStandIn
+
+BENCHMARK_YEAR = 2099
+
+
+@dataclass
+class EmailBenchmark:
+    """Timings of a benchmark run"""
+
+    messages: int
+    total_seconds: float
+    send_seconds: float
+    bytes_sent: int
+    # Requests to Exchange, or connections to the SMTP server
+    requests: int
+    latencies: list[float] = field(repr=False)
+
+    @property
+    def messages_per_second(self) -> float:
+        """Emails sent per second, from the first email starting to send to the last being accepted"""
+        return self.messages / self.send_seconds
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Seconds taken to send an email, at a percentile of all the emails sent"""
+        return float(np.percentile(self.latencies, percentile))
+
+    def summary(self) -> str:
+        """Summary of the run for printing"""
+        return "\n".join(
+            [
+                f"messages sent:       {self.messages} over {self.requests} requests or connections",
+                f"total time:          {self.total_seconds:.2f}s, including reading the dispatch list",
+                f"send time:           {self.send_seconds:.2f}s",
+                f"messages/second:     {self.messages_per_second:.1f}",
+                f"latency p50/p95/p99: {self.latency_percentile(50) * 1000:.0f}/"
+                f"{self.latency_percentile(95) * 1000:.0f}/{self.latency_percentile(99) * 1000:.0f} ms",
+                f"bytes sent:          {self.bytes_sent:,}",
+            ]
+        )
+
+
+def write_synthetic_inputs(top_level_dir: Path, school_count: int, report_kb: int) -> Path:
+    """Write a dispatch list, report config and a report for each school
+
+    Args:
+        top_level_dir (Path): Directory to write the inputs to
+        school_count (int): Number of schools
+        report_kb (int): Size of each report in KB
+
+    Returns:
+        Path: report config file
+    """
+    school_ids = [f"BENCH{number:05d}" for number in range(school_count)]
+    dispatch_list = pd.DataFrame(
+        {
+            "School Label": [f"Benchmark School {school_id}" for school_id in school_ids],
+            "RRED School ID": school_ids,
+            "Email": [f"teacher.{school_id.lower()}@example.org" for school_id in school_ids],
+            "TL Email": [f"leader.{school_id.lower()}@example.org" for school_id in school_ids],
+        }
+    )
+    dispatch_list.to_excel(top_level_dir / "dispatch_list.xlsx", index=False)
+
+    report_dir = top_level_dir / "output" / "reports" / str(BENCHMARK_YEAR) / "schools"
+    report_dir.mkdir(parents=True)
+    report = b"%PDF-1.4\n" + bytes(report_kb * 1024)
+    for school_id in school_ids:
+        (report_dir / f"report_{school_id}.pdf").write_bytes(report)
+
+    config_file = top_level_dir / "report_config.toml"
+    year_config = {"dispatch_list": "dispatch_list.xlsx", "masterfile": "unused", "template": "unused"}
+    config_file.write_text(tomli_w.dumps({"school": {str(BENCHMARK_YEAR): year_config}}))
+    return config_file
+
+
+@contextmanager
+def _timed_sends(latencies: list[float], send_window: list[float]):
+    """Record the time taken by each email sent, and the time from the first send starting to the last finishing"""
+    send_email = ReportEmailer.send_email
+    send_emails = ReportEmailer.send_emails
+    send_smtp_batch = SmtpTransport.send_batch
+    lock = threading.Lock()
+
+    def record(start: float, messages: int) -> None:
+        end = time.perf_counter()
+        with lock:
+            latencies.extend([end - start] * messages)
+            send_window[0] = min(send_window[0], start)
+            send_window[1] = max(send_window[1], end)
+
+    def timed_send_email(message, save=True):
+        start = time.perf_counter()
+        result = send_email(message, save)
+        record(start, 1)
+        return result
+
+    def timed_send_emails(account, messages, save=True, chunk_size=None):
+        start = time.perf_counter()
+        errors = send_emails(account, messages, save, chunk_size)
+        record(start, len(messages))
+        return errors
+
+    def timed_send_smtp_batch(transport, messages):
+        start = time.perf_counter()
+        errors = send_smtp_batch(transport, messages)
+        record(start, len(messages))
+        return errors
+
+    with patch.object(ReportEmailer, "send_email", staticmethod(timed_send_email)), patch.object(
+        ReportEmailer, "send_emails", staticmethod(timed_send_emails)
+    ), patch.object(SmtpTransport, "send_batch", timed_send_smtp_batch):
+        yield
+
+
+def run_email_benchmark(
+    top_level_dir: Path,
+    school_count: int = 200,
+    workers: int = 4,
+    batch_size: Optional[int] = None,
+    response_delay: float = 0.05,
+    report_kb: int = 64,
+    transport: TransportType = TransportType.EWS,
+) -> EmailBenchmark:
+    """Send an email to every synthetic school through a stand-in Exchange server, timing each email
+
+    Args:
+        top_level_dir (Path): Empty directory for the synthetic inputs
+        school_count (int): Number of schools
+        workers (int): Maximum number of emails or batches being sent at once
+        batch_size (Optional[int]): Number of emails in each request, one request per email if not given
+        response_delay (float): Seconds the stand-in server takes to accept each request
+        report_kb (int): Size of each report in KB
+        transport (TransportType): Mail server backend to send through
+
+    Returns:
+        EmailBenchmark: timings of the run
+    """
+    config_file = write_synthetic_inputs(top_level_dir, school_count, report_kb)
+    if transport == TransportType.SMTP:
+        standin = SmtpStandIn(response_delay=response_delay)
+        standin.start()
+        session = None
+        smtp_settings = {"host": standin.host, "port": standin.port}
+    else:
+        standin = EwsStandIn(response_delay=response_delay)
+        standin.start()
+        session = SimpleNamespace(account=standin.account(max_connections=workers))
+        smtp_settings = {}
+    settings = Dynaconf(MAIL_TRANSPORT=transport.value, SEND_EMAILS_AS="rred-sender@example.org", SMTP=smtp_settings)
+    latencies = []
+    send_window = [float("inf"), float("-inf")]
+    try:
+        with patch("rred_reports.reports.interface.ExchangeSession", return_value=session), patch(
+            "rred_reports.reports.interface.get_settings", return_value=settings
+        ), _timed_sends(latencies, send_window):
+            start = time.perf_counter()
+            outcomes = send_school(
+                BENCHMARK_YEAR,
+                config_file=config_file,
+                top_level_dir=top_level_dir,
+                workers=workers,
+                messages_per_minute=float("inf"),
+                batch_size=batch_size,
+            )
+            total_seconds = time.perf_counter() - start
+    finally:
+        standin.stop()
+    requests = standin.connections if transport == TransportType.SMTP else standin.create_requests
+    return EmailBenchmark(len(outcomes), total_seconds, send_window[1] - send_window[0], standin.bytes_received, requests, latencies)
+
+
+def main(
+    schools: int = 200,
+    workers: int = 4,
+    batch_size: Optional[int] = None,
+    response_delay: float = 0.05,
+    report_kb: int = 64,
+    transport: TransportType = TransportType.EWS,
+):
+    """Benchmark sending school report emails against a local stand-in mail server"""
+    with tempfile.TemporaryDirectory() as top_level_dir:
+        benchmark = run_email_benchmark(Path(top_level_dir), schools, workers, batch_size, response_delay, report_kb, transport)
+    typer.echo(benchmark.summary())
+
+
+if __name__ == "__main__":
+    typer.run(main)
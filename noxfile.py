@@ -39,6 +39,24 @@ def tests(session: nox.Session) -> None:
     session.run("pytest", *session.posargs)
 
 
+@nox.session
+def benchmark_email(session: nox.Session) -> None:
+    """
+    Benchmark sending emails against a local stand-in Exchange server.
+    """
+    session.install(".[test]")
+    session.run("python", "-m", "benchmarks.benchmark_email", *session.posargs)
+
+
+@nox.session
+def benchmark_data_quality(session: nox.Session) -> None:
+    """
+    Benchmark the masterfile data quality rules on a large synthetic masterfile.
+    """
+    session.install(".[test]")
+    session.run("python", "-m", "benchmarks.benchmark_data_quality", *session.posargs)
+
+
 @nox.session
 def coverage(session: nox.Session) -> None:
     """
@@ -12,9 +12,10 @@ __all__ = ("__version__", "get_config", "get_report_year_files", "ReportType")
 from enum import Enum
 from pathlib import Path
 
-import tomli
 from loguru import logger
 
+from rred_reports.input_cache import load_toml_cached
+
 
 class ReportType(str, Enum):
     """ReportType class
@@ -28,7 +29,7 @@ class ReportType(str, Enum):
 
 
 def get_config(config_toml: Path) -> dict:
-    """Load a toml config file
+    """Load a toml config file, reusing it while the file is unchanged
 
     Args:
         config_toml (Path): Path to config file
@@ -37,8 +38,7 @@ def get_config(config_toml: Path) -> dict:
         dict: Dictionary of config data
     """
     try:
-        with config_toml.open(mode="rb") as config_file:
-            return tomli.load(config_file)
+        return load_toml_cached(config_toml)
     except FileNotFoundError as error:
         logger.error(f"No report generation config file found at {config_toml}. Exiting.")
         raise error
@@ -2,9 +2,10 @@
 from pathlib import Path
 from typing import Optional
 
-import numpy as np
 import pandas as pd
 
+from rred_reports.input_cache import read_excel_cached
+
 
 class DispatchListException(Exception):
     """Exception for dispatch list processing"""
@@ -21,7 +22,7 @@ def get_unique_schools(dispatch_path: Path) -> pd.DataFrame:
     Raises:
         DispatchListException: Non-unique school name found
     """
-    dispatch_list = pd.read_excel(dispatch_path)
+    dispatch_list = read_excel_cached(dispatch_path)
     schools = dispatch_list.loc[:, ["School Label", "RRED School ID"]]
     schools.rename({"School Label": "School Name"}, axis=1, inplace=True)
     unique_schools = schools.drop_duplicates()
@@ -48,74 +49,109 @@ def _raise_if_school_duplicated(schools) -> None:
         raise DispatchListException(message)
 
 
+class DispatchDirectory:
+    """Mailing information for every school in a dispatch list, read once and looked up by exact school ID
+
+    The teacher emails and then the teacher leader emails for each school become its mailing list, so a school with
+    no teacher email is sent to its teacher leader.
+    """
+
+    def __init__(self, dispatch_df: pd.DataFrame):
+        """
+        Args:
+            dispatch_df (pd.DataFrame): Dispatch list, with "RRED School ID", "School Label", "Email" and "TL Email" columns
+        """
+        dispatch_df = dispatch_df.loc[~dispatch_df["RRED School ID"].isna()]
+        school_ids = dispatch_df["RRED School ID"].astype(str).str.strip()
+        self._school_ids = set(school_ids)
+
+        # Teacher emails may be entered on separate rows, so each row gives one teacher and one teacher leader contact
+        contacts = pd.concat(
+            [
+                pd.DataFrame({"school_id": school_ids, "school_label": dispatch_df["School Label"], "address": dispatch_df[column]})
+                for column in ["Email", "TL Email"]
+            ],
+            ignore_index=True,
+        )
+        contacts = contacts.loc[~contacts["address"].isna()]
+        # Remove any space-delimited lists and replace with comma separated
+        contacts["address"] = contacts["address"].astype(str).str.rstrip(" ").str.replace(" ", ",", regex=False).str.replace(",,", ",", regex=False)
+
+        school_contacts = contacts.groupby("school_id", sort=False)
+        self._mailing_lists: dict[str, list[str]] = school_contacts["address"].agg(list).to_dict()
+        self._school_labels: dict[str, str] = contacts.drop_duplicates("school_id").set_index("school_id")["school_label"].to_dict()
+        label_counts = school_contacts["school_label"].nunique(dropna=False)
+        self._multiple_labels = set(label_counts.index[label_counts > 1])
+
+    @classmethod
+    def from_excel(cls, dispatch_list: Path) -> "DispatchDirectory":
+        """Read a dispatch list excel file
+
+        Args:
+            dispatch_list (Path): Path to dispatch list excel file
+
+        Returns:
+            DispatchDirectory: Mailing information for every school in the dispatch list
+        """
+        return cls(read_excel_cached(dispatch_list))
+
+    def __contains__(self, rred_school_id: str) -> bool:
+        return rred_school_id in self._school_ids
+
+    def __len__(self) -> int:
+        return len(self._school_ids)
+
+    def mailing_info(self, rred_school_id: str, override_mailto: Optional[str] = None) -> dict:
+        """Obtain the mailing info for a single school ID
+
+        Args:
+            rred_school_id (str): RRED School ID
+            override_mailto (str, optional): Email address to override for each school, for use in manual testing and UAT
+
+        Raises:
+            DispatchListException: If the school isn't in the dispatch list, has no contact email, has several school labels
+                or has an email containing a comma
+
+        Returns:
+            dict: Dictionary containing mailing information for a single school
+        """
+        if rred_school_id not in self._school_ids:
+            message = f"School not found in dispatch list: {rred_school_id}. Try deleting all output reports and generating them again"
+            raise DispatchListException(message)
+
+        if rred_school_id not in self._mailing_lists:
+            message = f"Missing contact ID for school with RRED ID: '{rred_school_id}'. Exiting."
+            raise DispatchListException(message)
+
+        if rred_school_id in self._multiple_labels:
+            message = "Multiple school labels in resulting DataFrame"
+            raise DispatchListException(message)
+
+        mailing_list = list(self._mailing_lists[rred_school_id])
+        if any("," in email for email in mailing_list):
+            message = f"Comma found in at least one of the emails {mailing_list}"
+            raise DispatchListException(message)
+
+        if override_mailto:
+            mailing_list = [override_mailto]
+
+        return {"rred_school_id": rred_school_id, "school_label": self._school_labels[rred_school_id], "mailing_list": mailing_list}
+
+
 def get_mailing_info(rred_school_id: str, dispatch_list: Path, override_mailto: Optional[str] = None) -> dict:
     """Obtain the mailing info for a single school ID, emailing the teacher and teacher leader for each school
 
+    Reads the whole dispatch list, so use a `DispatchDirectory` to look up many schools.
+
     Args:
         rred_school_id (str): RRED School ID
         dispatch_list (Path): Path to dispatch list excel file
         override_mailto (str, optional): Email address to override for each school, for use in manual testing and UAT
 
     Raises:
-        ReportDispatchException: If no contact email is found
+        DispatchListException: If the school or a contact email for it isn't found
 
     Returns:
         dict: Dictionary containing mailing information for a single school
     """
-
-    dispatch_df = pd.read_excel(dispatch_list)
-
-    # pare down the DF
-    dispatch_df = dispatch_df.loc[dispatch_df["RRED School ID"].str.match(rred_school_id)]
-    dispatch_df = dispatch_df.loc[:, ["RRED School ID", "School Label", "Email", "TL Email"]]
-
-    # School doesn't exist in dispatch list
-    if len(dispatch_df) == 0:
-        message = f"School not found in dispatch list: {rred_school_id}. Try deleting all output reports and generating them again"
-        raise DispatchListException(message)
-
-    # Find no teacher email instance - replace with TL if that exists
-
-    dispatch_df.loc[:, "Mailing List"] = np.nan
-    teacher_leader_dispatch = dispatch_df.copy()
-    teacher_leader_dispatch.loc[~dispatch_df["TL Email"].isna(), "Mailing List"] = teacher_leader_dispatch["TL Email"]
-    dispatch_df.loc[(~dispatch_df["Email"].isna()), "Mailing List"] = dispatch_df["Email"]
-    teacher_and_leader_dispatch = pd.concat([dispatch_df, teacher_leader_dispatch], axis=0, ignore_index=True)
-    teacher_and_leader_dispatch = teacher_and_leader_dispatch[~teacher_and_leader_dispatch["Mailing List"].isna()]
-
-    # Drop report schools with no dispatch emails
-    try:
-        assert len(teacher_and_leader_dispatch) > 0
-    except AssertionError as error:
-        message = f"Missing contact ID for school with RRED ID: '{rred_school_id}'. Exiting."
-        raise DispatchListException(message) from error
-
-    # Case 2: Find instances of multiple teacher emails
-    # Remove any space-delimited lists and replace with comma separated
-    cleaned_mailing_list = teacher_and_leader_dispatch.loc[:, "Mailing List"].str.rstrip(" ").str.replace(" ", ",").str.replace(",,", ",")
-    teacher_and_leader_dispatch.loc[:, "Mailing List"] = cleaned_mailing_list
-    mailing_info = teacher_and_leader_dispatch.loc[:, ["RRED School ID", "School Label", "Mailing List"]]
-
-    # Teacher emails may be entered on separate rows, in which case this DF will have multiple rows
-
-    try:
-        assert len(mailing_info["School Label"].unique()) == 1
-    except AssertionError as error:
-        message = "Multiple school labels in resulting DataFrame"
-        raise DispatchListException(message) from error
-
-    school_id = mailing_info["RRED School ID"].unique()[0]
-    school_label = mailing_info["School Label"].tolist()[0]
-    mailing_list = mailing_info["Mailing List"].str.rstrip(",").tolist()
-    mailing_list = mailing_info["Mailing List"].tolist()
-
-    if any("," in email for email in mailing_list):
-        message = f"Comma found in at least one of the emails {mailing_list}"
-        raise DispatchListException(message)
-
-    if override_mailto:
-        mailing_list = [override_mailto]
-
-    mailing_info = {"rred_school_id": school_id, "school_label": school_label, "mailing_list": mailing_list}
-
-    return mailing_info
+    return DispatchDirectory.from_excel(dispatch_list).mailing_info(rred_school_id, override_mailto)
@@ -0,0 +1,151 @@
+"""Process-wide cache of loaded input files, such as the dispatch list and report config
+
+Several steps of a command read the same inputs, so each file is only parsed once and reused until it changes on disk.
+A file is treated as changed when its modification time or size changes. Excel files can also be cached in a sidecar
+file next to them, so that a later command skips parsing the excel file until it changes. The sidecar is JSON rather
+than a pickle, so that reading a sidecar that has been changed can't run code.
+"""
+import copy
+import io
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pandas as pd
+import tomli
+from loguru import logger
+
+from rred_reports.config import settings
+
+# Increase when the sidecar's contents change, so older sidecars are ignored
+SIDECAR_FORMAT = 2
+
+_cache: dict[tuple[str, Path], tuple[tuple[int, int], Any]] = {}
+_lock = threading.Lock()
+
+
+def _fingerprint(path: Path) -> tuple[int, int]:
+    """Modification time and size of a file, raising FileNotFoundError if it doesn't exist"""
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cached(kind: str, path: Path, load: Callable[[Path, tuple[int, int]], Any]) -> Any:
+    """Value loaded from a file, loading it again only if the file has changed since it was cached"""
+    key = (kind, path.resolve())
+    fingerprint = _fingerprint(path)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    value = load(path, fingerprint)
+    with _lock:
+        _cache[key] = (fingerprint, value)
+    return value
+
+
+def clear_input_cache() -> None:
+    """Forget every cached file, so that each is read again on next use"""
+    with _lock:
+        _cache.clear()
+
+
+def sidecar_path(path: Path) -> Path:
+    """Sidecar file caching a parsed excel file
+
+    Args:
+        path (Path): path to excel file
+
+    Returns:
+        Path: hidden file next to the excel file
+    """
+    return path.parent / f".{path.name}.cache.json"
+
+
+def _read_sidecar(path: Path, fingerprint: tuple[int, int]) -> Optional[pd.DataFrame]:
+    """Data in an up to date sidecar, or None if the sidecar is missing, out of date or unreadable"""
+    try:
+        with sidecar_path(path).open(mode="r", encoding="utf-8") as handle:
+            sidecar = json.load(handle)
+        if (
+            sidecar.get("fingerprint") != list(fingerprint)
+            or sidecar.get("pandas_version") != pd.__version__
+            or sidecar.get("format") != SIDECAR_FORMAT
+        ):
+            return None
+        return pd.read_json(io.StringIO(sidecar["data"]), orient="table")
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError, AttributeError) as error:
+        logger.warning("Ignoring unreadable cache file for {path}: {error}", path=path, error=error)
+        return None
+
+
+def _write_sidecar(path: Path, fingerprint: tuple[int, int], data: pd.DataFrame) -> None:
+    """Write the sidecar, replacing any old one in a single step so that it is never partly written"""
+    temp_path = sidecar_path(path).with_suffix(f".{os.getpid()}.tmp")
+    try:
+        sidecar = {"fingerprint": list(fingerprint), "pandas_version": pd.__version__, "format": SIDECAR_FORMAT, "data": data.to_json(orient="table")}
+        with temp_path.open(mode="w", encoding="utf-8") as handle:
+            json.dump(sidecar, handle)
+        temp_path.replace(sidecar_path(path))
+    except ValueError as error:
+        # Data that can't be stored as a JSON table, such as duplicate column names, is only cached in memory
+        logger.warning("Couldn't cache {path} in a cache file: {error}", path=path, error=error)
+    except OSError as error:
+        logger.warning("Couldn't write cache file for {path}: {error}", path=path, error=error)
+        temp_path.unlink(missing_ok=True)
+
+
+def read_excel_cached(path: Path, sidecar: Optional[bool] = None) -> pd.DataFrame:
+    """Read the first sheet of an excel file, reusing the data while the file is unchanged
+
+    Args:
+        path (Path): path to excel file
+        sidecar (Optional[bool]): Also cache the data in a sidecar file next to the excel file, for later commands to
+            reuse. Defaults to the `input_cache_sidecar` setting
+
+    Raises:
+        FileNotFoundError: If the excel file doesn't exist
+
+    Returns:
+        pd.DataFrame: copy of the excel data, which the caller is free to change
+    """
+    if sidecar is None:
+        sidecar = settings.get("input_cache_sidecar", False)
+
+    def load(excel_path: Path, fingerprint: tuple[int, int]) -> pd.DataFrame:
+        if sidecar:
+            data = _read_sidecar(excel_path, fingerprint)
+            if data is not None:
+                logger.debug("Read {path} from its cache file", path=excel_path)
+                return data
+        data = pd.read_excel(excel_path)
+        if sidecar:
+            _write_sidecar(excel_path, fingerprint, data)
+        return data
+
+    return _cached("excel", path, load).copy()
+
+
+def load_toml_cached(path: Path) -> dict:
+    """Load a toml file, reusing the data while the file is unchanged
+
+    Args:
+        path (Path): path to toml file
+
+    Raises:
+        FileNotFoundError: If the toml file doesn't exist
+
+    Returns:
+        dict: copy of the toml data, which the caller is free to change
+    """
+
+    def load(toml_path: Path, _fingerprint: tuple[int, int]) -> dict:
+        with toml_path.open(mode="rb") as toml_file:
+            return tomli.load(toml_file)
+
+    return copy.deepcopy(_cached("toml", path, load))
@@ -0,0 +1,191 @@
+"""On-disk store of the processed masterfile, partitioned by school
+
+Reading and processing the full masterfile is slow, so the processed masterfile is stored next to it with one file
+per school. Regenerating a few schools' reports then only loads those schools' rows. The store is rebuilt whenever
+the masterfile, package version or pandas version changes.
+
+School files are pickled, so the hash of each is recorded when the store is built and checked before it is loaded,
+as unpickling a file that has been changed could run arbitrary code.
+
+Functions taking a `masterfile_hash` use it in place of hashing the masterfile again, so that callers that have
+already hashed the masterfile only do so once.
+"""
+import hashlib
+import io
+import json
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from loguru import logger
+
+from rred_reports import __version__
+from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports.reports.manifest import file_hash
+
+STORE_METADATA_FILE = "store.json"
+# Increase when the store's layout or metadata changes, so older stores are rebuilt
+STORE_FORMAT = 3
+
+
+def masterfile_store_dir(masterfile_path: Path) -> Path:
+    """Directory of the school-partitioned store for a masterfile
+
+    Args:
+        masterfile_path (Path): path to masterfile
+
+    Returns:
+        Path: store directory, next to the masterfile
+    """
+    return masterfile_path.parent / f".{masterfile_path.stem}_by_school"
+
+
+def _store_fingerprint(masterfile_hash: str) -> dict:
+    """Inputs that the store was built from, the store is rebuilt if any of these change"""
+    return {"masterfile_hash": masterfile_hash, "version": __version__, "pandas_version": pd.__version__, "format": STORE_FORMAT}
+
+
+def build_masterfile_store(processed_data: pd.DataFrame, masterfile_path: Path, masterfile_hash: Optional[str] = None) -> Path:
+    """Write the processed masterfile to the store, with one file for each school
+
+    Args:
+        processed_data (pd.DataFrame): processed masterfile
+        masterfile_path (Path): path to the masterfile it was processed from
+        masterfile_hash (Optional[str]): hash of the masterfile, hashed here if not given
+
+    Returns:
+        Path: store directory
+    """
+    if masterfile_hash is None:
+        masterfile_hash = file_hash(masterfile_path)
+    store_dir = masterfile_store_dir(masterfile_path)
+    if store_dir.exists():
+        shutil.rmtree(store_dir)
+    store_dir.mkdir(parents=True)
+
+    partitions = {}
+    partition_hashes = {}
+    row_counts = {}
+    for index, (school_id, school_rows) in enumerate(processed_data.groupby("school_id", sort=True)):
+        partition_file = f"school_{index}.pkl"
+        school_rows.to_pickle(store_dir / partition_file)
+        partitions[school_id] = partition_file
+        partition_hashes[partition_file] = file_hash(store_dir / partition_file)
+        row_counts[school_id] = len(school_rows)
+
+    metadata = {**_store_fingerprint(masterfile_hash), "schools": partitions, "partition_hashes": partition_hashes, "row_counts": row_counts}
+    # metadata is written last, so an interrupted build is treated as out of date
+    (store_dir / STORE_METADATA_FILE).write_text(json.dumps(metadata, indent=2, sort_keys=True))
+    logger.info("Masterfile store for {schools} schools written to {store_dir}", schools=len(partitions), store_dir=store_dir)
+    return store_dir
+
+
+def _read_store_metadata(masterfile_path: Path, masterfile_hash: str) -> dict:
+    """Metadata of an up to date store, or an empty dict if the store is missing or out of date"""
+    metadata_path = masterfile_store_dir(masterfile_path) / STORE_METADATA_FILE
+    if not metadata_path.exists():
+        return {}
+    metadata = json.loads(metadata_path.read_text())
+    if any(metadata.get(key) != value for key, value in _store_fingerprint(masterfile_hash).items()):
+        return {}
+    return metadata
+
+
+def update_masterfile_store(processed_data: pd.DataFrame, masterfile_path: Path, masterfile_hash: Optional[str] = None) -> None:
+    """Rebuild the store from an already processed masterfile if the store is missing or out of date
+
+    Args:
+        processed_data (pd.DataFrame): processed masterfile
+        masterfile_path (Path): path to the masterfile it was processed from
+        masterfile_hash (Optional[str]): hash of the masterfile, hashed here if not given
+    """
+    if masterfile_hash is None:
+        masterfile_hash = file_hash(masterfile_path)
+    if not _read_store_metadata(masterfile_path, masterfile_hash):
+        build_masterfile_store(processed_data, masterfile_path, masterfile_hash)
+
+
+def _load_store_metadata(masterfile_path: Path, masterfile_hash: Optional[str], rebuild: bool = False) -> dict:
+    """Metadata of the store, building the store first if it is missing, out of date or `rebuild` is set"""
+    if not masterfile_path.exists():
+        logger.error(f"No processed data file found at {masterfile_path}. Exiting.")
+        raise FileNotFoundError(masterfile_path)
+    if masterfile_hash is None:
+        masterfile_hash = file_hash(masterfile_path)
+
+    metadata = {} if rebuild else _read_store_metadata(masterfile_path, masterfile_hash)
+    if metadata:
+        return metadata
+    logger.info("Building school masterfile store for {masterfile}", masterfile=masterfile_path)
+    build_masterfile_store(read_and_process_masterfile(masterfile_path), masterfile_path, masterfile_hash)
+    return _read_store_metadata(masterfile_path, masterfile_hash)
+
+
+def school_row_counts(masterfile_path: Path, masterfile_hash: Optional[str] = None) -> dict[str, int]:
+    """Number of processed masterfile rows for each school, building the store first if it is missing or out of date
+
+    Args:
+        masterfile_path (Path): path to masterfile
+        masterfile_hash (Optional[str]): hash of the masterfile, hashed here if not given
+
+    Raises:
+        FileNotFoundError: If the masterfile doesn't exist
+
+    Returns:
+        dict[str, int]: row count for each school ID
+    """
+    return _load_store_metadata(masterfile_path, masterfile_hash)["row_counts"]
+
+
+def _read_partitions(store_dir: Path, metadata: dict, school_ids: list[str]) -> Optional[list[pd.DataFrame]]:
+    """Unpickle the files of schools in the store, if their contents match the hashes recorded when the store was built
+
+    Each file is read once, then checked and unpickled from the bytes read, so it can't be changed in between.
+
+    Returns:
+        Optional[list[pd.DataFrame]]: rows of each school, or None if any file doesn't match its recorded hash
+    """
+    partitions = []
+    for partition_file in [metadata["schools"][school_id] for school_id in school_ids if school_id in metadata["schools"]]:
+        partition_bytes = (store_dir / partition_file).read_bytes()
+        if hashlib.sha256(partition_bytes).hexdigest() != metadata["partition_hashes"].get(partition_file):
+            logger.warning("Masterfile store file {file} has changed since the store was built", file=store_dir / partition_file)
+            return None
+        partitions.append(pd.read_pickle(io.BytesIO(partition_bytes)))
+    return partitions
+
+
+def load_school_rows(masterfile_path: Path, school_ids: list[str], masterfile_hash: Optional[str] = None) -> pd.DataFrame:
+    """Load the processed masterfile rows for the given schools, building the store first if it is missing or out of date
+
+    If any school file doesn't match the hash recorded when the store was built, the store is rebuilt from the masterfile.
+
+    Args:
+        masterfile_path (Path): path to masterfile
+        school_ids (list[str]): schools to load
+        masterfile_hash (Optional[str]): hash of the masterfile, hashed here if not given
+
+    Raises:
+        FileNotFoundError: If the masterfile doesn't exist
+        ValueError: If a school file still doesn't match its hash after rebuilding the store
+
+    Returns:
+        pd.DataFrame: processed masterfile rows for the schools that were found
+    """
+    metadata = _load_store_metadata(masterfile_path, masterfile_hash)
+    missing_schools = [school_id for school_id in school_ids if school_id not in metadata["schools"]]
+    if missing_schools:
+        logger.warning("No masterfile data found for schools: {schools}", schools=missing_schools)
+
+    store_dir = masterfile_store_dir(masterfile_path)
+    school_rows = _read_partitions(store_dir, metadata, school_ids)
+    if school_rows is None:
+        metadata = _load_store_metadata(masterfile_path, metadata["masterfile_hash"], rebuild=True)
+        school_rows = _read_partitions(store_dir, metadata, school_ids)
+    if school_rows is None:
+        message = f"Masterfile store files changed while being loaded: {store_dir}"
+        raise ValueError(message)
+    if not school_rows:
+        return pd.DataFrame()
+    return pd.concat(school_rows)
@@ -6,7 +6,8 @@ import typer
 from rred_reports import get_config
 from rred_reports.masterfile import write_to_excel
 from rred_reports.redcap.main import ExtractInput, RedcapReader
-from rred_reports.validation import log_school_id_inconsistencies, write_issues_if_exist
+from rred_reports.reports.manifest import file_hash
+from rred_reports.validation import check_data_quality, check_school_ids
 
 top_level_dir = Path(__file__).resolve().parents[3]
 
@@ -47,13 +48,14 @@ def extract(
         f"{year - 1}-{str(year)[-2:]}",
     )
     long_data = parser.read_redcap_data(current_year, previous_year)
-    issues = log_school_id_inconsistencies(long_data, dispatch_path, year)
-    output_file = output_dir / "issues" / f"{current_period}school_id_issues.xlsx"
-    write_issues_if_exist(issues, output_file)
-
     output_file = output_dir / "processed" / f"masterfile_{current_period}.xlsx"
     write_to_excel(long_data, output_file)
 
+    issues_file = output_dir / "issues" / f"{current_period}school_id_issues.xlsx"
+    masterfile_hash = file_hash(output_file)
+    check_school_ids(long_data, masterfile_hash, dispatch_path, year, issues_file)
+    check_data_quality(long_data, masterfile_hash, output_dir / "issues" / f"{current_period}data_quality_issues.xlsx")
+
     typer.echo(f"Output written to: {output_file}")
 
 
@@ -1,6 +1,9 @@
 """Mail server authentication"""
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Optional
 from urllib import parse
 
 import click
@@ -18,6 +21,8 @@ from oauthlib.oauth2 import OAuth2Token
 from rred_reports.reports import get_settings
 
 CACHE_PATH = Path("my_cache.bin")
+# Refresh the access token when it has less than this many seconds left, so that it can't expire during a send
+TOKEN_REFRESH_MARGIN = 300
 
 
 @dataclass
@@ -68,39 +73,112 @@ class RREDAuthenticator:
         query_data["state"] = query_data["state"][0]
         return query_data
 
-    def get_credentials(self) -> OAuth2AuthorizationCodeCredentials:
+    def acquire_token(self) -> dict:
+        """Acquire an access token, from the token cache if it holds a valid token
+
+        Returns:
+            dict: MSAL token result, including the `access_token` and seconds until it `expires_in`
+        """
+        return self._get_app_access_token()
+
+    def get_credentials(self, token_result: Optional[dict] = None) -> OAuth2AuthorizationCodeCredentials:
         """Builds a user credential object for exchangelib
 
+        Args:
+            token_result (Optional[dict]): Already acquired token, a token is acquired if not given
+
         Returns:
             OAuth2AuthorizationCodeCredentials: Credentials to authenticate a user
         """
-        token_result = self._get_app_access_token()
+        if token_result is None:
+            token_result = self.acquire_token()
         access_token = OAuth2Token(token_result)
         return OAuth2AuthorizationCodeCredentials(access_token=access_token)
 
-    def get_config(self) -> Configuration:
+    def get_config(self, credentials: Optional[OAuth2AuthorizationCodeCredentials] = None, max_connections: Optional[int] = None) -> Configuration:
         """Retrieve an exchangelib Configuration object
 
         Ultimately used to return an exchangelib Account object
         used to send emails
 
+        Args:
+            credentials (Optional[OAuth2AuthorizationCodeCredentials]): Credentials to use, acquired if not given
+            max_connections (Optional[int]): Maximum number of concurrent connections to the server, exchangelib's default if not given
+
         Returns:
             Configuration: Configuration object for Exchange server
         """
-        return Configuration(server=self.settings.server, credentials=self.get_credentials())
+        if credentials is None:
+            credentials = self.get_credentials()
+        return Configuration(server=self.settings.server, credentials=credentials, max_connections=max_connections)
 
-    def get_account(self) -> Account:
+    def get_account(self, credentials: Optional[OAuth2AuthorizationCodeCredentials] = None, max_connections: Optional[int] = None) -> Account:
         """Return an exchangelib Account object
 
         Account object necessary for sending emails using OAuth2
 
+        Args:
+            credentials (Optional[OAuth2AuthorizationCodeCredentials]): Credentials to use, acquired if not given
+            max_connections (Optional[int]): Maximum number of concurrent connections to the server, exchangelib's default if not given
+
         Returns:
             Account: exchangelib Account object for an authenticated user
         """
-        conf = self.get_config()
+        conf = self.get_config(credentials, max_connections)
         return Account(primary_smtp_address=self.settings.send_emails_as, config=conf, access_type=DELEGATE)
 
 
+class ExchangeSession:
+    """Authenticated Exchange account shared by every email sent in a run
+
+    Authentication happens once, when the account is first used. The same Account, and so the same pool of
+    HTTP connections to the Exchange server, is then used for every email. The access token is refreshed when it
+    is close to expiring, replacing the account's credentials rather than creating a new account.
+    """
+
+    def __init__(
+        self,
+        authenticator: Optional[RREDAuthenticator] = None,
+        refresh_margin: float = TOKEN_REFRESH_MARGIN,
+        clock: Callable[[], float] = time.monotonic,
+        max_connections: Optional[int] = None,
+    ):
+        """
+        Args:
+            authenticator (Optional[RREDAuthenticator]): Authenticator for the Exchange server
+            refresh_margin (float): Refresh the access token when it has less than this many seconds left
+            clock (Callable[[], float]): Current time in seconds, used to track token expiry
+            max_connections (Optional[int]): Size of the connection pool, set to the number of emails sent at once
+        """
+        self.authenticator = authenticator if authenticator is not None else RREDAuthenticator()
+        self.refresh_margin = refresh_margin
+        self.max_connections = max_connections
+        self._clock = clock
+        self._account: Optional[Account] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def account(self) -> Account:
+        """Authenticated account, authenticating on first use and refreshing the token ahead of expiry"""
+        with self._lock:
+            if self._account is None or self._clock() >= self._expires_at - self.refresh_margin:
+                self._authenticate()
+            return self._account
+
+    def _authenticate(self) -> None:
+        """Acquire a token, creating the account on first use or updating its credentials afterwards"""
+        token_result = self.authenticator.acquire_token()
+        credentials = self.authenticator.get_credentials(token_result)
+        if self._account is None:
+            self._account = self.authenticator.get_account(credentials, self.max_connections)
+        else:
+            logger.info("Refreshing Exchange access token")
+            # Replacing the credentials closes pooled connections using the old token, they are reopened on the next send
+            self._account.protocol.credentials = credentials
+        self._expires_at = self._clock() + float(token_result.get("expires_in", 0))
+
+
 def _check_or_set_up_cache():
     """Set up MSAL token cache and load existing token"""
     cache = msal.SerializableTokenCache()
@@ -0,0 +1,104 @@
+"""Checkpoint journal of report generation, so that an interrupted run can be resumed"""
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+JOURNAL_FILE_NAME = "generation_journal.jsonl"
+
+
+@dataclass
+class GenerationJournal:
+    """Append-only journal of the schools whose reports were generated or failed in the current run
+
+    Each school is recorded as a single JSON line, appended and flushed to disk as soon as its report is written,
+    so the journal survives the process being killed. A partially written last line is ignored when resuming.
+    """
+
+    path: Path
+    completed: dict[str, dict] = field(default_factory=dict)
+    failed: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def open(cls, output_dir: Path, resume: bool = False) -> "GenerationJournal":
+        """Open the journal in an output directory, starting a new journal unless resuming
+
+        Args:
+            output_dir (Path): report output directory
+            resume (bool): keep the schools recorded by a previous run
+
+        Returns:
+            GenerationJournal: journal for the run
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        journal = cls(output_dir / JOURNAL_FILE_NAME)
+        if not resume:
+            journal.path.unlink(missing_ok=True)
+            return journal
+        if not journal.path.exists():
+            logger.warning("No generation journal found at {path}, generating all reports", path=journal.path)
+            return journal
+
+        with journal.path.open() as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Ignoring incomplete line in generation journal: {line}", line=line.strip())
+                    continue
+                journal._apply(entry)
+        return journal
+
+    def is_complete(self, school_id: str, data_hash: str, template_hash: str) -> bool:
+        """Check whether a school's report was generated by a previous run from the same inputs
+
+        Args:
+            school_id (str): school ID
+            data_hash (str): hash of the masterfile rows for the school
+            template_hash (str): hash of the template, or PDF layout fingerprint
+
+        Returns:
+            bool: True if the report doesn't need to be generated again
+        """
+        entry = self.completed.get(school_id)
+        return entry is not None and entry["data_hash"] == data_hash and entry["template_hash"] == template_hash
+
+    def record_done(self, school_id: str, report_path: Path, data_hash: str, template_hash: str) -> None:
+        """Record that a school's report has been written
+
+        Args:
+            school_id (str): school ID
+            report_path (Path): path of the written report
+            data_hash (str): hash of the masterfile rows for the school
+            template_hash (str): hash of the template, or PDF layout fingerprint
+        """
+        self._append({"school_id": school_id, "status": "done", "report": report_path.name, "data_hash": data_hash, "template_hash": template_hash})
+
+    def record_failure(self, school_id: str, error: Exception) -> None:
+        """Record that a school's report could not be generated
+
+        Args:
+            school_id (str): school ID
+            error (Exception): error raised while generating the report
+        """
+        self._append({"school_id": school_id, "status": "failed", "error": repr(error)})
+
+    def _append(self, entry: dict) -> None:
+        """Apply an entry and append it to the journal on disk"""
+        self._apply(entry)
+        with self.path.open("a") as handle:
+            handle.write(json.dumps(entry) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def _apply(self, entry: dict) -> None:
+        """Update the in-memory state from a journal entry, later entries for a school replace earlier ones"""
+        school_id = entry["school_id"]
+        if entry["status"] == "done":
+            self.completed[school_id] = entry
+            self.failed.pop(school_id, None)
+        else:
+            self.failed[school_id] = entry["error"]
+            self.completed.pop(school_id, None)
@@ -0,0 +1,256 @@
+"""Conversion of docx reports to PDF, with interchangeable backends"""
+import io
+import queue
+import shutil
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+from docx2pdf import convert
+from loguru import logger
+from pypdf import PdfWriter
+
+
+class ReportConversionException(Exception):
+    """Custom exception generator for report conversion"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def __repr__(self) -> str:
+        return self.message
+
+
+class ConverterType(str, Enum):
+    """ConverterType class
+
+    Provides PDF conversion backends as enums
+    """
+
+    DOCX2PDF = "docx2pdf"
+    LIBREOFFICE = "libreoffice"
+    FAKE = "fake"
+
+
+class PdfConverter(ABC):
+    """Interface for converting docx reports to PDF"""
+
+    @abstractmethod
+    def convert(self, docx_report_paths: list[Path], output_pdf_paths: list[Path]) -> None:
+        """Convert each docx report to the PDF path at the same position
+
+        Args:
+            docx_report_paths (list[Path]): Paths to input docx report files
+            output_pdf_paths (list[Path]): Paths to resulting output pdf report files
+
+        Raises:
+            ReportConversionException: If any report could not be converted
+        """
+
+    def convert_bytes(self, docx_reports: dict[str, bytes]) -> dict[str, bytes]:
+        """Convert docx reports held in memory
+
+        Backends that need files convert the reports in a local temporary directory, so that only
+        the final artifacts are written to the output location.
+
+        Args:
+            docx_reports (dict[str, bytes]): docx report contents keyed by file name
+
+        Returns:
+            dict[str, bytes]: PDF report contents keyed by file name, for each report that produced a PDF
+        """
+        with tempfile.TemporaryDirectory(prefix="rred_convert_") as temp_dir:
+            docx_paths = [Path(temp_dir) / file_name for file_name in docx_reports]
+            for docx_path, docx_bytes in zip(docx_paths, docx_reports.values()):
+                docx_path.write_bytes(docx_bytes)
+            pdf_paths = [docx_path.with_suffix(".pdf") for docx_path in docx_paths]
+            self.convert(docx_paths, pdf_paths)
+            return {pdf_path.name: pdf_path.read_bytes() for pdf_path in pdf_paths if pdf_path.exists()}
+
+
+class Docx2PdfConverter(PdfConverter):
+    """Conversion using docx2pdf, which drives Microsoft Word on Windows and OSX"""
+
+    def convert(self, docx_report_paths: list[Path], output_pdf_paths: list[Path]) -> None:
+        """Convert docx reports using Microsoft Word
+
+        If every docx report in the directory is being converted, this is done all at once so that
+        MS Word on OSX doesn't need to be granted access to each input file directly.
+        Otherwise only the requested reports are converted, one at a time.
+
+        Args:
+            docx_report_paths (list[Path]): Paths to input docx report files
+            output_pdf_paths (list[Path]): Paths to resulting output pdf report files
+        """
+        report_dir = docx_report_paths[0].parent
+        if set(docx_report_paths) == set(report_dir.glob("*.docx")):
+            convert(input_path=report_dir)
+            return
+        for report_path, output_path in zip(docx_report_paths, output_pdf_paths):
+            convert(input_path=report_path, output_path=output_path)
+
+
+class LibreOfficeConverter(PdfConverter):
+    """Conversion using headless LibreOffice, running several conversions at once
+
+    Each report is converted by starting its own soffice process, with up to `workers` processes
+    running at a time. Concurrent processes each use their own LibreOffice user profile, as
+    instances sharing a profile block each other. Conversions that fail or time out are retried.
+    """
+
+    def __init__(self, workers: int = 4, timeout: int = 120, retries: int = 2, soffice_path: str = "soffice"):
+        """
+        Args:
+            workers (int): Number of concurrent soffice processes
+            timeout (int): Seconds to wait for a single conversion before killing the process
+            retries (int): Number of times to retry a failed conversion
+            soffice_path (str): soffice executable name or path
+
+        Raises:
+            ReportConversionException: If the soffice executable can't be found
+        """
+        self.soffice = shutil.which(soffice_path)
+        if self.soffice is None:
+            message = f"LibreOffice executable not found: {soffice_path}"
+            raise ReportConversionException(message)
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+
+    def convert(self, docx_report_paths: list[Path], output_pdf_paths: list[Path]) -> None:
+        """Convert docx reports with concurrent soffice processes, each with its own profile
+
+        Args:
+            docx_report_paths (list[Path]): Paths to input docx report files
+            output_pdf_paths (list[Path]): Paths to resulting output pdf report files
+
+        Raises:
+            ReportConversionException: If any report could not be converted after retrying
+        """
+        with tempfile.TemporaryDirectory(prefix="rred_soffice_") as profiles_dir:
+            profiles: queue.Queue[Path] = queue.Queue()
+            for worker in range(self.workers):
+                profiles.put(Path(profiles_dir) / f"worker_{worker}")
+
+            def convert_with_free_profile(paths: tuple[Path, Path]) -> Optional[Path]:
+                profile = profiles.get()
+                try:
+                    return None if self._convert_single(*paths, profile) else paths[0]
+                finally:
+                    profiles.put(profile)
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = executor.map(convert_with_free_profile, zip(docx_report_paths, output_pdf_paths))
+                failed = [report_path for report_path in results if report_path is not None]
+
+        if failed:
+            message = f"Report conversion failed for {len(failed)} reports: {failed}"
+            raise ReportConversionException(message)
+
+    def _convert_single(self, report_path: Path, output_path: Path, profile: Path) -> bool:
+        """Convert a single report, retrying on failure
+
+        Returns:
+            bool: True if the PDF was produced
+        """
+        # soffice always names the output after the input file, so it's moved afterwards if required
+        converted_path = output_path.parent / f"{report_path.stem}.pdf"
+        command = [
+            self.soffice,
+            f"-env:UserInstallation={profile.resolve().as_uri()}",
+            "--headless",
+            "--norestore",
+            "--convert-to",
+            "pdf",
+            "--outdir",
+            str(output_path.parent),
+            str(report_path),
+        ]
+        for attempt in range(1, self.retries + 2):
+            # remove PDFs from earlier runs, so that only a PDF written by this conversion counts as success
+            converted_path.unlink(missing_ok=True)
+            output_path.unlink(missing_ok=True)
+            try:
+                subprocess.run(command, check=True, capture_output=True, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning("Conversion of {report} timed out on attempt {attempt}", report=report_path, attempt=attempt)
+                continue
+            except subprocess.CalledProcessError as error:
+                logger.warning(
+                    "Conversion of {report} failed on attempt {attempt}: {stderr}", report=report_path, attempt=attempt, stderr=error.stderr
+                )
+                continue
+            if converted_path.exists():
+                if converted_path != output_path:
+                    converted_path.replace(output_path)
+                return True
+        return False
+
+
+class FakeConverter(PdfConverter):
+    """Conversion stand-in for testing, writing a blank PDF for each report"""
+
+    def __init__(self, page_count: int = 10):
+        """
+        Args:
+            page_count (int): Number of blank pages in each PDF, defaults to the length of a school report
+        """
+        self.page_count = page_count
+
+    def convert(self, docx_report_paths: list[Path], output_pdf_paths: list[Path]) -> None:
+        """Write a blank PDF for each report
+
+        Args:
+            docx_report_paths (list[Path]): Paths to input docx report files
+            output_pdf_paths (list[Path]): Paths to resulting output pdf report files
+
+        Raises:
+            ReportConversionException: If a docx report doesn't exist
+        """
+        for report_path, output_path in zip(docx_report_paths, output_pdf_paths):
+            if not report_path.exists():
+                message = f"Report conversion failed - docx report does not exist: {report_path}"
+                raise ReportConversionException(message)
+            output_path.write_bytes(self._blank_pdf())
+
+    def convert_bytes(self, docx_reports: dict[str, bytes]) -> dict[str, bytes]:
+        """Create a blank PDF for each report held in memory
+
+        Args:
+            docx_reports (dict[str, bytes]): docx report contents keyed by file name
+
+        Returns:
+            dict[str, bytes]: PDF report contents keyed by file name
+        """
+        return {str(Path(file_name).with_suffix(".pdf")): self._blank_pdf() for file_name in docx_reports}
+
+    def _blank_pdf(self) -> bytes:
+        """Blank PDF with the configured number of pages"""
+        writer = PdfWriter()
+        for _ in range(self.page_count):
+            writer.add_blank_page(width=595, height=842)
+        pdf_stream = io.BytesIO()
+        writer.write(pdf_stream)
+        return pdf_stream.getvalue()
+
+
+def get_converter(converter_type: ConverterType, workers: Optional[int] = None) -> PdfConverter:
+    """Create a PDF converter for the backend type
+
+    Args:
+        converter_type (ConverterType): conversion backend to use
+        workers (Optional[int]): Number of concurrent conversions, for backends that support it
+
+    Returns:
+        PdfConverter: converter instance
+    """
+    if converter_type == ConverterType.LIBREOFFICE:
+        return LibreOfficeConverter() if workers is None else LibreOfficeConverter(workers=workers)
+    if converter_type == ConverterType.FAKE:
+        return FakeConverter()
+    return Docx2PdfConverter()
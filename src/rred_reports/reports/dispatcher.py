@@ -0,0 +1,371 @@
+"""Concurrent, rate limited sending of report emails
+
+Emails are sent from a bounded thread pool, spaced to stay under the mail server's messages per minute limit.
+Only sends the server explicitly rejected because it is throttling or busy are retried, with exponential backoff.
+A send whose connection failed or timed out may still have been accepted by the server, so it isn't retried, and the
+school is left as sending to be checked by hand, as for sends in flight when a run stops. The outcome for each school
+is recorded rather than the first failure stopping the run.
+Emails can also be sent in batches, each batch in a single request to the server, with only the failed emails in a
+batch retried. Batches are sent as soon as they are built, while the next batches are built.
+"""
+import itertools
+import smtplib
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Optional, TypeVar
+
+from exchangelib.errors import (
+    ErrorConnectionFailedTransientError,
+    ErrorExceededConnectionCount,
+    ErrorInternalServerTransientError,
+    ErrorMailboxStoreUnavailable,
+    ErrorServerBusy,
+    ErrorTimeoutExpired,
+    ErrorTooManyObjectsOpened,
+    RateLimitError,
+    ResponseMessageError,
+    TransportError,
+)
+from loguru import logger
+from tqdm import tqdm
+
+T = TypeVar("T")
+
+
+class SendNotAttemptedError(Exception):
+    """An email wasn't sent because its connection failed before it was attempted, so it can safely be sent again"""
+
+
+# Server responses saying it is throttling or temporarily unavailable, rather than rejecting the email itself
+RETRYABLE_RESPONSE_ERRORS = (
+    ErrorConnectionFailedTransientError,
+    ErrorExceededConnectionCount,
+    ErrorInternalServerTransientError,
+    ErrorMailboxStoreUnavailable,
+    ErrorServerBusy,
+    ErrorTooManyObjectsOpened,
+)
+
+# Errors raised when the server is throttling or busy, or the email wasn't attempted, so the server has not accepted
+# the email, which are worth retrying
+RETRYABLE_ERRORS = (*RETRYABLE_RESPONSE_ERRORS, RateLimitError, SendNotAttemptedError)
+
+# Errors where the connection failed or timed out, so the server may have accepted the email before the failure
+AMBIGUOUS_ERRORS = (
+    ErrorTimeoutExpired,
+    TransportError,
+    smtplib.SMTPServerDisconnected,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class SendStatus(str, Enum):
+    """Status of sending a school's email"""
+
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+@dataclass
+class SendOutcome:
+    """Outcome of sending a single school's email"""
+
+    school_id: str
+    status: SendStatus
+    attempts: int
+    error: Optional[str] = None
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    """An error followed by each error it was raised from"""
+    while error is not None:
+        yield error
+        error = error.__cause__
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Check whether an error, or any error it was raised from, is a throttling or transient server error
+
+    Args:
+        error (BaseException): error raised while sending
+
+    Returns:
+        bool: True if the send should be retried
+    """
+    return any(_is_retryable_cause(cause) for cause in _error_chain(error))
+
+
+def _is_retryable_cause(error: BaseException) -> bool:
+    """Check a single error, as every server response error is a transport error but most reject the email itself"""
+    if isinstance(error, ResponseMessageError):
+        return isinstance(error, RETRYABLE_RESPONSE_ERRORS)
+    # SMTP replies in the 400s are temporary failures, such as greylisting or a full queue
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def is_ambiguous(error: BaseException) -> bool:
+    """Check whether an error, or any error it was raised from, leaves it unknown whether the email was sent
+
+    Args:
+        error (BaseException): error raised while sending
+
+    Returns:
+        bool: True if the email may have been sent, so shouldn't be sent again without checking
+    """
+    return not is_retryable(error) and any(_is_ambiguous_cause(cause) for cause in _error_chain(error))
+
+
+def _is_ambiguous_cause(error: BaseException) -> bool:
+    """Check a single error, as every server response error is a transport error but most are a definite rejection"""
+    if isinstance(error, ResponseMessageError):
+        return isinstance(error, ErrorTimeoutExpired)
+    return isinstance(error, AMBIGUOUS_ERRORS)
+
+
+def _requested_back_off(error: BaseException) -> float:
+    """Back off in seconds requested by the server, if any error in the chain includes one"""
+    return max((float(getattr(cause, "back_off", None) or 0) for cause in _error_chain(error)), default=0.0)
+
+
+def _describe(error: BaseException) -> str:
+    """Description of an error including the errors it was raised from, as emailer errors wrap the server error"""
+    return " from ".join(repr(cause) for cause in _error_chain(error))
+
+
+class RateLimiter:
+    """Space out calls evenly, to stay under a maximum number of calls per minute across all threads"""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            per_minute (float): Maximum number of calls per minute
+            clock (Callable[[], float]): Current time in seconds
+            sleep (Callable[[float], None]): Sleep for a number of seconds
+        """
+        self.interval = 60.0 / per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, count: int = 1) -> None:
+        """Wait until the next free slot, reserving it and the following slots for the caller
+
+        Args:
+            count (int): Number of calls being made, such as the number of emails sent in one batch request
+        """
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval * count
+        if slot > now:
+            self._sleep(slot - now)
+
+
+class MailDispatcher:
+    """Send an email for each school from a bounded thread pool, with rate limiting and retries"""
+
+    def __init__(
+        self,
+        send: Callable[[str], None],
+        workers: int = 4,
+        messages_per_minute: float = 30,
+        max_attempts: int = 5,
+        backoff_seconds: float = 2.0,
+        max_backoff_seconds: float = 120.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            send (Callable[[str], None]): Send the email for a school ID, raising an error if it can't be sent
+            workers (int): Maximum number of emails being sent at once
+            messages_per_minute (float): Maximum number of send attempts per minute, across all workers
+            max_attempts (int): Maximum number of attempts for each school, including the first
+            backoff_seconds (float): Wait before the first retry, doubled for each further retry
+            max_backoff_seconds (float): Maximum wait between retries
+            sleep (Callable[[float], None]): Sleep for a number of seconds
+        """
+        self.send = send
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._sleep = sleep
+        self.rate_limiter = RateLimiter(messages_per_minute, sleep=sleep)
+
+    def run(self, school_ids: list[str]) -> list[SendOutcome]:
+        """Send an email for every school, recording the outcome for each school without stopping on failures
+
+        Args:
+            school_ids (list[str]): schools to send emails to
+
+        Returns:
+            list[SendOutcome]: outcome for each school, in the order given
+        """
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, tqdm(total=len(school_ids)) as progress:
+            futures = {executor.submit(self._send_with_retries, school_id): school_id for school_id in school_ids}
+            for future in as_completed(futures):
+                outcomes[futures[future]] = future.result()
+                progress.update()
+        return [outcomes[school_id] for school_id in school_ids]
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """Wait before retrying after a failed attempt, at least as long as the server requested"""
+        exponential = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempt - 1))
+        return max(exponential, _requested_back_off(error))
+
+    def _send_with_retries(self, school_id: str) -> SendOutcome:
+        """Send a school's email, retrying throttling and server busy errors"""
+        for attempt in range(1, self.max_attempts + 1):
+            self.rate_limiter.wait()
+            try:
+                self.send(school_id)
+                return SendOutcome(school_id, SendStatus.SENT, attempt)
+            except Exception as error:  # pylint: disable=broad-except
+                failure = error
+                if is_ambiguous(error):
+                    return self._uncertain(school_id, attempt, error)
+                if attempt == self.max_attempts or not is_retryable(error):
+                    break
+                delay = self._backoff(attempt, error)
+                logger.warning(
+                    "Sending to {school} failed on attempt {attempt}, retrying in {delay:.0f}s: {error}",
+                    school=school_id,
+                    attempt=attempt,
+                    delay=delay,
+                    error=_describe(error),
+                )
+                self._sleep(delay)
+
+        logger.error("Sending to {school} failed after {attempt} attempts: {error}", school=school_id, attempt=attempt, error=_describe(failure))
+        return SendOutcome(school_id, SendStatus.FAILED, attempt, _describe(failure))
+
+    @staticmethod
+    def _uncertain(school_id: str, attempt: int, error: BaseException) -> SendOutcome:
+        """Outcome of a send that may have been accepted by the server, left as sending so it isn't sent twice"""
+        logger.warning(
+            "Sending to {school} failed on attempt {attempt} in a way that may have sent the email, not retrying: {error}",
+            school=school_id,
+            attempt=attempt,
+            error=_describe(error),
+        )
+        return SendOutcome(school_id, SendStatus.SENDING, attempt, _describe(error))
+
+    def run_batched(
+        self,
+        school_ids: list[str],
+        build_message: Callable[[str], T],
+        send_batch: Callable[[dict[str, T]], dict[str, Optional[BaseException]]],
+        batch_size: int = 50,
+    ) -> list[SendOutcome]:
+        """Build school emails concurrently while sending earlier batches, each batch in one request
+
+        Emails are built in school order, at most `workers` batches ahead of sending, and each batch is sent as soon
+        as it has been built. So sending starts straight away, and only a few batches of emails are held in memory
+        however many schools there are.
+        Only the emails in a batch that failed with a throttling or server busy error are retried.
+        If a batch request fails as a whole, every email in it is treated as failing with that error.
+
+        Args:
+            school_ids (list[str]): schools to send emails to
+            build_message (Callable[[str], T]): Build the email for a school ID, raising an error if it can't be built
+            send_batch (Callable[[dict[str, T]], dict[str, Optional[BaseException]]]): Send emails by school ID in one request,
+                returning None for each email sent or the error for each email rejected
+            batch_size (int): Maximum number of emails in each batch
+
+        Returns:
+            list[SendOutcome]: outcome for each school, in the order given
+        """
+        outcomes = {}
+        remaining_ids = iter(school_ids)
+        builds: deque[tuple[str, Future]] = deque()
+        sends: set[Future] = set()
+        batch = {}
+
+        def record(finished: set[Future]) -> None:
+            for future in finished:
+                for outcome in future.result():
+                    outcomes[outcome.school_id] = outcome
+                    progress.update()
+
+        def build_ahead() -> None:
+            # Keep up to `workers` batches of emails building ahead of the batch being filled
+            for school_id in itertools.islice(remaining_ids, self.workers * batch_size - len(builds)):
+                builds.append((school_id, build_executor.submit(build_message, school_id)))
+
+        build_executor = ThreadPoolExecutor(max_workers=self.workers)
+        send_executor = ThreadPoolExecutor(max_workers=self.workers)
+        with build_executor, send_executor, tqdm(total=len(school_ids)) as progress:
+            build_ahead()
+            while builds:
+                school_id, build = builds.popleft()
+                try:
+                    batch[school_id] = build.result()
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.error("Building the email to {school} failed: {error}", school=school_id, error=_describe(error))
+                    outcomes[school_id] = SendOutcome(school_id, SendStatus.FAILED, 0, _describe(error))
+                    progress.update()
+                build_ahead()
+
+                if len(batch) == batch_size or (batch and not builds):
+                    while len(sends) >= self.workers:
+                        finished, sends = wait(sends, return_when=FIRST_COMPLETED)
+                        record(finished)
+                    sends.add(send_executor.submit(self._send_batch_with_retries, batch, send_batch))
+                    batch = {}
+            record(set(as_completed(sends)))
+        return [outcomes[school_id] for school_id in school_ids]
+
+    def _send_batch_with_retries(
+        self, messages: dict[str, T], send_batch: Callable[[dict[str, T]], dict[str, Optional[BaseException]]]
+    ) -> list[SendOutcome]:
+        """Send a batch of emails, retrying the emails that failed with throttling and server busy errors"""
+        outcomes = []
+        remaining = messages
+        for attempt in range(1, self.max_attempts + 1):
+            self.rate_limiter.wait(len(remaining))
+            try:
+                errors = send_batch(remaining)
+            except Exception as error:  # pylint: disable=broad-except
+                errors = {school_id: error for school_id in remaining}
+
+            retry = {}
+            for school_id, message in remaining.items():
+                error = errors.get(school_id)
+                if error is None:
+                    outcomes.append(SendOutcome(school_id, SendStatus.SENT, attempt))
+                elif is_ambiguous(error):
+                    outcomes.append(self._uncertain(school_id, attempt, error))
+                elif attempt < self.max_attempts and is_retryable(error):
+                    retry[school_id] = message
+                else:
+                    logger.error(
+                        "Sending to {school} failed after {attempt} attempts: {error}", school=school_id, attempt=attempt, error=_describe(error)
+                    )
+                    outcomes.append(SendOutcome(school_id, SendStatus.FAILED, attempt, _describe(error)))
+            if not retry:
+                break
+
+            delay = max(self._backoff(attempt, errors[school_id]) for school_id in retry)
+            logger.warning(
+                "Sending {count} emails in a batch failed on attempt {attempt}, retrying in {delay:.0f}s: {schools}",
+                count=len(retry),
+                attempt=attempt,
+                delay=delay,
+                schools=sorted(retry),
+            )
+            self._sleep(delay)
+            remaining = retry
+        return outcomes
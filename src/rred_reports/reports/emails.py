@@ -4,9 +4,13 @@ from pathlib import Path
 from typing import Optional
 
 from exchangelib import Account, FileAttachment, HTMLBody, Mailbox, Message
+from exchangelib.errors import ResponseMessageError
+from exchangelib.items import SEND_AND_SAVE_COPY, SEND_ONLY, SEND_TO_NONE
+from exchangelib.services import CreateItem
 
 from rred_reports.redcap.interface import top_level_dir
-from rred_reports.reports.auth import RREDAuthenticator
+from rred_reports.reports.auth import ExchangeSession, RREDAuthenticator
+from rred_reports.reports.grouping import EmailGroup
 
 
 def formatted_mail_content(school_name: str, start_year: int, end_year) -> dict:
@@ -26,14 +30,47 @@ def formatted_mail_content(school_name: str, start_year: int, end_year) -> dict:
     start_year_short = start_year[2:]
     end_year_short = end_year[2:]
     subject = f"Reading Recovery Annual Report for {school_name} {start_year_short}-{end_year_short}"
+    introduction = f"""Please find attached the Reading Recovery Annual Report for your school for {start_year}-{end_year_short}.
+    The report outlines the progress that pupils have made in Reading Recovery in your school during the year {start_year}-{end_year_short}.<br><br>"""
 
-    body_html = HTMLBody(
+    return {"subject": subject, "body_html": _mail_body_html(introduction, start_year, end_year_short)}
+
+
+def formatted_group_mail_content(school_names: list[str], start_year: int, end_year: int) -> dict:
+    """Mail subject and content for an email with the reports of several schools attached
+
+    Args:
+        school_names (list[str]): Names of the schools whose reports are attached
+        start_year (int): Report start year
+        end_year (int): Report end year
+
+    Returns:
+        dict: Dictionary containing email subject and body
+    """
+    if len(school_names) == 1:
+        return formatted_mail_content(school_names[0], start_year, end_year)
+
+    start_year = str(start_year)
+    end_year = str(end_year)
+    start_year_short = start_year[2:]
+    end_year_short = end_year[2:]
+    subject = f"Reading Recovery Annual Reports for {len(school_names)} schools {start_year_short}-{end_year_short}"
+    school_list = "".join(f"<li>{school_name}</li>" for school_name in school_names)
+    introduction = f"""Please find attached the Reading Recovery Annual Reports for your schools for {start_year}-{end_year_short}:
+    <ul>{school_list}</ul>
+    Each report outlines the progress that pupils have made in Reading Recovery in the school during the year {start_year}-{end_year_short}.<br><br>"""
+
+    return {"subject": subject, "body_html": _mail_body_html(introduction, start_year, end_year_short)}
+
+
+def _mail_body_html(introduction: str, start_year: str, end_year_short: str) -> HTMLBody:
+    """Email body shared by single school and grouped emails, after an introduction to the attached reports"""
+    return HTMLBody(
         f"""<html>
     <body>
     Dear Reading Recovery Teacher<br>
 
-    Please find attached the Reading Recovery Annual Report for your school for {start_year}-{end_year_short}.
-    The report outlines the progress that pupils have made in Reading Recovery in your school during the year {start_year}-{end_year_short}.<br><br>
+    {introduction}
 
     Programmes that offered regular teaching have been recorded as complete, either Discontinued or Referred.
     Programmes that will continue after the summer break are recorded as 'Ongoing'.
@@ -88,8 +125,6 @@ def formatted_mail_content(school_name: str, start_year: int, end_year) -> dict:
         """
     )
 
-    return {"subject": subject, "body_html": body_html}
-
 
 class ReportEmailerException(Exception):
     """Custom exception generator for the ReportEmailer class"""
@@ -115,9 +150,24 @@ class EmailContent:
     attachment_name: Optional[str]
 
 
+class _SendItems(CreateItem):
+    """CreateItem service returning every rejected email's error, where exchangelib would raise some of them and lose the
+    results of the other emails in the request"""
+
+    ERRORS_TO_CATCH_IN_RESPONSE = (*CreateItem.ERRORS_TO_CATCH_IN_RESPONSE, ResponseMessageError)
+
+
 class ReportEmailer:
     """Encapsulation of email data and methods"""
 
+    def __init__(self, session: Optional[ExchangeSession] = None):
+        """
+        Args:
+            session (Optional[ExchangeSession]): Authenticated session shared between emails,
+                if not given each email authenticates separately
+        """
+        self.session = session
+
     @staticmethod
     def build_email(mail_content: EmailContent) -> Message:
         """Building the content of the email
@@ -177,6 +227,38 @@ class ReportEmailer:
                 message = "An error occurred emailing this report."
                 raise ReportEmailerException(message) from err
 
+    @staticmethod
+    def send_emails(
+        account: Account, messages: dict[str, Message], save: bool = True, chunk_size: Optional[int] = None
+    ) -> dict[str, Optional[Exception]]:
+        """Send many emails in bulk requests to the server, rather than one request for each email
+
+        Args:
+            account (Account): Account to send the emails from
+            messages (dict[str, Message]): Constructed messages to send, by a key such as the school ID
+            save (bool): Should the emails be saved to the sent mailbox
+            chunk_size (Optional[int]): Maximum number of emails in each request, exchangelib's default of 100 if not given
+
+        Raises:
+            ReportEmailerException: If a request to the server fails, rather than individual emails. Emails in earlier
+                requests may have been sent, so send each batch in a single request to know which emails weren't sent.
+
+        Returns:
+            dict[str, Optional[Exception]]: For each key, None if the email was sent or the error if the server rejected it
+        """
+        message_disposition = SEND_AND_SAVE_COPY if save else SEND_ONLY
+        service = _SendItems(account=account, chunk_size=chunk_size)
+        try:
+            results = list(
+                service.call(
+                    items=list(messages.values()), folder=None, message_disposition=message_disposition, send_meeting_invitations=SEND_TO_NONE
+                )
+            )
+        except Exception as err:
+            message = "An error occurred emailing these reports."
+            raise ReportEmailerException(message) from err
+        return {key: result if isinstance(result, Exception) else None for key, result in zip(messages, results)}
+
     def run(
         self,
         school_name: str,
@@ -207,9 +289,9 @@ class ReportEmailer:
         if cc_to is None:
             cc_to = []
         content_template = formatted_mail_content(school_name, start_year, end_year)
-        authenticator = RREDAuthenticator()
+        account = self.session.account if self.session is not None else RREDAuthenticator().get_account()
         email_content = EmailContent(
-            account=authenticator.get_account(),
+            account=account,
             recipients=to_list,
             cc_recipients=cc_to,
             subject=content_template["subject"],
@@ -223,7 +305,7 @@ class ReportEmailer:
         return self.__class__.send_email(email, save=save_email)
 
 
-def school_mailer(school_id: str, year: int, mail_info: dict, report_name: str, reports_dir: Path = None):
+def school_mailer(school_id: str, year: int, mail_info: dict, report_name: str, reports_dir: Path = None, session: Optional[ExchangeSession] = None):
     """Wrapper mailing function
 
     Args:
@@ -232,22 +314,13 @@ def school_mailer(school_id: str, year: int, mail_info: dict, report_name: str,
         mail_info (dict): Details of emails
         report_name (str, optional): Name of attached file. Defaults to "RRED_report.pdf".
         reports_dir (Path, optional): Path where the reports should be found
+        session (Optional[ExchangeSession]): Authenticated session shared between emails
 
     Raises:
         ReportEmailerException: Exception raised if report directory does not exist.
     """
-    emailer = ReportEmailer()
-
-    if reports_dir is None:
-        reports_dir = top_level_dir / "output" / "reports" / str(year) / "schools"
-
-    try:
-        assert reports_dir.exists()
-    except AssertionError as error:
-        message = f"Report directory {reports_dir} not found. Exiting."
-        raise ReportEmailerException(message) from error
-
-    report_path = reports_dir / f"report_{school_id}.pdf"
+    emailer = ReportEmailer(session)
+    report_path = school_report_path(school_id, year, reports_dir)
 
     emailer.run(
         school_name=mail_info["school_label"],
@@ -259,3 +332,114 @@ def school_mailer(school_id: str, year: int, mail_info: dict, report_name: str,
         report_name=report_name,
         save_email=True,
     )
+
+
+def build_school_email(school_id: str, year: int, mail_info: dict, report_name: str, account: Account, reports_dir: Path = None) -> Message:
+    """Build a school's report email without sending it, for sending in bulk
+
+    Args:
+        school_id (str): School ID
+        year (int): Starting year of report coverage
+        mail_info (dict): Details of emails
+        report_name (str): Name of attached file
+        account (Account): Account the email will be sent from
+        reports_dir (Path, optional): Path where the reports should be found
+
+    Raises:
+        ReportEmailerException: Exception raised if report directory does not exist.
+
+    Returns:
+        Message: Email with the report attached
+    """
+    content_template = formatted_mail_content(mail_info["school_label"], year, year + 1)
+    email_content = EmailContent(
+        account=account,
+        recipients=mail_info["mailing_list"],
+        cc_recipients=[],
+        subject=content_template["subject"],
+        body=content_template["body_html"],
+        attachment_path=school_report_path(school_id, year, reports_dir),
+        attachment_name=report_name,
+    )
+    return ReportEmailer.build_email(email_content)
+
+
+def build_group_email(
+    group: EmailGroup, year: int, mail_info: dict[str, dict], report_name: str, account: Account, reports_dir: Path = None
+) -> Message:
+    """Build an email to a group's recipients with every one of the group's school reports attached
+
+    Args:
+        group (EmailGroup): Schools and recipients of the email
+        year (int): Starting year of report coverage
+        mail_info (dict[str, dict]): Details of emails for each school
+        report_name (str): Name of attached file, suffixed with the school ID when several reports are attached
+        account (Account): Account the email will be sent from
+        reports_dir (Path, optional): Path where the reports should be found
+
+    Raises:
+        ReportEmailerException: Exception raised if report directory does not exist.
+
+    Returns:
+        Message: Email with the reports attached
+    """
+    content_template = formatted_group_mail_content([mail_info[school_id]["school_label"] for school_id in group.school_ids], year, year + 1)
+    email_content = EmailContent(
+        account=account,
+        recipients=group.recipients,
+        cc_recipients=[],
+        subject=content_template["subject"],
+        body=content_template["body_html"],
+        attachment_path=None,
+        attachment_name=None,
+    )
+    message = ReportEmailer.build_email(email_content)
+    for school_id in group.school_ids:
+        attachment = FileAttachment(
+            name=group_attachment_name(group, report_name, school_id), content=school_report_path(school_id, year, reports_dir).read_bytes()
+        )
+        message.attach(attachment)
+    return message
+
+
+def group_attachment_name(group: EmailGroup, report_name: str, school_id: str) -> str:
+    """Name of a school's report attached to a group email, suffixed with the school ID if the group has several schools
+
+    Args:
+        group (EmailGroup): Group the email is for
+        report_name (str): Name of attached file for a single school
+        school_id (str): School ID
+
+    Returns:
+        str: Name of the attached file
+    """
+    if len(group.school_ids) == 1:
+        return report_name
+    report_path = Path(report_name)
+    return f"{report_path.stem}_{school_id}{report_path.suffix}"
+
+
+def school_report_path(school_id: str, year: int, reports_dir: Optional[Path] = None) -> Path:
+    """Path of a school's PDF report, checking that the report directory exists
+
+    Args:
+        school_id (str): School ID
+        year (int): Starting year of report coverage
+        reports_dir (Path, optional): Path where the reports should be found
+
+    Raises:
+        ReportEmailerException: Exception raised if report directory does not exist.
+
+    Returns:
+        Path: Path of the school's report
+    """
+    if reports_dir is None:
+        reports_dir = top_level_dir / "output" / "reports" / str(year) / "schools"
+
+    try:
+        assert reports_dir.exists()
+    except AssertionError as error:
+        message = f"Report directory {reports_dir} not found. Exiting."
+        raise ReportEmailerException(message) from error
+
+    return reports_dir / f"report_{school_id}.pdf"
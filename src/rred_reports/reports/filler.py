@@ -147,12 +147,7 @@ class TemplateFiller:
             table.add_row()
             for j in range(data.shape[-1]):
                 current_cell = table.cell(i + header_rows, j)
-                # Ensure NA representation is shorter: for thin columns, to avoid splitting over multiple lines
-                cell_text = str(data.values[i, j]).replace("<NA>", "NA").strip()
-                # Replace nan with Missing Data for report writing
-                if cell_text == "nan":
-                    cell_text = "Missing Data"
-                current_cell.text = cell_text
+                current_cell.text = self.__class__.cell_text(data.values[i, j])
                 # manually set the style of the new text, and don't break table over multiple lines
                 current_paragraph = current_cell.paragraphs[0]
                 current_paragraph.style = self.table_text_style
@@ -161,6 +156,23 @@ class TemplateFiller:
         # override the style to deal with new rows sometimes not adding borders
         table.style = self.table_grid_style
 
+    @staticmethod
+    def cell_text(value) -> str:
+        """Text representation of a value for a table cell
+
+        Args:
+            value: value from a pandas dataframe
+
+        Returns:
+            str: text to display in the cell
+        """
+        # Ensure NA representation is shorter: for thin columns, to avoid splitting over multiple lines
+        cell_text = str(value).replace("<NA>", "NA").strip()
+        # Replace nan with Missing Data for report writing
+        if cell_text == "nan":
+            return "Missing Data"
+        return cell_text
+
     def _verify_new_rows_and_keep_together(self, table: Table, data: pd.DataFrame, header_rows=1):
         """Verify dimension of new rows to be added to existing table
         Pandas dataframe width should be the columnar dimension of the table
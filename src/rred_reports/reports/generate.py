@@ -1,60 +1,207 @@
+import io
+import re
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
 from pathlib import Path
+from typing import BinaryIO, Callable, Optional
 
 import pandas as pd
-from docx2pdf import convert
 from loguru import logger
-from pypdf import PdfMerger, PdfReader
+from pypdf import PdfMerger, PdfReader, PdfWriter
 from pypdf.errors import EmptyFileError, PdfReadError
 from tqdm import tqdm
 
-from rred_reports.reports.schools import populate_school_data, school_filter
+from rred_reports import ReportType
+from rred_reports.reports.checkpoint import GenerationJournal
+from rred_reports.reports.converters import Docx2PdfConverter, PdfConverter, ReportConversionException
+from rred_reports.reports.manifest import ReportManifest, file_hash, partition_hashes
+from rred_reports.reports.pdf_renderer import PdfLayout, render_school_pdf
+from rred_reports.reports.schools import LEVEL_COLUMNS, precompute_report_tables, precompute_school_tables, with_level_columns, write_school_report
 
-_EXPECTED_PAGE_COUNT = 10
+EXPECTED_PAGE_COUNT = 10
+# Reports in each combined PDF when merging in batches, as the final write of each file holds it all in memory
+DEFAULT_VOLUME_SIZE = 500
+_UNSAFE_FILE_CHARACTERS = re.compile(r"[^\w-]+")
 
 
-class ReportConversionException(Exception):
-    """Custom exception generator for the TemplateFiller class"""
-
-    def __init__(self, message: str):
-        super().__init__(message)
-        self.message = message
-
-    def __repr__(self) -> str:
-        return self.message
+def generate_report_school(
+    processed_data: pd.DataFrame,
+    template_file: Path,
+    output_dir: Path,
+    report_year: int,
+    force: bool = False,
+    pdf_layout: Optional[PdfLayout] = None,
+    on_report_written: Optional[Callable[[Path], None]] = None,
+    resume: bool = False,
+) -> list[str]:
+    """Generate a report at the school level given a list of school IDs
 
+    All table data is precomputed for every school in one pass, each report is then only rendered and saved.
+    Reports whose masterfile rows, template and package version are unchanged since they were last generated
+    are skipped, using the manifest in the output directory.
 
-def generate_report_school(processed_data: pd.DataFrame, template_file: Path, output_dir: Path, report_year: int) -> None:
-    """Generate a report at the school level given a list of school IDs
+    Each school is recorded in a checkpoint journal as soon as its report is written. A school whose report fails
+    is recorded and the remaining schools are still generated. When resuming, schools recorded as done by the
+    previous run are skipped, even if forcing regeneration.
 
     Args:
         processed_data (pd.DataFrame): Pandas dataframe of processed data
         template_file (Path): The template file to be used
         output_dir (Path): Output directory for saved files
+        report_year (int): Year of report end
+        force (bool): Regenerate all reports, even if their inputs haven't changed
+        pdf_layout (Optional[PdfLayout]): Render PDF reports directly using this layout, instead of docx reports
+        on_report_written (Optional[Callable[[Path], None]]): Called with the path of each report as soon as it is written
+        resume (bool): Skip schools completed by the previous run, according to its checkpoint journal
+
+    Returns:
+        list[str]: school IDs whose reports failed to generate
     """
     school_ids: list[str] = processed_data.loc[:, "school_id"].sort_values(ascending=True).unique().tolist()
     logger.info("Generating reports for {total_schools} schools", total_schools=len(school_ids))
-    schools_with_no_data = []
 
-    for school_id in tqdm(school_ids):
-        school_data = school_filter(processed_data, school_id)
+    report_suffix = ".docx" if pdf_layout is None else ".pdf"
+    manifest = ReportManifest.load(output_dir)
+    template_hash = file_hash(template_file) if pdf_layout is None else pdf_layout.fingerprint
+    data_hashes = partition_hashes(processed_data, report_year)
+    journal = GenerationJournal.open(output_dir, resume=resume)
+    resumed = {school_id for school_id, data_hash in data_hashes.items() if journal.is_complete(school_id, data_hash, template_hash)}
+    if resumed:
+        logger.info("Resuming, skipping {completed} schools completed by the previous run", completed=len(resumed))
+        for school_id in resumed:
+            manifest.record_report(output_dir / journal.completed[school_id]["report"], data_hashes[school_id], template_hash)
+    schools_to_generate = [
+        school_id
+        for school_id, data_hash in data_hashes.items()
+        if school_id not in resumed
+        and (force or not manifest.report_is_current(output_dir / f"report_{str(school_id)}{report_suffix}", data_hash, template_hash))
+    ]
+    if len(schools_to_generate) + len(resumed) < len(data_hashes):
+        logger.info("Skipping {unchanged} schools with unchanged reports", unchanged=len(data_hashes) - len(schools_to_generate) - len(resumed))
 
-        if school_data.size == 0:
-            logger.trace("No data remaining after filtering for school {school}", school=school_id)
-            schools_with_no_data.append(school_id)
-            continue
+    tables_by_school = precompute_school_tables(processed_data[processed_data["school_id"].isin(schools_to_generate)], report_year)
+    schools_with_no_data = [
+        school_id
+        for school_id in school_ids
+        if school_id not in data_hashes or (school_id in schools_to_generate and school_id not in tables_by_school)
+    ]
 
-        if all(school_data["rrcp_school"].isna()):
-            logger.trace("No name found for school {school}", school=school_id)
-            continue
+    try:
+        for school_id, school_tables in tqdm(tables_by_school.items()):
+            if school_tables.school_name is None:
+                logger.trace("No name found for school {school}", school=school_id)
+                continue
 
-        output_doc = output_dir / f"report_{str(school_id)}.docx"
-        populate_school_data(school_data, template_file, report_year, output_path=output_doc)
+            output_report = output_dir / f"report_{str(school_id)}{report_suffix}"
+            try:
+                if pdf_layout is None:
+                    write_school_report(school_tables, template_file, output_report)
+                else:
+                    render_school_pdf(school_tables, pdf_layout, output_report)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Report generation failed for school {school}: {error}", school=school_id, error=error)
+                journal.record_failure(school_id, error)
+                continue
+            manifest.record_report(output_report, data_hashes[school_id], template_hash)
+            journal.record_done(school_id, output_report, data_hashes[school_id], template_hash)
+            if on_report_written is not None:
+                on_report_written(output_report)
+    finally:
+        manifest.save()
     if schools_with_no_data:
         logger.warning(
             "{school_count} schools did not have data remaining after filtering: {schools}",
             school_count=len(schools_with_no_data),
             schools=schools_with_no_data,
         )
+    failed_schools = sorted(journal.failed)
+    if failed_schools:
+        logger.error(
+            "Report generation failed for {school_count} schools: {schools}. Fix these and rerun with --resume to skip completed schools",
+            school_count=len(failed_schools),
+            schools=failed_schools,
+        )
+    return failed_schools
+
+
+def report_file_stem(report_id: str) -> str:
+    """Report file name without extension, replacing characters in centre names that aren't safe in file names
+
+    Args:
+        report_id (str): school ID, centre or national name
+
+    Returns:
+        str: report file name stem
+    """
+    return f"report_{_UNSAFE_FILE_CHARACTERS.sub('_', str(report_id)).strip('_')}"
+
+
+def generate_rollup_reports(
+    processed_data: pd.DataFrame,
+    report_year: int,
+    level_outputs: dict[ReportType, tuple[Path, Path]],
+    force: bool = False,
+    on_report_written: Optional[Callable[[Path], None]] = None,
+) -> None:
+    """Generate docx reports for one or more report levels from a single aggregation pass over the masterfile
+
+    Reports whose masterfile rows, template and package version are unchanged since they were last generated
+    are skipped, using the manifest in each level's output directory.
+
+    Args:
+        processed_data (pd.DataFrame): Pandas dataframe of processed data
+        report_year (int): Year of report end
+        level_outputs (dict[ReportType, tuple[Path, Path]]): template file and output directory for each report level
+        force (bool): Regenerate all reports, even if their inputs haven't changed
+        on_report_written (Optional[Callable[[Path], None]]): Called with the path of each report as soon as it is written
+    """
+    levelled_data = with_level_columns(processed_data)
+    manifests = {level: ReportManifest.load(output_dir) for level, (_template, output_dir) in level_outputs.items()}
+    template_hashes = {level: file_hash(template_file) for level, (template_file, _output_dir) in level_outputs.items()}
+    data_hashes = {level: partition_hashes(levelled_data, report_year, partition_column=LEVEL_COLUMNS[level]) for level in level_outputs}
+
+    tables_by_level = precompute_report_tables(processed_data, report_year, levels=list(level_outputs))
+    try:
+        for level, report_tables in tables_by_level.items():
+            template_file, output_dir = level_outputs[level]
+            logger.info("Generating {level} reports for {total_reports} reports", level=level.value, total_reports=len(report_tables))
+            for report_id, tables in tqdm(report_tables.items()):
+                if tables.school_name is None:
+                    logger.trace("No name found for school {school}", school=report_id)
+                    continue
+
+                output_report = output_dir / f"{report_file_stem(report_id)}.docx"
+                data_hash = data_hashes[level][report_id]
+                if not force and manifests[level].report_is_current(output_report, data_hash, template_hashes[level]):
+                    continue
+                write_school_report(tables, template_file, output_report)
+                manifests[level].record_report(output_report, data_hash, template_hashes[level])
+                if on_report_written is not None:
+                    on_report_written(output_report)
+    finally:
+        for manifest in manifests.values():
+            manifest.save()
+
+
+def _count_pages(pdf_file_path: Path) -> int:
+    """Read the page count from the root of the PDF's page tree, without loading any of the pages
+
+    Args:
+        pdf_file_path (Path): Path to PDF report
+
+    Returns:
+        int: number of pages in the PDF
+    """
+    with pdf_file_path.open("rb") as pdf_file:
+        return _read_page_count(pdf_file)
+
+
+def _read_page_count(pdf_stream: BinaryIO) -> int:
+    """Read the page count from the root of the page tree of an open PDF"""
+    reader = PdfReader(pdf_stream)
+    return int(reader.trailer["/Root"]["/Pages"]["/Count"])
 
 
 def validate_pdf(pdf_file_path: Path) -> bool:
@@ -68,47 +215,175 @@ def validate_pdf(pdf_file_path: Path) -> bool:
         message = f"Report conversion failed - output PDF does not exist: {pdf_file_path}"
         raise ReportConversionException(message)
 
-    with pdf_file_path.open("rb") as converted_report:
-        try:
-            reader = PdfReader(converted_report)
-            pages_in_pdf = len(reader.pages)
-            if pages_in_pdf != _EXPECTED_PAGE_COUNT:
-                logger.warning(
-                    "File {pdf_file_path} had {pages_in_pdf} pages, {expected_pages} pages were expected. Check for tables spanning multiple pages",
-                    pdf_file_path=pdf_file_path,
-                    pages_in_pdf=pages_in_pdf,
-                    expected_pages=_EXPECTED_PAGE_COUNT,
-                )
-        except EmptyFileError as error:
-            message = f"Report conversion failed - empty PDF produced: {pdf_file_path}"
-            raise ReportConversionException(message) from error
-        except PdfReadError as error:
-            message = f"Report conversion failed - error reading resulting PDF: {pdf_file_path}"
-            raise ReportConversionException(message) from error
+    try:
+        pages_in_pdf = _count_pages(pdf_file_path)
+        if pages_in_pdf != EXPECTED_PAGE_COUNT:
+            logger.warning(
+                "File {pdf_file_path} had {pages_in_pdf} pages, {expected_pages} pages were expected. Check for tables spanning multiple pages",
+                pdf_file_path=pdf_file_path,
+                pages_in_pdf=pages_in_pdf,
+                expected_pages=EXPECTED_PAGE_COUNT,
+            )
+    except EmptyFileError as error:
+        message = f"Report conversion failed - empty PDF produced: {pdf_file_path}"
+        raise ReportConversionException(message) from error
+    except PdfReadError as error:
+        message = f"Report conversion failed - error reading resulting PDF: {pdf_file_path}"
+        raise ReportConversionException(message) from error
     return True
 
 
-def convert_all_reports(docx_report_paths: list[Path], output_pdf_paths: list[Path]) -> None:
-    """Convert all docx format reports in a directory to PDF format
+@dataclass
+class PdfValidationSummary:
+    """Results of validating a collection of PDF reports"""
+
+    valid: list[Path] = field(default_factory=list)
+    missing: list[Path] = field(default_factory=list)
+    empty: list[Path] = field(default_factory=list)
+    unreadable: list[Path] = field(default_factory=list)
+    unexpected_page_count: dict[Path, int] = field(default_factory=dict)
+
+    @property
+    def failed(self) -> list[Path]:
+        """PDFs that are missing, empty or unreadable"""
+        return sorted([*self.missing, *self.empty, *self.unreadable])
+
+    def record(self, pdf_file_path: Path, category: str, pages_in_pdf: Optional[int]) -> None:
+        """Record the result of inspecting a PDF
+
+        Args:
+            pdf_file_path (Path): Path to PDF report
+            category (str): valid, missing, empty or unreadable
+            pages_in_pdf (Optional[int]): number of pages, if the PDF could be read
+        """
+        getattr(self, category).append(pdf_file_path)
+        if pages_in_pdf is not None and pages_in_pdf != EXPECTED_PAGE_COUNT:
+            self.unexpected_page_count[pdf_file_path] = pages_in_pdf
+
+    def check(self, pdf_file_path: Path) -> bool:
+        """Inspect a PDF and record the result
+
+        Args:
+            pdf_file_path (Path): Path to PDF report
+
+        Returns:
+            bool: True if the PDF is valid
+        """
+        category, pages_in_pdf = _inspect_pdf(pdf_file_path)
+        self.record(pdf_file_path, category, pages_in_pdf)
+        return category == "valid"
+
+    def check_bytes(self, pdf_file_path: Path, pdf_bytes: Optional[bytes]) -> bool:
+        """Inspect a PDF held in memory and record the result
+
+        Args:
+            pdf_file_path (Path): Path or file name the PDF report will be written to
+            pdf_bytes (Optional[bytes]): PDF contents, None if the PDF wasn't produced
+
+        Returns:
+            bool: True if the PDF is valid
+        """
+        category, pages_in_pdf = _inspect_pdf_bytes(pdf_bytes)
+        self.record(pdf_file_path, category, pages_in_pdf)
+        return category == "valid"
+
+    def log_page_count_warnings(self) -> None:
+        """Log every PDF that has an unexpected number of pages"""
+        if not self.unexpected_page_count:
+            return
+        page_counts = "\n".join(f"{path}: {pages}" for path, pages in sorted(self.unexpected_page_count.items()))
+        logger.warning(
+            "{count} files did not have the {expected_pages} pages expected. Check for tables spanning multiple pages:\n{page_counts}",
+            count=len(self.unexpected_page_count),
+            expected_pages=EXPECTED_PAGE_COUNT,
+            page_counts=page_counts,
+        )
+
+    def report(self) -> None:
+        """Log every PDF with an unexpected number of pages, then raise if any PDFs failed validation
+
+        Raises:
+            ReportConversionException: If any PDFs failed validation
+        """
+        self.log_page_count_warnings()
+        self.raise_if_failed()
+
+    def raise_if_failed(self) -> None:
+        """Raise an exception listing every PDF that is missing, empty or unreadable
 
-    Doing this all at once means that MS Word on OSX doesn't need to be granted access to each input file directly
+        Raises:
+            ReportConversionException: If any PDFs failed validation
+        """
+        if not self.failed:
+            return
+        problems = {"does not exist": self.missing, "empty PDF produced": self.empty, "error reading resulting PDF": self.unreadable}
+        details = "\n".join(f"{problem}: {', '.join(str(path) for path in paths)}" for problem, paths in problems.items() if paths)
+        message = f"Report conversion failed for {len(self.failed)} PDFs\n{details}"
+        raise ReportConversionException(message)
+
+
+def _inspect_pdf(pdf_file_path: Path) -> tuple[str, Optional[int]]:
+    """Categorise a single PDF report, returning the category and page count if readable"""
+    if not pdf_file_path.exists():
+        return "missing", None
+    return _categorise_pdf(lambda: _count_pages(pdf_file_path))
+
+
+def _inspect_pdf_bytes(pdf_bytes: Optional[bytes]) -> tuple[str, Optional[int]]:
+    """Categorise a single PDF report held in memory, returning the category and page count if readable"""
+    if pdf_bytes is None:
+        return "missing", None
+    return _categorise_pdf(lambda: _read_page_count(io.BytesIO(pdf_bytes)))
+
+
+def _categorise_pdf(count_pages: Callable[[], int]) -> tuple[str, Optional[int]]:
+    """Categorise a PDF by whether its pages can be counted"""
+    try:
+        return "valid", count_pages()
+    except EmptyFileError:
+        return "empty", None
+    except (PdfReadError, KeyError, TypeError, ValueError):
+        return "unreadable", None
+
+
+def validate_pdfs(pdf_file_paths: list[Path], workers: Optional[int] = None) -> PdfValidationSummary:
+    """Validate PDF reports concurrently, collecting every problem instead of stopping at the first
+
+    Args:
+        pdf_file_paths (list[Path]): Paths to PDF reports
+        workers (Optional[int]): Number of threads to use, defaults to the ThreadPoolExecutor default
+
+    Returns:
+        PdfValidationSummary: Summary of valid and invalid PDFs
+    """
+    summary = PdfValidationSummary()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_inspect_pdf, pdf_file_paths)
+        for pdf_file_path, (category, pages_in_pdf) in zip(pdf_file_paths, results):
+            summary.record(pdf_file_path, category, pages_in_pdf)
+    return summary
+
+
+def convert_all_reports(docx_report_paths: list[Path], output_pdf_paths: list[Path], converter: Optional[PdfConverter] = None) -> None:
+    """Convert docx format reports to PDF format and validate the resulting PDFs
 
     Args:
         docx_report_paths (list[Path]): Paths to input docx report files
         output_pdf_paths (list[Path]): Paths to resulting output pdf report files
+        converter (Optional[PdfConverter]): Conversion backend, defaults to docx2pdf using Microsoft Word
     """
+    if converter is None:
+        converter = Docx2PdfConverter()
+
     # Removing previous pdfs so OSX doesn't need to grant access to those files
     for path in output_pdf_paths:
         path.unlink(missing_ok=True)
 
-    convert(input_path=docx_report_paths[0].parent)
+    converter.convert(docx_report_paths, output_pdf_paths)
 
     logger.info("Validating output PDFs")
-    for report_path, output_path in zip(docx_report_paths, output_pdf_paths):
-        if not validate_pdf(output_path):
-            message = "Report conversion failed - invalid PDF produced"
-            logger.error("{message} for docx {report}", message=message, report=report_path)
-            raise ReportConversionException(message)
+    validation = validate_pdfs(output_pdf_paths)
+    validation.report()
 
 
 def concatenate_pdf_reports(report_collection: list[Path], output_dir: Path, output_file_name: str = "uat_combined") -> None:
@@ -141,3 +416,128 @@ def concatenate_pdf_reports(report_collection: list[Path], output_dir: Path, out
     merger.write(output_path)
     merger.close()
     logger.success("UAT pdf written to {path} !", path=output_path)
+
+
+Bookmarks = list[tuple[str, int]]
+
+
+def _merge_batch(pdf_paths: list[Path], output_path: Path, input_bookmarks: list[Bookmarks], write_bookmarks: bool) -> tuple[Path, Bookmarks]:
+    """Merge a batch of PDFs into a single file, carrying forward the bookmarks of each input
+
+    Bookmarks are tracked as (title, page number) pairs and only written to the final output,
+    as outlines aren't reliably imported from intermediate merged files.
+
+    Args:
+        pdf_paths (list[Path]): PDFs to merge, in order
+        output_path (Path): merged PDF to write
+        input_bookmarks (list[Bookmarks]): bookmarks within each input PDF
+        write_bookmarks (bool): add the bookmarks to the merged PDF
+
+    Returns:
+        tuple[Path, Bookmarks]: the merged PDF and its bookmarks
+    """
+    writer = PdfWriter()
+    bookmarks = []
+    for pdf, pdf_bookmarks in zip(pdf_paths, input_bookmarks):
+        page_offset = len(writer.pages)
+        writer.append(pdf, import_outline=False)
+        bookmarks.extend((title, page_offset + page_number) for title, page_number in pdf_bookmarks)
+    if write_bookmarks:
+        for title, page_number in bookmarks:
+            writer.add_outline_item(title, page_number)
+    with output_path.open("wb") as output_file:
+        writer.write(output_file)
+    return output_path, bookmarks
+
+
+def _tree_merge(pdf_paths: list[Path], output_path: Path, batch_size: int, executor: Executor, work_dir: Path) -> None:
+    """Merge PDFs in parallel batches, then merge the batch outputs until a single batch remains to write to the output
+
+    Args:
+        pdf_paths (list[Path]): school PDF reports to merge, in order
+        output_path (Path): merged PDF to write, with a bookmark for each school
+        batch_size (int): maximum number of PDFs open in any single merge
+        executor (Executor): executor to run batch merges on
+        work_dir (Path): directory for intermediate merged PDFs
+    """
+    parts = pdf_paths
+    bookmarks = [[(pdf.stem.removeprefix("report_"), 0)] for pdf in pdf_paths]
+    level = 0
+    while len(parts) > batch_size:
+        batch_starts = range(0, len(parts), batch_size)
+        merged = executor.map(
+            _merge_batch,
+            [parts[start : start + batch_size] for start in batch_starts],
+            [work_dir / f"{output_path.stem}_level_{level}_batch_{index}.pdf" for index in range(len(batch_starts))],
+            [bookmarks[start : start + batch_size] for start in batch_starts],
+            repeat(False),
+        )
+        merged_parts, bookmarks = (list(values) for values in zip(*merged))
+        if level > 0:
+            for intermediate in parts:
+                intermediate.unlink()
+        parts = merged_parts
+        level += 1
+    _merge_batch(parts, output_path, bookmarks, write_bookmarks=True)
+    if level > 0:
+        for intermediate in parts:
+            intermediate.unlink()
+
+
+def merge_pdf_reports(
+    report_collection: list[Path],
+    output_dir: Path,
+    output_file_name: str = "uat_combined",
+    batch_size: int = 50,
+    volume_size: Optional[int] = DEFAULT_VOLUME_SIZE,
+    workers: Optional[int] = None,
+) -> list[Path]:
+    """Concatenate PDF reports by merging batches in parallel, with a bookmark for each report
+
+    No single merge has more than `batch_size` PDFs open, and each batch is written to disk as soon as it is merged.
+    The final write of each output file holds that file in memory, so reports are split into volumes of
+    `volume_size` reports to bound memory use.
+
+    Args:
+        report_collection (list[Path]): List of individual PDFs
+        output_dir (Path): Output result file directory
+        output_file_name (str, optional): Optional output filename, suffixed with the volume number if there is more than one volume
+        batch_size (int): Number of PDFs merged together at once
+        volume_size (Optional[int]): Number of reports in each output file. If None, all reports are written to one file
+            and the whole file is held in memory while it is written
+        workers (Optional[int]): Number of merge processes, defaults to the number of CPUs
+
+    Raises:
+        ReportConversionException: If no PDFs are provided, or any PDF is missing or empty
+
+    Returns:
+        list[Path]: the concatenated PDF files
+    """
+    logger.info("Combining PDFs for user acceptance in batches of {batch_size}", batch_size=batch_size)
+    if len(report_collection) == 0:
+        message = "Concatenation error - no PDFs provided"
+        raise ReportConversionException(message)
+    if batch_size < 2:
+        message = "Concatenation error - batch size must be at least 2"
+        raise ReportConversionException(message)
+    for pdf in report_collection:
+        if not pdf.exists():
+            message = f"Concatenation error - one or more provided PDFs does not exist: {pdf}"
+            raise ReportConversionException(message)
+        if pdf.stat().st_size == 0:
+            message = f"Concatenation error - empty file included in concatenation: {pdf}"
+            raise ReportConversionException(message)
+
+    if volume_size is None or len(report_collection) <= volume_size:
+        volumes = {output_dir / f"{output_file_name}.pdf": report_collection}
+    else:
+        volumes = {
+            output_dir / f"{output_file_name}_volume_{number + 1:03d}.pdf": report_collection[start : start + volume_size]
+            for number, start in enumerate(range(0, len(report_collection), volume_size))
+        }
+
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".merge_") as work_dir, ProcessPoolExecutor(max_workers=workers) as executor:
+        for output_path, volume_reports in volumes.items():
+            _tree_merge(volume_reports, output_path, batch_size, executor, Path(work_dir))
+            logger.success("UAT pdf written to {path} !", path=output_path)
+    return list(volumes)
@@ -0,0 +1,88 @@
+"""Grouping of school report emails by recipient, so that each person gets one email for all of their schools
+
+A teacher leader is on the mailing list of every school they cover, so sending an email for each school sends them
+one email per school. Grouping sends each set of recipients who share the same schools a single email with every one
+of those schools' reports attached, split into several emails if the attachments would be too large.
+"""
+from dataclasses import dataclass
+
+from loguru import logger
+
+
+@dataclass
+class EmailGroup:
+    """Schools whose reports are sent together in one email, to recipients who receive every one of these reports"""
+
+    key: str
+    recipients: list[str]
+    school_ids: list[str]
+
+
+def group_by_recipients(mail_info: dict[str, dict]) -> list[EmailGroup]:
+    """Group schools so that each recipient is in the one group for all of the schools they receive reports for
+
+    Recipients who receive reports for exactly the same schools share a group, such as two teachers at one school.
+    A recipient never receives a report for a school they aren't on the mailing list of.
+
+    Args:
+        mail_info (dict[str, dict]): Mailing information for each school ID, in sending order
+
+    Returns:
+        list[EmailGroup]: Groups in order of their first school, keyed by position
+    """
+    recipient_schools: dict[str, list[str]] = {}
+    recipient_addresses: dict[str, str] = {}
+    for school_id, school_mail_info in mail_info.items():
+        for address in school_mail_info["mailing_list"]:
+            recipient = address.lower()
+            recipient_addresses.setdefault(recipient, address)
+            schools = recipient_schools.setdefault(recipient, [])
+            if school_id not in schools:
+                schools.append(school_id)
+
+    school_set_recipients: dict[tuple[str, ...], list[str]] = {}
+    for recipient, school_ids in recipient_schools.items():
+        school_set_recipients.setdefault(tuple(school_ids), []).append(recipient_addresses[recipient])
+
+    school_order = {school_id: position for position, school_id in enumerate(mail_info)}
+    school_sets = sorted(school_set_recipients, key=lambda school_ids: (school_order[school_ids[0]], len(school_ids)))
+    return [
+        EmailGroup(f"group_{position + 1}", school_set_recipients[school_ids], list(school_ids)) for position, school_ids in enumerate(school_sets)
+    ]
+
+
+def split_by_attachment_size(groups: list[EmailGroup], report_sizes: dict[str, int], max_attachment_bytes: int) -> list[EmailGroup]:
+    """Split groups whose reports would be too large to attach to a single email
+
+    Reports are kept in order, starting a new email whenever the next report would take it over the limit.
+    A report over the limit on its own is sent in an email of its own.
+
+    Args:
+        groups (list[EmailGroup]): Email groups
+        report_sizes (dict[str, int]): Size of each school's report in bytes
+        max_attachment_bytes (int): Maximum total size of the reports attached to one email
+
+    Returns:
+        list[EmailGroup]: Groups within the size limit, split groups keyed by the original key and part number
+    """
+    split_groups = []
+    for group in groups:
+        parts: list[list[str]] = [[]]
+        part_size = 0
+        for school_id in group.school_ids:
+            report_size = report_sizes[school_id]
+            if report_size > max_attachment_bytes:
+                logger.warning(
+                    "Report for {school} is {size} bytes, over the attachment limit, so is sent on its own", school=school_id, size=report_size
+                )
+            if parts[-1] and part_size + report_size > max_attachment_bytes:
+                parts.append([])
+                part_size = 0
+            parts[-1].append(school_id)
+            part_size += report_size
+
+        if len(parts) == 1:
+            split_groups.append(group)
+            continue
+        split_groups.extend(EmailGroup(f"{group.key}_part_{number}", group.recipients, part) for number, part in enumerate(parts, start=1))
+    return split_groups
@@ -0,0 +1,278 @@
+"""Report creation with reports passed between stages in memory
+
+Docx reports are rendered to bytes, converted to PDF bytes and validated without being written to the output location.
+Only the final PDF reports and the combined UAT PDF are written, either to a directory or straight into a zip archive.
+The combined UAT PDF is split into volumes, each streamed to its destination once it is full, to bound memory use.
+"""
+import io
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import pandas as pd
+from loguru import logger
+from pypdf import PdfWriter
+from tqdm import tqdm
+
+from rred_reports.reports.converters import PdfConverter
+from rred_reports.reports.generate import DEFAULT_VOLUME_SIZE, PdfValidationSummary, report_file_stem
+from rred_reports.reports.schools import precompute_school_tables, school_report_bytes
+
+
+class ReportSink(ABC):
+    """Destination for the final report artifacts"""
+
+    @abstractmethod
+    def write(self, file_name: str, data: bytes) -> None:
+        """Write a single artifact
+
+        Args:
+            file_name (str): artifact file name
+            data (bytes): artifact contents
+        """
+
+    @abstractmethod
+    def open(self, file_name: str) -> BinaryIO:
+        """Open a single artifact for writing, for artifacts too large to build in memory first
+
+        Args:
+            file_name (str): artifact file name
+
+        Returns:
+            BinaryIO: writable file, which the caller closes once the artifact is written
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Finish writing artifacts"""
+
+    def __enter__(self) -> "ReportSink":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+class DirectorySink(ReportSink):
+    """Write each artifact as a file in a directory"""
+
+    def __init__(self, output_dir: Path):
+        """
+        Args:
+            output_dir (Path): directory to write artifacts to, created if it doesn't exist
+        """
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(self, file_name: str, data: bytes) -> None:
+        """Write an artifact to a file in the output directory
+
+        Args:
+            file_name (str): artifact file name
+            data (bytes): artifact contents
+        """
+        (self.output_dir / file_name).write_bytes(data)
+
+    def open(self, file_name: str) -> BinaryIO:
+        """Open a file in the output directory for writing
+
+        Args:
+            file_name (str): artifact file name
+
+        Returns:
+            BinaryIO: writable file
+        """
+        return (self.output_dir / file_name).open(mode="wb")
+
+    def close(self) -> None:
+        """Nothing to finish, as each artifact is written as soon as it is received"""
+
+
+class ZipSink(ReportSink):
+    """Write all artifacts into a single zip archive"""
+
+    def __init__(self, archive_path: Path):
+        """
+        Args:
+            archive_path (Path): zip archive to create, replacing any existing archive
+        """
+        self.archive_path = archive_path
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self.archive = zipfile.ZipFile(archive_path, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, file_name: str, data: bytes) -> None:
+        """Add an artifact to the archive
+
+        Args:
+            file_name (str): artifact file name within the archive
+            data (bytes): artifact contents
+        """
+        self.archive.writestr(file_name, data)
+
+    def open(self, file_name: str) -> BinaryIO:
+        """Open an archive member for writing, compressing it as it is written
+
+        Args:
+            file_name (str): artifact file name within the archive
+
+        Returns:
+            BinaryIO: writable archive member
+        """
+        return _PositionTrackingWriter(self.archive.open(file_name, mode="w", force_zip64=True))
+
+    def close(self) -> None:
+        """Write the archive's central directory and close it"""
+        self.archive.close()
+
+
+class _PositionTrackingWriter(io.RawIOBase):
+    """Writable file that reports its position without seeking, as PDF writers need but archive members can't seek"""
+
+    def __init__(self, raw: BinaryIO):
+        """
+        Args:
+            raw (BinaryIO): writable file that can't seek
+        """
+        super().__init__()
+        self.raw = raw
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.raw.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self) -> None:
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+def create_school_reports_in_memory(
+    processed_data: pd.DataFrame,
+    template_file: Path,
+    report_year: int,
+    converter: PdfConverter,
+    sink: ReportSink,
+    output_file_name: str = "uat_combined",
+    batch_size: int = 20,
+    keep_docx: bool = False,
+    volume_size: Optional[int] = DEFAULT_VOLUME_SIZE,
+) -> PdfValidationSummary:
+    """Render, convert and validate school reports in memory, writing only the PDF reports and the combined UAT PDF
+
+    Reports are rendered and converted in batches of `batch_size`, so only one batch of docx reports is held in memory.
+    The combined UAT PDF is split into volumes of `volume_size` reports, as for reports combined from disk, and each
+    volume is written to the sink as soon as it is full. Once a report fails validation no further volumes are written,
+    as they would be missing that report. Every report is created, as there are no existing files to compare against
+    the manifest.
+
+    Args:
+        processed_data (pd.DataFrame): Pandas dataframe of processed data
+        template_file (Path): The template file to be used
+        report_year (int): Year of report end
+        converter (PdfConverter): PDF conversion backend
+        sink (ReportSink): destination for the PDF reports and UAT PDF
+        output_file_name (str): file name of the combined UAT PDF, without extension, suffixed with the volume number
+            if there are more schools than fit in one volume
+        batch_size (int): number of reports converted at once
+        keep_docx (bool): also write the docx reports to the sink
+        volume_size (Optional[int]): Number of reports in each volume of the combined UAT PDF. If None, all reports
+            are combined into one file, held in memory until it is written
+
+    Raises:
+        ReportConversionException: If any PDF report is missing, empty or unreadable
+
+    Returns:
+        PdfValidationSummary: Validation results for the PDF reports
+    """
+    tables_by_school = {
+        school_id: tables for school_id, tables in precompute_school_tables(processed_data, report_year).items() if tables.school_name
+    }
+    logger.info("Creating {total_schools} school reports in memory", total_schools=len(tables_by_school))
+
+    validation = PdfValidationSummary()
+    school_ids = list(tables_by_school)
+    volumes = _CombinedVolumes(sink, output_file_name, volume_size, split=volume_size is not None and len(school_ids) > volume_size)
+    with tqdm(total=len(school_ids)) as progress:
+        for start in range(0, len(school_ids), batch_size):
+            batch_ids = school_ids[start : start + batch_size]
+            docx_reports = {
+                f"{report_file_stem(school_id)}.docx": school_report_bytes(tables_by_school[school_id], template_file) for school_id in batch_ids
+            }
+            pdf_reports = converter.convert_bytes(docx_reports)
+
+            for school_id, docx_name in zip(batch_ids, docx_reports):
+                pdf_name = str(Path(docx_name).with_suffix(".pdf"))
+                pdf_bytes = pdf_reports.get(pdf_name)
+                is_valid = validation.check_bytes(Path(pdf_name), pdf_bytes)
+                if keep_docx:
+                    sink.write(docx_name, docx_reports[docx_name])
+                if not is_valid:
+                    continue
+                sink.write(pdf_name, pdf_bytes)
+                if not validation.failed:
+                    volumes.append(str(school_id), pdf_bytes)
+            progress.update(len(batch_ids))
+
+    validation.report()
+
+    volumes.finish()
+    logger.success("Wrote {report_count} PDF reports and the UAT pdf", report_count=len(validation.valid))
+    return validation
+
+
+class _CombinedVolumes:
+    """Combined UAT PDF, written to a sink one volume at a time with a bookmark for each report"""
+
+    def __init__(self, sink: ReportSink, output_file_name: str, volume_size: Optional[int], split: bool):
+        """
+        Args:
+            sink (ReportSink): destination for the volumes
+            output_file_name (str): file name of the combined UAT PDF, without extension
+            volume_size (Optional[int]): number of reports in each volume, or None for a single file
+            split (bool): suffix each file name with its volume number, as there will be more than one volume
+        """
+        self.sink = sink
+        self.output_file_name = output_file_name
+        self.volume_size = volume_size
+        self.split = split
+        self.volume_count = 0
+        self.reports_in_volume = 0
+        self.writer = PdfWriter()
+
+    def append(self, report_name: str, pdf_bytes: bytes) -> None:
+        """Add a report to the current volume, writing the volume once it is full
+
+        Args:
+            report_name (str): bookmark title for the report
+            pdf_bytes (bytes): PDF report contents
+        """
+        page_offset = len(self.writer.pages)
+        self.writer.append(io.BytesIO(pdf_bytes), import_outline=False)
+        self.writer.add_outline_item(report_name, page_offset)
+        self.reports_in_volume += 1
+        if self.reports_in_volume == self.volume_size:
+            self._write_volume()
+
+    def finish(self) -> None:
+        """Write the last volume, or the empty combined PDF if there were no reports"""
+        if self.reports_in_volume or not self.volume_count:
+            self._write_volume()
+
+    def _write_volume(self) -> None:
+        """Stream the current volume to the sink, then start the next volume"""
+        self.volume_count += 1
+        file_name = f"{self.output_file_name}_volume_{self.volume_count:03d}.pdf" if self.split else f"{self.output_file_name}.pdf"
+        with self.sink.open(file_name) as handle:
+            self.writer.write(handle)
+        logger.success("UAT pdf written to {file_name} !", file_name=file_name)
+        self.writer = PdfWriter()
+        self.reports_in_volume = 0
@@ -1,23 +1,55 @@
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, Any, Callable, Optional
 
 import typer
 from loguru import logger
-from tqdm import tqdm
 
 from rred_reports import ReportType, get_config, get_report_year_files
-from rred_reports.dispatch_list import get_mailing_info
+from rred_reports.dispatch_list import DispatchDirectory
 from rred_reports.masterfile import read_and_process_masterfile
-from rred_reports.reports.generate import generate_report_school, convert_all_reports, concatenate_pdf_reports
+from rred_reports.masterfile_store import load_school_rows, school_row_counts, update_masterfile_store
+from rred_reports.reports.converters import ConverterType, PdfConverter, get_converter
+from rred_reports.reports.dispatcher import MailDispatcher, SendOutcome, SendStatus
+from rred_reports.reports.generate import (
+    DEFAULT_VOLUME_SIZE,
+    EXPECTED_PAGE_COUNT,
+    generate_report_school,
+    generate_rollup_reports,
+    convert_all_reports,
+    concatenate_pdf_reports,
+    merge_pdf_reports,
+    validate_pdfs,
+)
+from rred_reports.reports.auth import ExchangeSession
+from rred_reports.reports import get_settings
 from rred_reports.reports.emails import school_mailer
-from rred_reports.validation import log_school_id_inconsistencies, write_issues_if_exist
+from rred_reports.reports.grouping import EmailGroup, group_by_recipients, split_by_attachment_size
+from rred_reports.reports.in_memory import DirectorySink, ZipSink, create_school_reports_in_memory
+from rred_reports.reports.manifest import ReportManifest, file_hash
+from rred_reports.reports.pdf_renderer import PdfLayout, RendererType, write_layout_docx
+from rred_reports.reports.pipeline import ReportPipeline
+from rred_reports.reports.planner import ReportPlan, TableCapacities, plan_reports, plan_table
+from rred_reports.reports.schools import precompute_report_tables
+from rred_reports.reports.send_journal import SEND_JOURNAL_FILE_NAME, SendJournal
+from rred_reports.reports.shards import Shard, ShardMergeException, ShardStrategy, merge_shards, shard_school_ids, write_shard_record
+from rred_reports.reports.transports import EwsTransport, MailTransport, SmtpTransport, TransportType
+from rred_reports.validation import check_data_quality, check_school_ids
 
 app = typer.Typer()
 
 TOP_LEVEL_DIR = Path(__file__).resolve().parents[3]
 
+REPORT_DIRECTORIES = {ReportType.SCHOOL: "schools", ReportType.CENTRE: "centres", ReportType.NATIONAL: "national"}
 
-def validate_data_sources(year: int, template_file: Path, masterfile_path: Path, dispatch_path: Path, top_level_dir: Optional[Path] = None) -> dict:
+
+def validate_data_sources(
+    year: int,
+    template_file: Path,
+    masterfile_path: Path,
+    dispatch_path: Path,
+    top_level_dir: Optional[Path] = None,
+    level: ReportType = ReportType.SCHOOL,
+) -> dict:
     """Perform some basic data source validation
 
     Args:
@@ -27,25 +59,27 @@ def validate_data_sources(year: int, template_file: Path, masterfile_path: Path,
         dispatch_path (Path): Dispatch file
         top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
             data can be found. Defaults to None.
+        level (ReportType): report level, used for the output directory. Defaults to school.
 
     Raises:
         processed_data_missing_error: FileNotFound error for missing processed data case
         FileNotFoundError: FileNotFoundError for missing template file
 
     Returns:
-        dict: Dictionary of validated data sources
+        dict: Dictionary of validated data sources, with the hash of the masterfile file
     """
     if top_level_dir is None:
         top_level_dir = TOP_LEVEL_DIR
 
     data_path = top_level_dir / masterfile_path
     template_file_path = top_level_dir / template_file
-    report_dir = top_level_dir / "output" / "reports" / str(year) / "schools"
+    report_dir = top_level_dir / "output" / "reports" / str(year) / REPORT_DIRECTORIES[level]
 
     processed_data = read_and_process_masterfile(data_path)
+    masterfile_hash = file_hash(data_path)
     issues_file = top_level_dir / "output" / "issues" / f"{year}_school_id_issues.xlsx"
-    issues = log_school_id_inconsistencies(processed_data, top_level_dir / dispatch_path, year)
-    write_issues_if_exist(issues, issues_file)
+    check_school_ids(processed_data, masterfile_hash, top_level_dir / dispatch_path, year, issues_file)
+    check_data_quality(processed_data, masterfile_hash, top_level_dir / "output" / "issues" / f"{year}_data_quality_issues.xlsx")
 
     try:
         assert template_file_path.is_file()
@@ -56,12 +90,21 @@ def validate_data_sources(year: int, template_file: Path, masterfile_path: Path,
     if not report_dir.exists():
         report_dir.mkdir(parents=True)
 
-    return {"data": processed_data, "template_file": template_file_path, "output_dir": report_dir}
+    return {"data": processed_data, "masterfile_hash": masterfile_hash, "template_file": template_file_path, "output_dir": report_dir}
 
 
 @app.command()
 def generate(
-    level: ReportType, year: int, config_file: Path = "src/rred_reports/reports/report_config.toml", top_level_dir: Optional[Path] = None
+    level: ReportType,
+    year: int,
+    config_file: Path = "src/rred_reports/reports/report_config.toml",
+    top_level_dir: Optional[Path] = None,
+    force: bool = False,
+    renderer: RendererType = RendererType.DOCX,
+    school_id: Annotated[Optional[list[str]], typer.Option([])] = (),
+    resume: bool = False,
+    shard: Optional[str] = None,
+    shard_strategy: ShardStrategy = ShardStrategy.HASH,
 ) -> Path:
     """Generate a report at the level specified
 
@@ -71,52 +114,471 @@ def generate(
         config_file (Path): path to config file
         top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
             data can be found. Defaults to None.
+        force (bool): Regenerate all reports, even those whose inputs haven't changed since the last run
+        renderer (RendererType): docx reports for conversion, or PDF reports rendered directly using the year's `pdf_layout`
+        school_id (Optional[list[str]]): Only regenerate the reports for these schools, loading their rows from the
+            school-partitioned masterfile store without validating the whole masterfile. Can be used multiple times.
+        resume (bool): Skip school reports completed by the previous run, using its checkpoint journal. Only
+            available for school reports
+        shard (Optional[str]): Only generate one shard of the school reports, given as `i/N`, into its own directory.
+            Once all N shards have been generated, combine them using `merge-shards`.
+        shard_strategy (ShardStrategy): Assign schools to shards by a hash of the school ID, or balanced by row count
+
+    Raises:
+        typer.Exit: With exit code 1 if any school reports failed, after generating all other reports
 
     Returns:
         Path: Output directory for generated reports
     """
     typer.echo(f"Generating report for level: {level.value}")
+    if school_id:
+        return _generate_schools(level, year, config_file, top_level_dir, renderer, list(school_id))
+    if shard is not None:
+        return _generate_shard(level, year, config_file, top_level_dir, renderer, shard, shard_strategy, force, resume)
+    output_dir, failed_schools = _generate_reports(level, year, config_file, top_level_dir, force, renderer, resume)
+    if failed_schools:
+        raise typer.Exit(code=1)
+    return output_dir
+
+
+def _generate_reports(
+    level: ReportType, year: int, config_file: Path, top_level_dir: Optional[Path], force: bool, renderer: RendererType, resume: bool
+) -> tuple[Path, list[str]]:
+    """Generate every report at the level specified, without exiting if any school reports fail
+
+    Raises:
+        typer.Exit: If the renderer or resume aren't available for the level
+
+    Returns:
+        tuple[Path, list[str]]: Output directory for generated reports, and the school IDs whose reports failed to generate
+    """
+    _check_level_options(level, renderer, resume)
+    generation_inputs = _load_generation_inputs(level, year, config_file, top_level_dir, renderer)
+    return generation_inputs["output_dir"], _generate_level(level, generation_inputs, year, force, resume=resume)
+
+
+def _check_level_options(level: ReportType, renderer: RendererType, resume: bool) -> None:
+    """Stop if options that are only available for school reports are used for centre or national reports"""
+    if renderer == RendererType.PDF and level != ReportType.SCHOOL:
+        typer.echo("Direct PDF rendering is only available for school reports! Please use the docx renderer.")
+        raise typer.Exit()
+    if resume and level != ReportType.SCHOOL:
+        typer.echo("Resuming is only available for school reports! Please rerun without '--resume'.")
+        raise typer.Exit()
+
+
+def _generate_level(
+    level: ReportType,
+    generation_inputs: dict,
+    year: int,
+    force: bool,
+    on_report_written: Optional[Callable[[Path], None]] = None,
+    resume: bool = False,
+) -> list[str]:
+    """Generate the reports for a single level, centre and national reports are rolled up from the masterfile in one pass
+
+    Returns:
+        list[str]: school IDs whose reports failed to generate
+    """
+    if level == ReportType.SCHOOL:
+        return generate_report_school(**generation_inputs, report_year=year, force=force, on_report_written=on_report_written, resume=resume)
+    level_outputs = {level: (generation_inputs["template_file"], generation_inputs["output_dir"])}
+    generate_rollup_reports(generation_inputs["processed_data"], year, level_outputs, force=force, on_report_written=on_report_written)
+    return []
+
+
+@app.command()
+def generate_all(
+    year: int,
+    config_file: Path = "src/rred_reports/reports/report_config.toml",
+    top_level_dir: Optional[Path] = None,
+    force: bool = False,
+) -> dict[ReportType, Path]:
+    """Generate school, centre and national reports from a single aggregation pass over the masterfile
+
+    Centre and national reports are only generated if a rollup template is configured for the year.
+
+    Args:
+        year (int): Year to process
+        config_file (Path): path to config file
+        top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
+            data can be found. Defaults to None.
+        force (bool): Regenerate all reports, even those whose inputs haven't changed since the last run
+
+    Returns:
+        dict[ReportType, Path]: Output directory for each report level
+    """
+    if top_level_dir is None:
+        top_level_dir = TOP_LEVEL_DIR
     config = get_config(config_file)
+    generation_inputs = _load_generation_inputs(ReportType.SCHOOL, year, config_file, top_level_dir, RendererType.DOCX)
 
-    dispatch_path, masterfile_path, template_file_path = get_report_year_files(config, level, year)
-    validated_data = validate_data_sources(year, template_file_path, masterfile_path, dispatch_path=dispatch_path, top_level_dir=top_level_dir)
-    processed_data, template_file, output_dir = validated_data.values()
+    level_outputs = {}
+    for level in ReportType:
+        if level != ReportType.SCHOOL and str(year) not in config.get(level.value, {}):
+            logger.warning("No {level} rollup template configured for {year}, skipping {level} reports", level=level.value, year=year)
+            continue
+        *_, template_file_path = get_report_year_files(config, level, year)
+        output_dir = top_level_dir / "output" / "reports" / str(year) / REPORT_DIRECTORIES[level]
+        output_dir.mkdir(parents=True, exist_ok=True)
+        level_outputs[level] = (top_level_dir / template_file_path, output_dir)
 
-    if level.value.lower() == "school":
-        generate_report_school(processed_data, template_file, output_dir, year)
-    else:
-        typer.echo("Other levels currently not implemented! Please select 'school'.")
+    generate_rollup_reports(generation_inputs["processed_data"], year, level_outputs, force=force)
+    return {level: output_dir for level, (_template_file, output_dir) in level_outputs.items()}
+
+
+def _generate_schools(
+    level: ReportType, year: int, config_file: Path, top_level_dir: Optional[Path], renderer: RendererType, school_ids: list[str]
+) -> Path:
+    """Regenerate the reports for a few schools, only loading their rows from the masterfile store"""
+    if level != ReportType.SCHOOL:
+        typer.echo("Selecting schools is only available for school reports! Please select 'school'.")
         raise typer.Exit()
+    store_inputs = _load_store_generation_inputs(level, year, config_file, top_level_dir, renderer)
+    output_dir = store_inputs["output_dir"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    logger.info("Regenerating reports for {schools}, skipping validation of the full masterfile", schools=school_ids)
+    school_rows = load_school_rows(store_inputs["masterfile_path"], school_ids, store_inputs["masterfile_hash"])
+    if not school_rows.empty and generate_report_school(
+        school_rows, store_inputs["template_file"], output_dir, year, force=True, pdf_layout=store_inputs["pdf_layout"]
+    ):
+        raise typer.Exit(code=1)
     return output_dir
 
 
+def _generate_shard(
+    level: ReportType,
+    year: int,
+    config_file: Path,
+    top_level_dir: Optional[Path],
+    renderer: RendererType,
+    shard_text: str,
+    strategy: ShardStrategy,
+    force: bool,
+    resume: bool,
+) -> Path:
+    """Generate the school reports for one shard, only loading the shard's rows from the masterfile store
+
+    Raises:
+        typer.BadParameter: If the shard isn't given as `i/N`
+        typer.Exit: With exit code 1 if any school reports failed, after generating all other reports in the shard
+
+    Returns:
+        Path: Output directory for the shard's reports
+    """
+    if level != ReportType.SCHOOL:
+        typer.echo("Sharded generation is only available for school reports! Please select 'school'.")
+        raise typer.Exit()
+    try:
+        shard = Shard.parse(shard_text)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="--shard") from error
+    store_inputs = _load_store_generation_inputs(level, year, config_file, top_level_dir, renderer)
+    shard_dir = _shards_dir(store_inputs["output_dir"]) / shard.directory_name
+
+    masterfile_path, masterfile_hash = store_inputs["masterfile_path"], store_inputs["masterfile_hash"]
+    school_ids = shard_school_ids(school_row_counts(masterfile_path, masterfile_hash), shard, strategy)
+    logger.info("Generating shard {index} of {count}: {school_count} schools", index=shard.index, count=shard.count, school_count=len(school_ids))
+    failed = []
+    school_rows = load_school_rows(masterfile_path, school_ids, masterfile_hash)
+    if not school_rows.empty:
+        failed = generate_report_school(
+            school_rows, store_inputs["template_file"], shard_dir, year, force=force, pdf_layout=store_inputs["pdf_layout"], resume=resume
+        )
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    write_shard_record(shard_dir, shard, strategy, masterfile_hash, school_ids, failed)
+    if failed:
+        raise typer.Exit(code=1)
+    return shard_dir
+
+
+@app.command("merge-shards")
+def merge_shard_reports(
+    level: ReportType,
+    year: int,
+    config_file: Path = "src/rred_reports/reports/report_config.toml",
+    top_level_dir: Optional[Path] = None,
+) -> Path:
+    """Check that every shard has been generated and combine their reports and manifests into the report directory
+
+    Args:
+        level (ReportType): school
+        year (int): Year to process
+        config_file (Path): path to config file
+        top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
+            data can be found. Defaults to None.
+
+    Raises:
+        typer.Exit: With exit code 1 if the shards are incomplete, failed or out of date
+
+    Returns:
+        Path: Report directory the shards were merged into
+    """
+    if level != ReportType.SCHOOL:
+        typer.echo("Sharded generation is only available for school reports! Please select 'school'.")
+        raise typer.Exit()
+    store_inputs = _load_store_generation_inputs(level, year, config_file, top_level_dir, RendererType.DOCX)
+    output_dir = store_inputs["output_dir"]
+    masterfile_hash = store_inputs["masterfile_hash"]
+    try:
+        merge_shards(_shards_dir(output_dir), output_dir, list(school_row_counts(store_inputs["masterfile_path"], masterfile_hash)), masterfile_hash)
+    except ShardMergeException as error:
+        logger.error(error.message)
+        raise typer.Exit(code=1) from error
+    return output_dir
+
+
+def _shards_dir(report_dir: Path) -> Path:
+    """Directory containing each shard's output directory, next to the report directory"""
+    return report_dir.with_name(f"{report_dir.name}_shards")
+
+
+def _load_store_generation_inputs(level: ReportType, year: int, config_file: Path, top_level_dir: Optional[Path], renderer: RendererType) -> dict:
+    """Template, output directory, PDF layout, masterfile path and masterfile hash for generating reports from the
+    masterfile store, without validating the whole masterfile
+    """
+    if top_level_dir is None:
+        top_level_dir = TOP_LEVEL_DIR
+    config = get_config(config_file)
+    _dispatch_path, masterfile_path, template_file_path = get_report_year_files(config, level, year)
+
+    template_file = top_level_dir / template_file_path
+    if not template_file.is_file():
+        logger.error(f"No template file found at {template_file}. Exiting.")
+        raise FileNotFoundError(template_file)
+
+    masterfile = top_level_dir / masterfile_path
+    if not masterfile.is_file():
+        logger.error(f"No processed data file found at {masterfile}. Exiting.")
+        raise FileNotFoundError(masterfile)
+
+    pdf_layout = None
+    if renderer == RendererType.PDF:
+        pdf_layout = PdfLayout.load(top_level_dir / _get_pdf_layout_file(config, level, year), template_file)
+    return {
+        "masterfile_path": masterfile,
+        "masterfile_hash": file_hash(masterfile),
+        "template_file": template_file,
+        "output_dir": top_level_dir / "output" / "reports" / str(year) / REPORT_DIRECTORIES[level],
+        "pdf_layout": pdf_layout,
+    }
+
+
+def _load_generation_inputs(level: ReportType, year: int, config_file: Path, top_level_dir: Optional[Path], renderer: RendererType) -> dict:
+    """Validate and load the data, template, output directory and PDF layout for generating reports"""
+    config = get_config(config_file)
+
+    dispatch_path, masterfile_path, template_file_path = get_report_year_files(config, level, year)
+    validated_data = validate_data_sources(
+        year, template_file_path, masterfile_path, dispatch_path=dispatch_path, top_level_dir=top_level_dir, level=level
+    )
+    update_masterfile_store(validated_data["data"], (top_level_dir or TOP_LEVEL_DIR) / masterfile_path, validated_data["masterfile_hash"])
+
+    pdf_layout = None
+    if renderer == RendererType.PDF:
+        pdf_layout = PdfLayout.load((top_level_dir or TOP_LEVEL_DIR) / _get_pdf_layout_file(config, level, year), validated_data["template_file"])
+    return {
+        "processed_data": validated_data["data"],
+        "template_file": validated_data["template_file"],
+        "output_dir": validated_data["output_dir"],
+        "pdf_layout": pdf_layout,
+    }
+
+
+def _get_pdf_layout_file(config: dict, level: ReportType, year: int) -> str:
+    """Layout file for direct PDF rendering from the report config"""
+    try:
+        return config[level.value][str(year)]["pdf_layout"]
+    except KeyError as error:
+        msg = f"No pdf_layout found in config for {level.value} reports in {year}. Please add this to the report config file."
+        raise KeyError(msg) from error
+
+
 @app.command()
-def convert(report_dir: Path, output: str = "result") -> Path:
+def plan(
+    level: ReportType,
+    year: int,
+    config_file: Path = "src/rred_reports/reports/report_config.toml",
+    top_level_dir: Optional[Path] = None,
+    renderer: RendererType = RendererType.DOCX,
+    output: Optional[Path] = None,
+    show_all: bool = False,
+) -> list[ReportPlan]:
+    """Predict which reports will have tables overflowing onto extra pages, before rendering any reports
+
+    Row counts of each report's tables are compared with the table capacities measured from the template and set
+    in the report config, or the rows reserved in the PDF layout when rendering directly to PDF.
+
+    Args:
+        level (ReportType): school
+        year (int): Year to process
+        config_file (Path): path to config file
+        top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
+            data can be found. Defaults to None.
+        renderer (RendererType): docx reports for conversion, or PDF reports rendered directly using the year's `pdf_layout`
+        output (Optional[Path]): Also write the plan for every report to this csv file
+        show_all (bool): Print the plan for every report, not only those predicted to overflow
+
+    Raises:
+        typer.Exit: If the table capacities haven't been set in the report config for docx reports
+
+    Returns:
+        list[ReportPlan]: Predicted size of each report
+    """
+    if level != ReportType.SCHOOL:
+        typer.echo("Planning is only available for school reports, centre and national reports only have a summary table!")
+        raise typer.Exit()
+    if renderer == RendererType.DOCX:
+        try:
+            capacities = TableCapacities.from_config(get_config(config_file), level, year)
+        except KeyError:
+            typer.echo(
+                f"No table_capacities or continuation_rows set for {level.value} reports in {year}! "
+                "Please measure them from a converted report of the year's template, as described in the report config file."
+            )
+            raise typer.Exit() from None
+    generation_inputs = _load_generation_inputs(level, year, config_file, top_level_dir, renderer)
+    if renderer == RendererType.PDF:
+        capacities = TableCapacities.from_layout(generation_inputs["pdf_layout"])
+
+    tables = precompute_report_tables(generation_inputs["processed_data"], year, levels=[level])[level]
+    plans = plan_reports(tables, capacities)
+    overflowing = [report_plan for report_plan in plans if report_plan.overflows]
+    if output is not None:
+        plan_table(plans, capacities).to_csv(output)
+        logger.info("Plan for {report_count} reports written to {output}", report_count=len(plans), output=output)
+
+    typer.echo(plan_table(plans if show_all else overflowing, capacities).to_string())
+    if overflowing:
+        logger.warning(
+            "{report_count} of {total} reports are predicted to have more than {expected_pages} pages: {reports}",
+            report_count=len(overflowing),
+            total=len(plans),
+            expected_pages=EXPECTED_PAGE_COUNT,
+            reports=[report_plan.school_id for report_plan in overflowing],
+        )
+    else:
+        logger.success("No reports are predicted to overflow, out of {total} reports", total=len(plans))
+    return plans
+
+
+@app.command()
+def layout(
+    year: int,
+    config_file: Path = "src/rred_reports/reports/report_config.toml",
+    top_level_dir: Optional[Path] = None,
+    converter: ConverterType = ConverterType.DOCX2PDF,
+) -> Path:
+    """Create the static layout PDF used to render school reports directly to PDF
+
+    Args:
+        year (int): Year to process
+        config_file (Path): path to config file
+        top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
+            data can be found. Defaults to None.
+        converter (ConverterType): PDF conversion backend for converting the layout docx
+
+    Returns:
+        Path: Path to the static layout PDF
+    """
+    if top_level_dir is None:
+        top_level_dir = TOP_LEVEL_DIR
+    config = get_config(config_file)
+    *_, template_file_path = get_report_year_files(config, ReportType.SCHOOL, year)
+    layout_file = top_level_dir / _get_pdf_layout_file(config, ReportType.SCHOOL, year)
+    static_pdf = layout_file.parent / get_config(layout_file)["static_pdf"]
+
+    layout_docx = static_pdf.with_suffix(".docx")
+    write_layout_docx(top_level_dir / template_file_path, layout_file, layout_docx)
+    get_converter(converter).convert([layout_docx], [static_pdf])
+    logger.success("Static layout PDF written to {path}, check that table rows line up with the layout file", path=static_pdf)
+    return static_pdf
+
+
+def _report_pdf_paths(report_dir: Path) -> list[Path]:
+    """PDF of each docx report in the directory, leaving out combined PDFs written by previous runs"""
+    return [report_path.with_suffix(".pdf") for report_path in sorted(report_dir.glob("*.docx"))]
+
+
+def _combine_pdfs(pdf_paths: list[Path], report_dir: Path, output: str, merge_batch_size: Optional[int], volume_size: Optional[int]) -> None:
+    """Concatenate PDF reports in one pass, or in parallel batches if a batch or volume size is given
+
+    Batched merges are split into volumes of the default size if no volume size is given, to bound memory use.
+    """
+    if merge_batch_size is None and volume_size is None:
+        concatenate_pdf_reports(pdf_paths, report_dir, output)
+        return
+    merge_pdf_reports(pdf_paths, report_dir, output, batch_size=merge_batch_size or 50, volume_size=volume_size or DEFAULT_VOLUME_SIZE)
+
+
+@app.command()
+def convert(
+    report_dir: Path,
+    output: str = "result",
+    force: bool = False,
+    converter: ConverterType = ConverterType.DOCX2PDF,
+    workers: Optional[int] = None,
+    merge_batch_size: Optional[int] = None,
+    volume_size: Optional[int] = None,
+) -> Path:
     """Convert multiple docx reports to PDF and concatenate into a single file
 
     Args:
         report_dir (Path): Directory containing generated docx reports
         output (str): Output file name, without extension
+        force (bool): Convert all reports, even those whose PDF is up to date with the docx report
+        converter (ConverterType): PDF conversion backend, libreoffice runs headless without Microsoft Word
+        workers (Optional[int]): Number of concurrent conversions, for backends that support it
+        merge_batch_size (Optional[int]): Concatenate PDFs in parallel batches of this size, with a bookmark for each report
+        volume_size (Optional[int]): Split the concatenated PDF into volumes of this many reports, defaults to
+            DEFAULT_VOLUME_SIZE when merging in batches
 
     Returns:
         Path: Path to directory containing PDF reports
     """
     logger.info("Converting docx reports to pdf reports. ")
-    report_paths = list(report_dir.glob("*.docx"))
-    pdf_paths = []
-    for report_path in sorted(report_paths):
-        output_path = report_path.with_suffix(".pdf")
-        pdf_paths.append(output_path)
-
-    convert_all_reports(report_paths, pdf_paths)
-
-    concatenate_pdf_reports(pdf_paths, report_dir, output)
+    report_paths = sorted(report_dir.glob("*.docx"))
+    pdf_paths = _report_pdf_paths(report_dir)
+
+    manifest = ReportManifest.load(report_dir)
+    to_convert = [
+        (report_path, pdf_path)
+        for report_path, pdf_path in zip(report_paths, pdf_paths)
+        if force or not manifest.pdf_is_current(report_path, pdf_path)
+    ]
+    if len(to_convert) < len(report_paths):
+        logger.info("Skipping {up_to_date} reports with up to date PDFs", up_to_date=len(report_paths) - len(to_convert))
+
+    if to_convert:
+        docx_to_convert, pdf_to_convert = (list(paths) for paths in zip(*to_convert))
+        convert_all_reports(docx_to_convert, pdf_to_convert, get_converter(converter, workers))
+        for report_path in docx_to_convert:
+            manifest.record_pdf(report_path)
+        manifest.save()
+
+    _combine_pdfs(pdf_paths, report_dir, output, merge_batch_size, volume_size)
 
     return report_dir
 
 
 @app.command()
-def create(level: ReportType, year: int, config_file: Path = "src/rred_reports/reports/report_config.toml", output: str = "uat_combined"):
+def create(
+    level: ReportType,
+    year: int,
+    config_file: Path = "src/rred_reports/reports/report_config.toml",
+    output: str = "uat_combined",
+    force: bool = False,
+    converter: ConverterType = ConverterType.DOCX2PDF,
+    workers: Optional[int] = None,
+    renderer: RendererType = RendererType.DOCX,
+    merge_batch_size: Optional[int] = None,
+    volume_size: Optional[int] = None,
+    pipeline: bool = False,
+    in_memory: bool = False,
+    archive: Optional[Path] = None,
+    resume: bool = False,
+):
     """Generate reports at the level specified, convert to PDF and concatenate
 
     Args:
@@ -124,10 +586,110 @@ def create(level: ReportType, year: int, config_file: Path = "src/rred_reports/r
         year (int): Year to process
         config_file (Path): path to config file
         output (str): Output file name for all report PDFs combined, without extension
+        force (bool): Regenerate and convert all reports, even those whose inputs haven't changed
+        converter (ConverterType): PDF conversion backend, libreoffice runs headless without Microsoft Word
+        workers (Optional[int]): Number of concurrent conversions, for backends that support it
+        renderer (RendererType): docx reports converted to PDF, or PDF reports rendered directly without conversion
+        merge_batch_size (Optional[int]): Concatenate PDFs in parallel batches of this size, with a bookmark for each report
+        volume_size (Optional[int]): Split the concatenated PDF into volumes of this many reports, defaults to
+            DEFAULT_VOLUME_SIZE when merging in batches or creating in memory
+        pipeline (bool): Convert and validate docx reports while the remaining reports are being generated, using a
+            converter other than docx2pdf
+        in_memory (bool): Pass school reports between stages in memory, only writing the PDF reports and combined PDF.
+            Every report is created, and the combined PDF is written in volumes without batched merging, so this
+            can't be used with resume, renderer, merge_batch_size or pipeline
+        archive (Optional[Path]): With in_memory, write the PDF reports and combined PDF into this zip archive
+        resume (bool): Skip school reports completed by the previous run, using its checkpoint journal. Only
+            available for school reports
+
+    Raises:
+        typer.Exit: With exit code 1 if any school reports failed, after converting and combining all other reports
     """
     typer.echo(f"Creating a report for level: {level.value}")
-    report_dir = generate(level, year, config_file)
-    convert(report_dir, output)
+    if in_memory:
+        unsupported = {
+            "--resume": resume,
+            "--renderer": renderer != RendererType.DOCX,
+            "--merge-batch-size": merge_batch_size is not None,
+            "--pipeline": pipeline,
+        }
+        if any(unsupported.values()):
+            options = ", ".join(option for option, is_set in unsupported.items() if is_set)
+            typer.echo(f"In memory report creation doesn't support {options}! Please create the reports without '--in-memory' to use them.")
+            raise typer.Exit()
+        _create_in_memory(level, year, config_file, output, get_converter(converter, workers), archive, volume_size)
+        return
+    if archive is not None:
+        typer.echo("Writing reports to an archive is only available with '--in-memory'!")
+        raise typer.Exit()
+    if pipeline and renderer == RendererType.DOCX:
+        if converter == ConverterType.DOCX2PDF:
+            typer.echo("Pipelined creation can't convert reports with Microsoft Word! Please add '--converter libreoffice'.")
+            raise typer.Exit()
+        report_dir, failed_schools = _create_pipelined(level, year, config_file, force, get_converter(converter, workers), resume)
+        _combine_pdfs(_report_pdf_paths(report_dir), report_dir, output, merge_batch_size, volume_size)
+    else:
+        report_dir, failed_schools = _generate_reports(level, year, config_file, None, force, renderer, resume)
+        if renderer == RendererType.PDF:
+            pdf_paths = sorted(report_dir.glob("report_*.pdf"))
+            validation = validate_pdfs(pdf_paths)
+            validation.report()
+            _combine_pdfs(pdf_paths, report_dir, output, merge_batch_size, volume_size)
+        else:
+            convert(report_dir, output, force=force, converter=converter, workers=workers, merge_batch_size=merge_batch_size, volume_size=volume_size)
+    if failed_schools:
+        logger.error(
+            "The reports for {school_count} schools failed to generate, so are missing from or out of date in {output}: {schools}",
+            school_count=len(failed_schools),
+            output=output,
+            schools=failed_schools,
+        )
+        raise typer.Exit(code=1)
+
+
+def _create_in_memory(
+    level: ReportType, year: int, config_file: Path, output: str, converter: PdfConverter, archive: Optional[Path], volume_size: Optional[int]
+) -> None:
+    """Create school reports without writing intermediate docx reports, to the report directory or a zip archive"""
+    if level != ReportType.SCHOOL:
+        typer.echo("In memory report creation is only available for school reports! Please select 'school'.")
+        raise typer.Exit()
+    generation_inputs = _load_generation_inputs(level, year, config_file, None, RendererType.DOCX)
+    sink = DirectorySink(generation_inputs["output_dir"]) if archive is None else ZipSink(archive)
+    with sink:
+        create_school_reports_in_memory(
+            generation_inputs["processed_data"],
+            generation_inputs["template_file"],
+            year,
+            converter,
+            sink,
+            output_file_name=output,
+            volume_size=volume_size or DEFAULT_VOLUME_SIZE,
+        )
+
+
+def _create_pipelined(
+    level: ReportType, year: int, config_file: Path, force: bool, converter: PdfConverter, resume: bool = False
+) -> tuple[Path, list[str]]:
+    """Generate docx reports while converting and validating those already written
+
+    Raises:
+        typer.Exit: If resume isn't available for the level
+
+    Returns:
+        tuple[Path, list[str]]: Output directory for generated reports, and the school IDs whose reports failed to generate
+    """
+    _check_level_options(level, RendererType.DOCX, resume)
+    generation_inputs = _load_generation_inputs(level, year, config_file, None, RendererType.DOCX)
+    report_dir = generation_inputs["output_dir"]
+    failed_schools = []
+
+    def generate_reports(on_report_written: Callable[[Path], None]) -> None:
+        failed_schools.extend(_generate_level(level, generation_inputs, year, force, on_report_written, resume=resume))
+
+    validation = ReportPipeline(converter).run(generate_reports, report_dir, force=force)
+    validation.report()
+    return report_dir, failed_schools
 
 
 @app.command()
@@ -138,9 +700,27 @@ def send_school(
     config_file: Path = "src/rred_reports/reports/report_config.toml",
     top_level_dir: Optional[Path] = None,
     override_mailto: Optional[str] = None,
-):
+    workers: int = 4,
+    messages_per_minute: float = 30,
+    max_attempts: int = 5,
+    resume: bool = False,
+    batch_size: Optional[int] = None,
+    transport: Optional[TransportType] = None,
+    group_by_recipient: bool = False,
+    max_attachment_mb: float = 15,
+) -> list[SendOutcome]:
     """Send reports to school contacts via RRED school ID
 
+    Emails are sent concurrently and rate limited, retrying when the server is throttling or busy.
+    A school whose email can't be sent is recorded and the remaining schools are still sent. A school whose send failed
+    in a way that may have sent the email, such as a dropped connection, is left as sending in the journal to be checked. Every send is recorded
+    in a send journal in the school report directory, with the recipients and a hash of the report.
+    With a batch size, emails are sent in batches of one request each, instead of a request per email, with the next
+    batches built while earlier batches are sent.
+    Emails are sent through Exchange, or through an SMTP server over pooled connections when the transport is SMTP.
+    Grouping by recipient sends each recipient one email with the reports of all of their schools, such as a teacher
+    leader covering many schools, instead of an email per school.
+
     Args:
         year (int): Report start year
         manual_id (Optional[list[str]], optional): List of school IDs from which to send reports. Defaults to empty list.
@@ -149,6 +729,20 @@ def send_school(
         top_level_dir (Optional[Path], optional): Non-standard top level directory in which input
             data can be found. Defaults to None.
         override_mailto (str, optional): Email address to override for each school, for use in manual testing and UAT
+        workers (int): Maximum number of emails being sent at once
+        messages_per_minute (float): Maximum number of emails sent per minute, Exchange Online allows 30 for each sender
+        max_attempts (int): Maximum number of attempts to send each school's email
+        resume (bool): Skip schools whose current report has already been sent to the same recipients, using the send journal
+        batch_size (Optional[int]): Number of emails to send in each request, sending each email in its own request if not given
+        transport (Optional[TransportType]): Mail server backend, the `mail_transport` setting if not given
+        group_by_recipient (bool): Send one email per set of recipients with all of their schools' reports attached
+        max_attachment_mb (float): Maximum total size in MB of the reports attached to a grouped email, larger groups are split
+
+    Raises:
+        typer.Exit: With exit code 1 if any emails couldn't be sent or may not have been sent, after sending all other emails
+
+    Returns:
+        list[SendOutcome]: Outcome for each school, or for each school in each group when grouping by recipient
     """
     config = get_config(config_file)
     dispatch_path, *_ = get_report_year_files(config, ReportType.SCHOOL, year)
@@ -157,37 +751,213 @@ def send_school(
         top_level_dir = TOP_LEVEL_DIR
 
     dispatch_list = top_level_dir / dispatch_path
+    report_directory = top_level_dir / "output" / "reports" / str(year) / "schools"
     school_ids = list(manual_id)
     if not manual_id:
-        report_directory = top_level_dir / "output" / "reports" / str(year) / "schools"
         for report_path in sorted(report_directory.glob("report_*.pdf")):
             school_ids.append(report_path.stem.split("_")[-1])
 
-    email_details = []
     logger.info("Getting dispatch list details for each school report pdf found")
-    for school_id in tqdm(school_ids):
-        email_info = get_mailing_info(school_id, dispatch_list, override_mailto)
-        email_details.append({"school_id": school_id, "mail_info": email_info})
+    dispatch_directory = DispatchDirectory.from_excel(dispatch_list)
+    mail_info = {school_id: dispatch_directory.mailing_info(school_id, override_mailto) for school_id in school_ids}
 
-    emailed_ids = set()
-    logger.info("Emailing each school")
-    for email_detail in tqdm(email_details):
-        try:
-            school_mailer(email_detail["school_id"], year, email_detail["mail_info"], report_name=attachment_name)
-            emailed_ids.add(email_detail["school_id"])
-        except Exception as error:
-            all_schools = set(school_ids)
-            schools_to_send = sorted(all_schools.difference(emailed_ids))
-            school_command = f"--manual-id {' --manual-id '.join(schools_to_send)}"
-            logger.error(
-                "Error on sending emails, IDs left to send to:\n"
-                "{schools_to_send}\n\n"
-                "You can run just these schools by adding this to the CLI:\n"
-                "{school_command}",
-                schools_to_send=schools_to_send,
-                school_command=school_command,
+    report_hashes = {school_id: _report_hash(report_directory / f"report_{school_id}.pdf") for school_id in school_ids}
+    mail_transport = _mail_transport(transport, workers)
+
+    with SendJournal(report_directory / SEND_JOURNAL_FILE_NAME) as journal:
+        if resume and not group_by_recipient:
+            school_ids = _unsent_school_ids(journal, school_ids, mail_info, report_hashes)
+
+        def send(school_id: str) -> None:
+            recipients = mail_info[school_id]["mailing_list"]
+            journal.record(school_id, recipients, report_hashes[school_id], SendStatus.SENDING)
+            school_mailer(
+                school_id, year, mail_info[school_id], report_name=attachment_name, reports_dir=report_directory, session=mail_transport.session
             )
-            raise error
+            journal.record(school_id, recipients, report_hashes[school_id], SendStatus.SENT)
+
+        def build(school_id: str) -> Any:
+            return mail_transport.build_school_email(school_id, year, mail_info[school_id], attachment_name, report_directory)
+
+        def send_batch(messages: dict[str, Any]) -> dict[str, Optional[Exception]]:
+            for school_id in messages:
+                journal.record(school_id, mail_info[school_id]["mailing_list"], report_hashes[school_id], SendStatus.SENDING)
+            errors = mail_transport.send_batch(messages)
+            for school_id, error in errors.items():
+                if error is None:
+                    journal.record(school_id, mail_info[school_id]["mailing_list"], report_hashes[school_id], SendStatus.SENT)
+            return errors
+
+        dispatcher = MailDispatcher(send, workers=workers, messages_per_minute=messages_per_minute, max_attempts=max_attempts)
+        try:
+            if group_by_recipient:
+                grouped_mail_info = {school_id: mail_info[school_id] for school_id in school_ids}
+                max_attachment_bytes = int(max_attachment_mb * 1024 * 1024)
+                outcomes = _send_grouped(
+                    dispatcher,
+                    mail_transport,
+                    journal,
+                    year,
+                    grouped_mail_info,
+                    report_hashes,
+                    report_directory,
+                    attachment_name,
+                    resume,
+                    batch_size,
+                    max_attachment_bytes,
+                )
+            else:
+                logger.info("Emailing each school")
+                if batch_size is None and isinstance(mail_transport, EwsTransport):
+                    outcomes = dispatcher.run(school_ids)
+                else:
+                    # SMTP sends each email over a pooled connection, so unbatched emails are batches of one
+                    outcomes = dispatcher.run_batched(school_ids, build, send_batch, batch_size=batch_size or 1)
+                for outcome in outcomes:
+                    if outcome.status == SendStatus.FAILED:
+                        school_id = outcome.school_id
+                        journal.record(school_id, mail_info[school_id]["mailing_list"], report_hashes[school_id], outcome.status, outcome.error)
+        finally:
+            mail_transport.close()
+
+    failed_ids = sorted({outcome.school_id for outcome in outcomes if outcome.status == SendStatus.FAILED})
+    uncertain_ids = sorted({outcome.school_id for outcome in outcomes if outcome.status == SendStatus.SENDING})
+    if failed_ids:
+        school_command = f"--manual-id {' --manual-id '.join(failed_ids)}"
+        logger.error(
+            "Error on sending emails to {failed_count} schools, IDs left to send to:\n"
+            "{schools_to_send}\n\n"
+            "You can send just these schools by rerunning with --resume, or by adding this to the CLI:\n"
+            "{school_command}",
+            failed_count=len(failed_ids),
+            schools_to_send=failed_ids,
+            school_command=school_command,
+        )
+    if uncertain_ids:
+        logger.error(
+            "The connection failed while sending emails to {school_count} schools, so they may have been sent:\n"
+            "{schools}\n\n"
+            "Check the sent items and send any that weren't delivered with --manual-id, without --resume",
+            school_count=len(uncertain_ids),
+            schools=uncertain_ids,
+        )
+    if failed_ids or uncertain_ids:
+        raise typer.Exit(code=1)
+    logger.success("Emailed {school_count} schools", school_count=len({outcome.school_id for outcome in outcomes}))
+    return outcomes
+
+
+def _send_grouped(
+    dispatcher: MailDispatcher,
+    mail_transport: MailTransport,
+    journal: SendJournal,
+    year: int,
+    mail_info: dict[str, dict],
+    report_hashes: dict[str, str],
+    report_directory: Path,
+    attachment_name: str,
+    resume: bool,
+    batch_size: Optional[int],
+    max_attachment_bytes: int,
+) -> list[SendOutcome]:
+    """Send one email to each group of recipients with all of their schools' reports attached, recording each school in the journal
+
+    Returns:
+        list[SendOutcome]: Outcome for each school in each group, a school is in a group for each of its different sets of recipients
+    """
+    groups = group_by_recipients(mail_info)
+    if resume:
+        groups = _unsent_groups(journal, groups, report_hashes)
+    report_sizes = {school_id: _report_size(report_directory / f"report_{school_id}.pdf") for school_id in mail_info}
+    groups_by_key = {group.key: group for group in split_by_attachment_size(groups, report_sizes, max_attachment_bytes)}
+    logger.info(
+        "Emailing {school_count} schools in {email_count} emails grouped by recipient", school_count=len(mail_info), email_count=len(groups_by_key)
+    )
+
+    def record(group: EmailGroup, status: SendStatus, error: Optional[str] = None) -> None:
+        for school_id in group.school_ids:
+            journal.record(school_id, group.recipients, report_hashes[school_id], status, error)
+
+    def build(key: str) -> Any:
+        return mail_transport.build_group_email(groups_by_key[key], year, mail_info, attachment_name, report_directory)
+
+    def send_batch(messages: dict[str, Any]) -> dict[str, Optional[Exception]]:
+        for key in messages:
+            record(groups_by_key[key], SendStatus.SENDING)
+        errors = mail_transport.send_batch(messages)
+        for key, error in errors.items():
+            if error is None:
+                record(groups_by_key[key], SendStatus.SENT)
+        return errors
+
+    school_outcomes = []
+    for outcome in dispatcher.run_batched(list(groups_by_key), build, send_batch, batch_size=batch_size or 1):
+        group = groups_by_key[outcome.school_id]
+        if outcome.status == SendStatus.FAILED:
+            record(group, outcome.status, outcome.error)
+        school_outcomes.extend(SendOutcome(school_id, outcome.status, outcome.attempts, outcome.error) for school_id in group.school_ids)
+    return school_outcomes
+
+
+def _mail_transport(transport: Optional[TransportType], workers: int) -> MailTransport:
+    """Mail transport selected on the command line, or in the `mail_transport` setting"""
+    settings = get_settings()
+    if transport is None:
+        transport = TransportType(settings.get("mail_transport", TransportType.EWS.value))
+    if transport == TransportType.SMTP:
+        return SmtpTransport.from_settings(settings, pool_size=workers)
+    return EwsTransport(ExchangeSession(max_connections=workers))
+
+
+def _report_size(report_path: Path) -> int:
+    """Size of a report to be attached, or zero if it doesn't exist, which will fail when building the email"""
+    return report_path.stat().st_size if report_path.exists() else 0
+
+
+def _report_hash(report_path: Path) -> str:
+    """Hash of a report to be attached, or a placeholder if it doesn't exist, which will fail when sending"""
+    return file_hash(report_path) if report_path.exists() else "missing"
+
+
+def _unsent_school_ids(journal: SendJournal, school_ids: list[str], mail_info: dict[str, dict], report_hashes: dict[str, str]) -> list[str]:
+    """Schools whose current report hasn't been sent to their current recipients, according to the send journal"""
+    statuses = {school_id: journal.status(school_id, mail_info[school_id]["mailing_list"], report_hashes[school_id]) for school_id in school_ids}
+    sent = [school_id for school_id, status in statuses.items() if status == SendStatus.SENT]
+    in_flight = sorted(school_id for school_id, status in statuses.items() if status == SendStatus.SENDING)
+    if sent:
+        logger.info("Resuming, skipping {school_count} schools whose report has already been sent", school_count=len(sent))
+    if in_flight:
+        logger.warning(
+            "Skipping {school_count} schools that were being sent when the previous run stopped, so may have been sent: {schools}. "
+            "Check the sent items and send any that weren't delivered with --manual-id, without --resume",
+            school_count=len(in_flight),
+            schools=in_flight,
+        )
+    return [school_id for school_id, status in statuses.items() if status not in (SendStatus.SENT, SendStatus.SENDING)]
+
+
+def _unsent_groups(journal: SendJournal, groups: list[EmailGroup], report_hashes: dict[str, str]) -> list[EmailGroup]:
+    """Groups with only the schools whose current report hasn't been sent to the group's recipients, according to the send journal"""
+    unsent_groups = []
+    sent = []
+    in_flight = []
+    for group in groups:
+        statuses = {school_id: journal.status(school_id, group.recipients, report_hashes[school_id]) for school_id in group.school_ids}
+        sent.extend(school_id for school_id, status in statuses.items() if status == SendStatus.SENT)
+        in_flight.extend(school_id for school_id, status in statuses.items() if status == SendStatus.SENDING)
+        unsent = [school_id for school_id, status in statuses.items() if status not in (SendStatus.SENT, SendStatus.SENDING)]
+        if unsent:
+            unsent_groups.append(EmailGroup(group.key, group.recipients, unsent))
+    if sent:
+        logger.info("Resuming, skipping {send_count} school reports already sent to their recipients", send_count=len(sent))
+    if in_flight:
+        logger.warning(
+            "Skipping {send_count} school reports that were being sent when the previous run stopped, so may have been sent: {schools}. "
+            "Check the sent items and send any that weren't delivered with --manual-id, without --resume",
+            send_count=len(in_flight),
+            schools=sorted(set(in_flight)),
+        )
+    return unsent_groups
 
 
 @app.callback()
@@ -0,0 +1,135 @@
+"""Tracking of report inputs so that only reports with changed inputs are regenerated and converted"""
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from rred_reports import __version__
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def file_hash(file_path: Path) -> str:
+    """SHA-256 hash of a file's contents
+
+    Args:
+        file_path (Path): file to hash
+
+    Returns:
+        str: hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with file_path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def partition_hashes(processed_data: pd.DataFrame, report_year: int, partition_column: str = "school_id") -> dict[str, str]:
+    """Hash the rows of each partition of the masterfile, hashing every row once
+
+    Args:
+        processed_data (pd.DataFrame): processed masterfile
+        report_year (int): Year of report end, included in the hash as filtering depends on it
+        partition_column (str): column to partition the masterfile by
+
+    Returns:
+        dict[str, str]: hex digest for each partition value
+    """
+    row_hashes = pd.util.hash_pandas_object(processed_data, index=False)
+    columns = ",".join(processed_data.columns).encode()
+
+    hashes = {}
+    for partition, partition_row_hashes in row_hashes.groupby(processed_data[partition_column], sort=False):
+        digest = hashlib.sha256(f"{report_year}".encode())
+        digest.update(columns)
+        digest.update(partition_row_hashes.to_numpy().tobytes())
+        hashes[partition] = digest.hexdigest()
+    return hashes
+
+
+@dataclass
+class ReportManifest:
+    """Record of the inputs used for each report in an output directory
+
+    Each entry is keyed by the report docx file name and records the hash of the masterfile rows used,
+    the template hash and package version used to generate it, and the hash of the docx that its PDF was converted from.
+    """
+
+    path: Path
+    entries: dict[str, dict] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, output_dir: Path) -> "ReportManifest":
+        """Load the manifest from an output directory, or create an empty one if it doesn't exist
+
+        Args:
+            output_dir (Path): report output directory
+
+        Returns:
+            ReportManifest: manifest for the output directory
+        """
+        manifest_path = output_dir / MANIFEST_FILE_NAME
+        if not manifest_path.exists():
+            return cls(manifest_path)
+        with manifest_path.open() as handle:
+            return cls(manifest_path, json.load(handle)["reports"])
+
+    def report_is_current(self, docx_path: Path, data_hash: str, template_hash: str) -> bool:
+        """Check whether an existing docx report was generated from the same inputs
+
+        Args:
+            docx_path (Path): report docx path
+            data_hash (str): hash of the masterfile rows for the report
+            template_hash (str): hash of the template file
+
+        Returns:
+            bool: True if the report exists and doesn't need to be regenerated
+        """
+        entry = self.entries.get(docx_path.name)
+        if entry is None or not docx_path.exists():
+            return False
+        return entry["data_hash"] == data_hash and entry["template_hash"] == template_hash and entry["version"] == __version__
+
+    def record_report(self, docx_path: Path, data_hash: str, template_hash: str) -> None:
+        """Record the inputs used to generate a docx report
+
+        Args:
+            docx_path (Path): report docx path
+            data_hash (str): hash of the masterfile rows for the report
+            template_hash (str): hash of the template file
+        """
+        self.entries[docx_path.name] = {"data_hash": data_hash, "template_hash": template_hash, "version": __version__}
+
+    def pdf_is_current(self, docx_path: Path, pdf_path: Path) -> bool:
+        """Check whether a PDF report was converted from the current version of its docx report
+
+        Args:
+            docx_path (Path): report docx path
+            pdf_path (Path): converted report pdf path
+
+        Returns:
+            bool: True if the PDF exists and doesn't need to be converted again
+        """
+        entry = self.entries.get(docx_path.name, {})
+        if "pdf_source_hash" not in entry or not pdf_path.exists():
+            return False
+        return entry["pdf_source_hash"] == file_hash(docx_path)
+
+    def record_pdf(self, docx_path: Path) -> None:
+        """Record the docx that a PDF report was converted from
+
+        Args:
+            docx_path (Path): report docx path
+        """
+        self.entries.setdefault(docx_path.name, {})["pdf_source_hash"] = file_hash(docx_path)
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with temp_path.open("w") as handle:
+            json.dump({"version": __version__, "reports": self.entries}, handle, indent=2, sort_keys=True)
+        temp_path.replace(self.path)
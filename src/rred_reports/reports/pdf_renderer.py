@@ -0,0 +1,232 @@
+"""Rendering of school reports directly to PDF, without generating and converting docx reports
+
+The fixed content of a report comes from a static layout PDF: the report template with blank rows reserved
+for each table, converted to PDF once. Table values are drawn over the static pages at positions given by a
+layout file, with column positions taken from the template's table grid.
+"""
+import hashlib
+import io
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import tomli
+from docx import Document
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from rred_reports.reports.filler import TemplateFiller
+from rred_reports.reports.schools import SUMMARY_TABLE_COLUMNS, TABLE_COLUMNS_AND_MASKS, SchoolTables, write_school_report
+
+# Approximate average width of a Helvetica character, as a proportion of the font size
+_AVERAGE_CHARACTER_WIDTH = 0.5
+_MINIMUM_FONT_SIZE = 4.0
+_CELL_PADDING = 2.0
+
+
+class RendererType(str, Enum):
+    """RendererType class
+
+    Provides report rendering methods as enums
+    """
+
+    DOCX = "docx"
+    PDF = "pdf"
+
+
+@dataclass
+class TableLayout:
+    """Position of a table's data rows in the static layout PDF, in PDF points from the bottom left of the page"""
+
+    page: int
+    top: float
+    rows: int
+    column_x: list[float]
+
+
+@dataclass
+class PdfLayout:
+    """Layout for drawing school report tables over a static layout PDF"""
+
+    static_pdf: bytes
+    school_name_position: tuple[int, float, float]
+    school_name_font_size: float
+    tables: list[TableLayout]
+    font_size: float
+    row_height: float
+    continuation_top: float
+
+    @classmethod
+    def load(cls, layout_file: Path, template_path: Path) -> "PdfLayout":
+        """Load a layout file, taking column positions from the template unless they are set in the layout file
+
+        Args:
+            layout_file (Path): Layout toml file
+            template_path (Path): Report template the static layout PDF was created from
+
+        Returns:
+            PdfLayout: layout for rendering reports
+        """
+        with layout_file.open(mode="rb") as handle:
+            layout = tomli.load(handle)
+        template_columns = _template_column_positions(template_path)
+        tables = [
+            TableLayout(
+                page=table["page"],
+                top=table["top"],
+                rows=table["rows"],
+                column_x=table.get("column_x", template_columns[index]),
+            )
+            for index, table in enumerate(layout["tables"])
+        ]
+        school_name = layout["school_name"]
+        return cls(
+            static_pdf=(layout_file.parent / layout["static_pdf"]).read_bytes(),
+            school_name_position=(school_name["page"], school_name["x"], school_name["y"]),
+            school_name_font_size=school_name.get("font_size", 14.0),
+            tables=tables,
+            font_size=layout.get("font_size", 7.0),
+            row_height=layout.get("row_height", 12.0),
+            continuation_top=layout.get("continuation_top", 560.0),
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the static PDF and layout positions, used to detect when reports need to be rendered again"""
+        digest = hashlib.sha256(self.static_pdf)
+        positions = (self.school_name_position, self.school_name_font_size, self.tables, self.font_size, self.row_height, self.continuation_top)
+        digest.update(repr(positions).encode())
+        return digest.hexdigest()
+
+
+def _template_column_positions(template_path: Path) -> list[list[float]]:
+    """Left edge of each column for every table in the template, assuming tables start at the left margin"""
+    doc = Document(template_path)
+    left_margin = doc.sections[0].left_margin.pt
+    positions = []
+    for table in doc.tables:
+        column_x = [left_margin]
+        for grid_column in table._tbl.tblGrid.gridCol_lst[:-1]:  # pylint: disable=protected-access
+            column_x.append(column_x[-1] + grid_column.w.pt)
+        positions.append(column_x)
+    return positions
+
+
+def write_layout_docx(template_path: Path, layout_file: Path, output_path: Path) -> None:
+    """Write the template with the number of blank rows given for each table in the layout file
+
+    The resulting docx should be converted to PDF and used as the static layout PDF for the layout file.
+
+    Args:
+        template_path (Path): Report template
+        layout_file (Path): Layout toml file
+        output_path (Path): docx file to write
+    """
+    with layout_file.open(mode="rb") as handle:
+        table_rows = [table["rows"] for table in tomli.load(handle)["tables"]]
+    columns = [SUMMARY_TABLE_COLUMNS] + [columns for columns, _mask in TABLE_COLUMNS_AND_MASKS]
+    blank_tables = [pd.DataFrame("", index=range(rows), columns=table_columns) for rows, table_columns in zip(table_rows, columns)]
+    layout_tables = SchoolTables(school_id="layout", school_name="", summary=blank_tables[0], tables=blank_tables[1:])
+    write_school_report(layout_tables, template_path, output_path)
+
+
+def _escape(text: str) -> bytes:
+    """Encode text for a PDF string literal using the standard font's WinAnsi encoding"""
+    encoded = text.encode("cp1252", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _fitted_font_size(text: str, font_size: float, width: Optional[float]) -> float:
+    """Shrink the font size so that the text fits within the column width"""
+    if width is None or not text:
+        return font_size
+    estimated_width = len(text) * font_size * _AVERAGE_CHARACTER_WIDTH
+    available_width = width - 2 * _CELL_PADDING
+    if estimated_width <= available_width:
+        return font_size
+    return max(_MINIMUM_FONT_SIZE, font_size * available_width / estimated_width)
+
+
+class _Overlay:
+    """Text to draw over a single page"""
+
+    def __init__(self):
+        """Create an empty overlay"""
+        self.commands: list[bytes] = []
+
+    def add_text(self, text: str, x: float, y: float, font_size: float) -> None:
+        """Draw text with its baseline starting at (x, y)"""
+        self.commands.append(b"BT /F1 %.2f Tf %.2f %.2f Td (%s) Tj ET" % (font_size, x, y, _escape(text)))
+
+    def add_row(self, values: list[str], column_x: list[float], y: float, font_size: float) -> None:
+        """Draw a table row, shrinking any values that are too wide for their column"""
+        column_edges = [*column_x[1:], None]
+        for value, left, right in zip(values, column_x, column_edges):
+            width = None if right is None else right - left
+            self.add_text(value, left + _CELL_PADDING, y, _fitted_font_size(value, font_size, width))
+
+    def page(self, width: float, height: float) -> PageObject:
+        """Create a page containing the overlay text, to be merged onto a static page"""
+        page = PageObject.create_blank_page(width=width, height=height)
+        font = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+            }
+        )
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        contents = DecodedStreamObject()
+        contents.set_data(b"\n".join(self.commands))
+        page[NameObject("/Contents")] = contents
+        return page
+
+
+def render_school_pdf(school_tables: SchoolTables, layout: PdfLayout, output_path: Path) -> int:
+    """Render a school report as a PDF by drawing the precomputed tables over the static layout PDF
+
+    Rows that don't fit in the space reserved for a table continue on extra pages after the table's page.
+
+    Args:
+        school_tables (SchoolTables): precomputed tables for a school
+        layout (PdfLayout): layout of the static PDF
+        output_path (Path): Location of the report
+
+    Returns:
+        int: number of pages in the report
+    """
+    static_pages = PdfReader(io.BytesIO(layout.static_pdf)).pages
+    overlays = [_Overlay() for _ in static_pages]
+    continuations: list[list[_Overlay]] = [[] for _ in static_pages]
+
+    name_page, name_x, name_y = layout.school_name_position
+    overlays[name_page].add_text(school_tables.school_name, name_x, name_y, layout.school_name_font_size)
+
+    for table, table_layout in zip([school_tables.summary, *school_tables.tables], layout.tables):
+        rows = [[TemplateFiller.cell_text(value) for value in row] for row in table.itertuples(index=False)]
+        page_overlay, top, capacity = overlays[table_layout.page], table_layout.top, table_layout.rows
+        while rows:
+            for row_number, row in enumerate(rows[:capacity]):
+                page_overlay.add_row(row, table_layout.column_x, top - (row_number + 1) * layout.row_height, layout.font_size)
+            rows = rows[capacity:]
+            if rows:
+                page_overlay = _Overlay()
+                continuations[table_layout.page].append(page_overlay)
+                top = layout.continuation_top
+                capacity = max(1, int((layout.continuation_top - layout.row_height) // layout.row_height))
+
+    writer = PdfWriter()
+    for static_page, overlay, page_continuations in zip(static_pages, overlays, continuations):
+        width, height = static_page.mediabox.width, static_page.mediabox.height
+        static_page.merge_page(overlay.page(width, height))
+        writer.add_page(static_page)
+        for continuation in page_continuations:
+            writer.add_page(continuation.page(width, height))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("wb") as output_file:
+        writer.write(output_file)
+    return len(writer.pages)
@@ -0,0 +1,166 @@
+"""Pipelined report generation, conversion and validation
+
+Reports are generated, converted to PDF and validated in separate threads connected by bounded queues,
+so that conversion starts as soon as the first docx report is written and each PDF is validated as soon as it is converted.
+"""
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+from loguru import logger
+
+from rred_reports.reports.converters import Docx2PdfConverter, PdfConverter, ReportConversionException
+from rred_reports.reports.generate import PdfValidationSummary
+from rred_reports.reports.manifest import ReportManifest
+
+# Marks the end of the items put on a queue
+_DONE = object()
+# How often blocked stages check whether another stage has failed, in seconds
+_POLL_INTERVAL = 0.1
+
+
+class _PipelineStopped(Exception):
+    """Raised in a stage when another stage has failed"""
+
+
+class ReportPipeline:
+    """Generate, convert and validate reports concurrently
+
+    Generation puts each written docx report on a bounded conversion queue, blocking when conversion falls behind.
+    Conversion takes batches of up to `batch_size` reports from the queue and puts each converted PDF on a bounded
+    validation queue. If any stage fails, the other stages stop and the first error is raised.
+
+    Microsoft Word can't be used for conversion, as docx2pdf drives Word through COM, which isn't initialised in the
+    conversion thread on Windows, and converting a few files at a time asks for permission for each file on OSX.
+    """
+
+    def __init__(self, converter: PdfConverter, queue_size: int = 8, batch_size: int = 4):
+        """
+        Args:
+            converter (PdfConverter): PDF conversion backend
+            queue_size (int): Maximum number of reports waiting for each stage
+            batch_size (int): Maximum number of reports given to the converter at once
+
+        Raises:
+            ReportConversionException: If the converter uses Microsoft Word
+        """
+        if isinstance(converter, Docx2PdfConverter):
+            message = "Pipelined conversion can't use Microsoft Word, please use the libreoffice converter"
+            raise ReportConversionException(message)
+        self.converter = converter
+        self.batch_size = batch_size
+        self.conversion_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.validation_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.converted: list[Path] = []
+        self.validation = PdfValidationSummary()
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+
+    def run(self, generate_reports: Callable[[Callable[[Path], None]], None], report_dir: Path, force: bool = False) -> PdfValidationSummary:
+        """Run the pipeline until all reports are generated, converted and validated
+
+        Args:
+            generate_reports (Callable[[Callable[[Path], None]], None]): Generates reports, calling its argument with the path
+                of each docx report as soon as it is written
+            report_dir (Path): Directory the docx reports are written to
+            force (bool): Convert all existing reports, even those whose PDF is up to date with the docx report
+
+        Raises:
+            Exception: The first error raised by any stage
+
+        Returns:
+            PdfValidationSummary: Validation results for the converted PDFs
+        """
+        stages = [
+            threading.Thread(target=self._stage, args=(self._generate, generate_reports, report_dir, force), name="generate"),
+            threading.Thread(target=self._stage, args=(self._convert,), name="convert"),
+            threading.Thread(target=self._stage, args=(self._validate,), name="validate"),
+        ]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+        if self._errors:
+            raise self._errors[0]
+
+        manifest = ReportManifest.load(report_dir)
+        for report_path in self.converted:
+            manifest.record_pdf(report_path)
+        manifest.save()
+        return self.validation
+
+    def _stage(self, target: Callable, *args: Any) -> None:
+        """Run a stage, stopping the other stages if it fails"""
+        try:
+            target(*args)
+        except _PipelineStopped:
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error("Report pipeline stopped, {stage} failed: {error}", stage=threading.current_thread().name, error=error)
+            self._errors.append(error)
+            self._stop.set()
+
+    def _put(self, item_queue: queue.Queue, item: Any) -> None:
+        """Put an item on a queue, waiting for space unless the pipeline has stopped"""
+        while not self._stop.is_set():
+            try:
+                item_queue.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise _PipelineStopped
+
+    def _get(self, item_queue: queue.Queue) -> Any:
+        """Get an item from a queue, waiting for one unless the pipeline has stopped"""
+        while not self._stop.is_set():
+            try:
+                return item_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        raise _PipelineStopped
+
+    def _generate(self, generate_reports: Callable[[Callable[[Path], None]], None], report_dir: Path, force: bool) -> None:
+        """Generate reports, then queue any existing reports whose PDFs are out of date"""
+        queued = set()
+
+        def queue_report(report_path: Path) -> None:
+            queued.add(report_path)
+            self._put(self.conversion_queue, report_path)
+
+        generate_reports(queue_report)
+        manifest = ReportManifest.load(report_dir)
+        for report_path in sorted(report_dir.glob("*.docx")):
+            if report_path not in queued and (force or not manifest.pdf_is_current(report_path, report_path.with_suffix(".pdf"))):
+                queue_report(report_path)
+        self._put(self.conversion_queue, _DONE)
+
+    def _convert(self) -> None:
+        """Convert queued docx reports in batches, queueing each PDF for validation"""
+        done = False
+        while not done:
+            batch = [self._get(self.conversion_queue)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.conversion_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _DONE in batch:
+                batch.remove(_DONE)
+                done = True
+            if not batch:
+                continue
+
+            pdf_paths = [report_path.with_suffix(".pdf") for report_path in batch]
+            for pdf_path in pdf_paths:
+                pdf_path.unlink(missing_ok=True)
+            self.converter.convert(batch, pdf_paths)
+            self.converted.extend(batch)
+            for pdf_path in pdf_paths:
+                self._put(self.validation_queue, pdf_path)
+        self._put(self.validation_queue, _DONE)
+
+    def _validate(self) -> None:
+        """Validate each converted PDF as it is queued"""
+        while (pdf_path := self._get(self.validation_queue)) is not _DONE:
+            self.validation.check(pdf_path)
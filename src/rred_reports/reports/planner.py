@@ -0,0 +1,126 @@
+"""Prediction of which reports will have tables overflowing onto extra pages, before any report is rendered
+
+Each table in the template has room for a fixed number of rows on its page. A table with more rows than this spills
+onto extra pages, which is only otherwise found when converted PDFs have more pages than expected.
+"""
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+from rred_reports import ReportType
+from rred_reports.reports.generate import EXPECTED_PAGE_COUNT
+from rred_reports.reports.pdf_renderer import PdfLayout
+from rred_reports.reports.schools import SchoolTables
+
+TABLE_NAMES = ["summary", "table_1", "table_2", "table_3", "table_4", "table_5", "table_6"]
+
+
+@dataclass
+class TableCapacities:
+    """Number of rows that fit in the space for each table, and on each extra page when a table overflows"""
+
+    table_rows: list[int]
+    continuation_rows: int
+
+    @classmethod
+    def from_config(cls, config: dict, level: ReportType, year: int) -> "TableCapacities":
+        """Read the table capacities for a report level from the report config, a year can override the level's capacities
+
+        Args:
+            config (dict): report config
+            level (ReportType): report level
+            year (int): report year
+
+        Raises:
+            KeyError: If no table capacities are configured for the level
+
+        Returns:
+            TableCapacities: table capacities for the year's template
+        """
+        level_config = config[level.value]
+        year_config = level_config.get(str(year), {})
+        table_rows = year_config.get("table_capacities", level_config.get("table_capacities"))
+        continuation_rows = year_config.get("continuation_rows", level_config.get("continuation_rows"))
+        if table_rows is None or continuation_rows is None:
+            msg = f"No table_capacities or continuation_rows found in config for {level.value} reports. Please add these to the report config file."
+            raise KeyError(msg)
+        return cls(table_rows, continuation_rows)
+
+    @classmethod
+    def from_layout(cls, layout: PdfLayout) -> "TableCapacities":
+        """Table capacities of reports rendered directly to PDF, which are exactly the rows reserved in the layout
+
+        Args:
+            layout (PdfLayout): layout of the static PDF
+
+        Returns:
+            TableCapacities: table capacities for the layout
+        """
+        continuation_rows = max(1, int((layout.continuation_top - layout.row_height) // layout.row_height))
+        return cls([table.rows for table in layout.tables], continuation_rows)
+
+
+@dataclass
+class ReportPlan:
+    """Predicted size of a single report"""
+
+    school_id: str
+    row_counts: list[int]
+    predicted_pages: int
+
+    @property
+    def overflows(self) -> bool:
+        """Whether the report is predicted to have more pages than expected"""
+        return self.predicted_pages > EXPECTED_PAGE_COUNT
+
+
+def predict_pages(row_counts: list[int], capacities: TableCapacities, base_pages: int = EXPECTED_PAGE_COUNT) -> int:
+    """Predict the number of pages in a report, adding extra pages for the rows of each table that don't fit in its space
+
+    Args:
+        row_counts (list[int]): number of rows in each table, in template order
+        capacities (TableCapacities): table capacities of the template
+        base_pages (int): number of pages when every table fits
+
+    Returns:
+        int: predicted number of pages
+    """
+    extra_pages = sum(math.ceil(max(0, rows - capacity) / capacities.continuation_rows) for rows, capacity in zip(row_counts, capacities.table_rows))
+    return base_pages + extra_pages
+
+
+def plan_reports(tables_by_school: dict[str, SchoolTables], capacities: TableCapacities) -> list[ReportPlan]:
+    """Predict the number of pages of every report that would be generated
+
+    Args:
+        tables_by_school (dict[str, SchoolTables]): precomputed tables for each school
+        capacities (TableCapacities): table capacities of the template
+
+    Returns:
+        list[ReportPlan]: predicted size of each report, in school ID order
+    """
+    plans = []
+    for school_id, school_tables in sorted(tables_by_school.items()):
+        if school_tables.school_name is None:
+            continue
+        row_counts = [len(table) for table in [school_tables.summary, *school_tables.tables]]
+        plans.append(ReportPlan(school_id, row_counts, predict_pages(row_counts, capacities)))
+    return plans
+
+
+def plan_table(plans: list[ReportPlan], capacities: Optional[TableCapacities] = None) -> pd.DataFrame:
+    """Tabulate report plans with the row count of each table, for printing or saving
+
+    Args:
+        plans (list[ReportPlan]): report plans
+        capacities (Optional[TableCapacities]): table capacities, added as the first row if given
+
+    Returns:
+        pd.DataFrame: row counts and predicted pages, indexed by school ID
+    """
+    rows = [[plan.school_id, *plan.row_counts, plan.predicted_pages] for plan in plans]
+    if capacities is not None:
+        rows.insert(0, ["capacity", *capacities.table_rows, EXPECTED_PAGE_COUNT])
+    return pd.DataFrame(rows, columns=["school_id", *TABLE_NAMES, "predicted_pages"]).set_index("school_id")
@@ -1,9 +1,12 @@
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import Optional, Union
 
 import pandas as pd
 from loguru import logger
 
+from rred_reports import ReportType
 from rred_reports.masterfile import sort_masterfile
 from rred_reports.reports.filler import TemplateFiller
 
@@ -99,6 +102,33 @@ def school_filter(whole_dataframe: pd.DataFrame, school_id: str) -> pd.DataFrame
     return whole_dataframe[whole_dataframe.school_id == school_id].copy()
 
 
+def _in_period(dates: pd.Series, report_year: int) -> pd.Series:
+    """Boolean mask of dates that are after 31/7 and before 1/8 for the reporting year"""
+    report_start, report_end = trial_period_dates(report_year)
+    return (dates > report_start) & (dates < report_end)
+
+
+def _completed_programme(dataframe: pd.DataFrame) -> pd.Series:
+    """Boolean mask of pupils with 'Discontinued' OR 'Referred to school' in the <exit_outcome> column"""
+    return dataframe["exit_outcome"].isin(["Discontinued", "Referred to school"])
+
+
+def entry_and_exit_mask(dataframe: pd.DataFrame, report_year: int) -> pd.Series:
+    """Row mask for the filter used by the summary table and tables one, two and five, see `filter_by_entry_and_exit`"""
+    return _in_period(dataframe["entry_date"], report_year) | _in_period(dataframe["exit_date"], report_year)
+
+
+def three_four_mask(dataframe: pd.DataFrame, report_year: int) -> pd.Series:
+    """Row mask for the filter used by tables three and four, see `filter_for_three_four`"""
+    return _completed_programme(dataframe) & _in_period(dataframe["exit_date"], report_year)
+
+
+def six_mask(dataframe: pd.DataFrame, report_year: int) -> pd.Series:
+    """Row mask for the filter used by table six, see `filter_six`"""
+    follow_up_in_period = _in_period(dataframe["month3_testdate"], report_year) | _in_period(dataframe["month6_testdate"], report_year)
+    return _completed_programme(dataframe) & follow_up_in_period
+
+
 def filter_by_entry_and_exit(school_dataframe: pd.DataFrame, report_year: int) -> pd.DataFrame:
     """Filter for tables: summary, table one, two and five: <entry_date> OR <exit_date> is after 31/7 and before 1/8
 
@@ -108,12 +138,7 @@ def filter_by_entry_and_exit(school_dataframe: pd.DataFrame, report_year: int) -
 
     Returns: school_filter(pd.DataFrame) filtered by the reporting year
     """
-    report_start, report_end = trial_period_dates(report_year)
-
-    return school_dataframe.loc[
-        ((school_dataframe["entry_date"] > report_start) & (school_dataframe["entry_date"] < report_end))
-        | ((school_dataframe["exit_date"] > report_start) & (school_dataframe["exit_date"] < report_end))
-    ]
+    return school_dataframe.loc[entry_and_exit_mask(school_dataframe, report_year)]
 
 
 def filter_for_three_four(school_dataframe: pd.DataFrame, report_year: int) -> pd.DataFrame:
@@ -126,11 +151,7 @@ def filter_for_three_four(school_dataframe: pd.DataFrame, report_year: int) -> p
 
     Returns: school_filter(pd.DataFrame) filtered by exit_outcome and exit_date
     """
-    report_start, report_end = trial_period_dates(report_year)
-
-    outcome_filtered = school_dataframe[(school_dataframe["exit_outcome"].isin(["Discontinued", "Referred to school"]))]
-
-    return outcome_filtered[(outcome_filtered["exit_date"] > report_start) & (outcome_filtered["exit_date"] < report_end)]
+    return school_dataframe.loc[three_four_mask(school_dataframe, report_year)]
 
 
 def filter_six(school_dataframe: pd.DataFrame, report_year: int) -> pd.DataFrame:
@@ -142,15 +163,52 @@ def filter_six(school_dataframe: pd.DataFrame, report_year: int) -> pd.DataFrame
         report_year (int): Year of report end
 
     Returns: school_filter(pd.DataFrame) filtered by month3_testdate and month6_testdate"""
+    return school_dataframe.loc[six_mask(school_dataframe, report_year)]
 
-    report_start, report_end = trial_period_dates(report_year)
 
-    outcome_filtered = school_dataframe[(school_dataframe["exit_outcome"].isin(["Discontinued", "Referred to school"]))]
+SUMMARY_COLUMNS = ["rred_user_id", "pupil_no", "exit_outcome"]
+
+SUMMARY_OUTCOMES = {
+    "po_discontinued": "discontinued",
+    "po_referred_to_school": "referred to school",
+    "po_incomplete": "incomplete",
+    "po_left_school": "left school",
+    "po_ongoing": "ongoing",
+}
+
+SUMMARY_TABLE_COLUMNS = ["number_of_rr_teachers", "number_of_pupils_served", *SUMMARY_OUTCOMES]
+
+# Number of header rows for the summary table followed by tables one to six
+TABLE_HEADER_ROWS = [2, 1, 1, 1, 1, 2, 2]
 
-    return outcome_filtered[
-        ((outcome_filtered["month3_testdate"] > report_start) & (outcome_filtered["month3_testdate"] < report_end))
-        | ((outcome_filtered["month6_testdate"] > report_start) & (outcome_filtered["month6_testdate"] < report_end))
-    ]
+# Columns and the name of the row mask used for tables one to six, masks are added by `_add_table_masks`
+TABLE_COLUMNS_AND_MASKS = (
+    (table_one_columns, "_entry_and_exit"),
+    (table_two_columns, "_entry_and_exit"),
+    (table_three_columns, "_three_four"),
+    (table_four_columns, "_three_four"),
+    (table_five_columns, "_entry_and_exit"),
+    (table_six_columns, "_six"),
+)
+
+
+# Column grouping the masterfile rows for each report level, national reports cover every row
+LEVEL_COLUMNS = {ReportType.SCHOOL: "school_id", ReportType.CENTRE: "rrcp_area", ReportType.NATIONAL: "_national"}
+NATIONAL_NAME = "National"
+
+
+@dataclass
+class SchoolTables:
+    """Precomputed contents of a single report, ready to be rendered into a template
+
+    Centre and national reports only have the summary, aggregated over all of their schools, and no tables listing
+    individual pupils. The centre or national name is used as their school ID and name.
+    """
+
+    school_id: str
+    school_name: Optional[str]
+    summary: pd.DataFrame
+    tables: list[pd.DataFrame]
 
 
 def summary_table(school_df: pd.DataFrame, report_year: int) -> pd.DataFrame:
@@ -170,111 +228,238 @@ def summary_table(school_df: pd.DataFrame, report_year: int) -> pd.DataFrame:
             (Pupil outcomes) Ongoing
 
     """
-    columns_used = ["rred_user_id", "pupil_no", "exit_outcome"]
-
-    def get_outcome_from_summary(outcome_df: pd.DataFrame, outcome_type: str) -> int:
-        """
-        Get count of exit outcome.
-
-        Args:
-            outcome_df (pd.DataFrame): dataframe with lower-cased "exit_outcome" column
-            outcome_type (str): case-insensitive exit outcome value
-        Returns:
-            count of each exit outcome, if it doesn't exist then 0
-        """
-        try:
-            return outcome_df["exit_outcome"].value_counts()[outcome_type.lower()]
-        except KeyError:
-            return 0
-
     filtered = filter_by_entry_and_exit(school_df, report_year)
-    filtered_summary_table = filtered[columns_used].drop_duplicates().copy()
+    summaries = _summary_counts(filtered, group_column="school_id")
+    if summaries.empty:
+        return _summary_row(pd.Series(0, index=summaries.columns))
+    return _summary_row(summaries.iloc[0])
+
+
+def _summary_counts(filtered: pd.DataFrame, group_column: Union[str, list[str]]) -> pd.DataFrame:
+    """Summary table counts for every group in a single vectorized pass
+
+    Args:
+        filtered (pd.DataFrame): data already filtered with `filter_by_entry_and_exit`
+        group_column (Union[str, list[str]]): column or columns to group by, one row of counts is returned for each group
+
+    Returns:
+        pd.DataFrame: indexed by the group columns, with a column for each summary table value
+    """
+    group_columns = [group_column] if isinstance(group_column, str) else group_column
+    summary_rows = filtered[[*group_columns, *SUMMARY_COLUMNS]].drop_duplicates()
+    if summary_rows.empty:
+        return pd.DataFrame(columns=SUMMARY_TABLE_COLUMNS, dtype=int)
+    groups = [summary_rows[column] for column in group_columns]
     # let's try and reduce the pain with exit outcome labels
-    filtered_summary_table["exit_outcome"] = filtered_summary_table["exit_outcome"].str.lower().str.strip()
+    outcomes = summary_rows["exit_outcome"].str.lower().str.strip()
+    pupils = summary_rows["pupil_no"] + "-" + summary_rows["rred_user_id"]
 
-    return pd.DataFrame(
+    counts = pd.DataFrame(
         {
-            "number_of_rr_teachers": [filtered_summary_table["rred_user_id"].nunique()],
-            "number_of_pupils_served": [(filtered_summary_table["pupil_no"] + "-" + filtered_summary_table["rred_user_id"]).nunique()],
-            "po_discontinued": get_outcome_from_summary(filtered_summary_table, "discontinued"),
-            "po_referred_to_school": get_outcome_from_summary(filtered_summary_table, "referred to school"),
-            "po_incomplete": get_outcome_from_summary(filtered_summary_table, "incomplete"),
-            "po_left_school": get_outcome_from_summary(filtered_summary_table, "left school"),
-            "po_ongoing": get_outcome_from_summary(filtered_summary_table, "ongoing"),
+            "number_of_rr_teachers": summary_rows.groupby(group_columns)["rred_user_id"].nunique(),
+            "number_of_pupils_served": pupils.groupby(groups).nunique(),
         }
     )
+    outcome_counts = pd.crosstab(groups, outcomes)
+    for column, outcome in SUMMARY_OUTCOMES.items():
+        counts[column] = outcome_counts[outcome] if outcome in outcome_counts else 0
+    return counts.fillna(0).astype(int)
 
 
-def populate_school_tables(school_df: pd.DataFrame, template_path: Path, report_year: int) -> TemplateFiller:
-    """Function to fill the school template tables, saving them the file
+def _summary_row(counts: pd.Series) -> pd.DataFrame:
+    """Convert a row of summary counts into the single-row summary table"""
+    return pd.DataFrame({column: [int(counts[column])] for column in counts.index})
 
-    Args:
-        school_df (pd.DataFrame): pd.DataFrame filtered with school_filter()
-        template_path (Path): Location of template
-        report_year (int): Year of report end
 
-    Returns: The template filler with populated data
-    """
-
-    # adding a column for table four
-    lost_lesson_cols = [col for col in school_df if col.startswith("exit_lessons_missed")]
-    school_df["total_lost_lessons"] = school_df[lost_lesson_cols].sum(axis=1).astype(int)
-
-    columns_and_filters = (
-        (table_one_columns, filter_by_entry_and_exit),
-        (table_two_columns, filter_by_entry_and_exit),
-        (table_three_columns, filter_for_three_four),
-        (table_four_columns, filter_for_three_four),
-        (table_five_columns, filter_by_entry_and_exit),
-        (table_six_columns, filter_six),
+def _add_table_masks(masterfile: pd.DataFrame, report_year: int) -> pd.DataFrame:
+    """Add the calculated lost lessons column and a boolean column for each table filter"""
+    lost_lesson_cols = [col for col in masterfile if col.startswith("exit_lessons_missed")]
+    return masterfile.assign(
+        total_lost_lessons=masterfile[lost_lesson_cols].sum(axis=1).astype(int),
+        _entry_and_exit=entry_and_exit_mask(masterfile, report_year),
+        _three_four=three_four_mask(masterfile, report_year),
+        _six=six_mask(masterfile, report_year),
     )
 
-    header_rows = [2, 1, 1, 1, 1, 2, 2]
 
-    # adding in summary table first
-    template_filler = TemplateFiller(template_path, header_rows)
-    add_in_summary_table = summary_table(school_df, report_year)
-    template_filler.populate_table(0, add_in_summary_table)
+def with_level_columns(masterfile: pd.DataFrame) -> pd.DataFrame:
+    """Add the column grouping all rows into the national report, so that every report level has a column in `LEVEL_COLUMNS`"""
+    return masterfile.assign(_national=NATIONAL_NAME)
+
+
+def _stack_levels(masterfile: pd.DataFrame, levels: list[ReportType]) -> pd.DataFrame:
+    """Stack a copy of the masterfile for each report level, labelled with the level and the report each row belongs to
 
-    # now adding other tables
-    for index, column_and_filter in enumerate(columns_and_filters):
-        columns, filter_function = column_and_filter
-        filtered = filter_function(school_df, report_year)
-        sorted_data = sort_masterfile(filtered)
-        table_to_write = sorted_data[columns]
+    Rows without a value for the level's column, such as schools without a centre, are left out of that level.
+    """
+    stacked = [masterfile.assign(_level=level.value, _entity=masterfile[LEVEL_COLUMNS[level]]) for level in levels]
+    return pd.concat(stacked, ignore_index=True).dropna(subset=["_entity"])
+
+
+def _report_tables(report_df: pd.DataFrame) -> list[pd.DataFrame]:
+    """Tables one to six for a single school report, from rows with table masks already added"""
+    tables = []
+    for index, (columns, mask) in enumerate(TABLE_COLUMNS_AND_MASKS):
+        table_to_write = report_df.loc[report_df[mask], columns]
         if index == 0 and any(table_to_write.duplicated()):
             logger.warning(
                 "Duplicate students found, this suggests an issue with the masterfile school or teacher data. Table 1 data:\n{school_data}",
                 school_data=table_to_write.to_markdown(),
             )
-        template_filler.populate_table(index + 1, table_to_write.drop_duplicates())
+        tables.append(table_to_write.drop_duplicates())
+    return tables
 
-    return template_filler
 
+def precompute_report_tables(
+    processed_data: pd.DataFrame, report_year: int, levels: Optional[list[ReportType]] = None
+) -> dict[ReportType, dict[str, SchoolTables]]:
+    """Compute the summary and table contents for every report at each level in one pass over the masterfile
 
-def populate_school_data(
-    school_df: pd.DataFrame, template_path: Path, report_year: int, output_path: Path, school_placeholder="School A"
-) -> TemplateFiller:
-    """Function to populate and save the template with: name of school and filled tables
+    Filters, lost lessons and sorting are applied to the whole masterfile once. The masterfile is then stacked once
+    per level, so that the summary counts for every school, centre and the national report come from a single
+    grouped aggregation. Teachers and pupils are counted once per centre and nationally, even if they appear
+    at more than one school. Only school reports have tables one to six listing their pupils.
 
     Args:
-        school_df (pd.DataFrame): pd.DataFrame filtered with school_filter()
+        processed_data (pd.DataFrame): processed masterfile for all schools
+        report_year (int): Year of report end
+        levels (Optional[list[ReportType]]): report levels to compute, defaults to all levels
+
+    Returns:
+        dict[ReportType, dict[str, SchoolTables]]: precomputed report contents for each level,
+            keyed by school ID, centre or national name in ascending order
+    """
+    if levels is None:
+        levels = list(ReportType)
+    with_masks = sort_masterfile(_add_table_masks(with_level_columns(processed_data), report_year))
+    stacked = _stack_levels(with_masks, levels)
+    summaries = _summary_counts(stacked.loc[stacked["_entry_and_exit"]], group_column=["_level", "_entity"])
+
+    report_tables: dict[ReportType, dict[str, SchoolTables]] = {level: {} for level in levels}
+    for (level_value, entity), report_df in stacked.groupby(["_level", "_entity"], sort=True):
+        level = ReportType(level_value)
+        key = (level_value, entity)
+        counts = summaries.loc[key] if key in summaries.index else pd.Series(0, index=summaries.columns)
+
+        if level == ReportType.SCHOOL:
+            school_names = report_df["rrcp_school"].dropna()
+            name = school_names.iloc[0] if not school_names.empty else None
+        else:
+            name = str(entity)
+
+        report_tables[level][entity] = SchoolTables(
+            school_id=entity,
+            school_name=name,
+            summary=_summary_row(counts),
+            tables=_report_tables(report_df) if level == ReportType.SCHOOL else [],
+        )
+    return report_tables
+
+
+def precompute_school_tables(processed_data: pd.DataFrame, report_year: int) -> dict[str, SchoolTables]:
+    """Compute the summary and table contents for every school in one pass over the masterfile
+
+    Args:
+        processed_data (pd.DataFrame): processed masterfile for all schools
+        report_year (int): Year of report end
+
+    Returns:
+        dict[str, SchoolTables]: precomputed report contents, keyed by school ID in ascending order
+    """
+    return precompute_report_tables(processed_data, report_year, levels=[ReportType.SCHOOL])[ReportType.SCHOOL]
+
+
+def _single_school_tables(school_df: pd.DataFrame, report_year: int) -> SchoolTables:
+    """Precompute the tables for a dataframe that has already been filtered to a single school"""
+    school_tables = precompute_school_tables(school_df, report_year)
+    if len(school_tables) != 1:
+        message = f"Expected data for a single school, found {len(school_tables)} schools"
+        raise ValueError(message)
+    return next(iter(school_tables.values()))
+
+
+def render_school_tables(school_tables: SchoolTables, template_path: Path) -> TemplateFiller:
+    """Fill the template tables with precomputed school data
+
+    Args:
+        school_tables (SchoolTables): precomputed tables for a school
         template_path (Path): Location of template
-        report_year (int): Year of the report end
-        output_path (Path): Location of the report
-        school_placeholder (string): Placeholder for test
 
-    Returns: The template filler with populated data and appropriate school name saved in the output path"""
+    Returns: The template filler with populated data
+    """
+    # Rollup templates only have the summary table, as centre and national reports have no tables listing pupils
+    template_filler = TemplateFiller(template_path, TABLE_HEADER_ROWS[: 1 + len(school_tables.tables)])
+    template_filler.populate_table(0, school_tables.summary)
+    for index, table in enumerate(school_tables.tables):
+        template_filler.populate_table(index + 1, table)
+    return template_filler
 
-    template_filler = populate_school_tables(school_df, template_path, report_year)
 
-    school_name = school_df["rrcp_school"].iloc[0]
+def _fill_school_report(school_tables: SchoolTables, template_path: Path, school_placeholder: str) -> TemplateFiller:
+    """Render precomputed school data into the template and replace the school name"""
+    template_filler = render_school_tables(school_tables, template_path)
 
     for paragraph in template_filler.doc.paragraphs:
         for run in paragraph.runs:
             if school_placeholder in run.text:
-                run.text = run.text.replace(school_placeholder, school_name)
+                run.text = run.text.replace(school_placeholder, school_tables.school_name)
+    return template_filler
+
+
+def write_school_report(school_tables: SchoolTables, template_path: Path, output_path: Path, school_placeholder="School A") -> TemplateFiller:
+    """Render precomputed school data into the template, replace the school name and save the report
 
+    Args:
+        school_tables (SchoolTables): precomputed tables for a school
+        template_path (Path): Location of template
+        output_path (Path): Location of the report
+        school_placeholder (string): Placeholder for test
+
+    Returns: The template filler with populated data and appropriate school name saved in the output path
+    """
+    template_filler = _fill_school_report(school_tables, template_path, school_placeholder)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     template_filler.save_document(output_path)
     return template_filler
+
+
+def school_report_bytes(school_tables: SchoolTables, template_path: Path, school_placeholder="School A") -> bytes:
+    """Render precomputed school data into the template and replace the school name, without saving the report
+
+    Args:
+        school_tables (SchoolTables): precomputed tables for a school
+        template_path (Path): Location of template
+        school_placeholder (string): Placeholder for test
+
+    Returns: The docx report as bytes
+    """
+    return _fill_school_report(school_tables, template_path, school_placeholder).report_bytes()
+
+
+def populate_school_tables(school_df: pd.DataFrame, template_path: Path, report_year: int) -> TemplateFiller:
+    """Function to fill the school template tables, saving them the file
+
+    Args:
+        school_df (pd.DataFrame): pd.DataFrame filtered with school_filter()
+        template_path (Path): Location of template
+        report_year (int): Year of report end
+
+    Returns: The template filler with populated data
+    """
+    return render_school_tables(_single_school_tables(school_df, report_year), template_path)
+
+
+def populate_school_data(
+    school_df: pd.DataFrame, template_path: Path, report_year: int, output_path: Path, school_placeholder="School A"
+) -> TemplateFiller:
+    """Function to populate and save the template with: name of school and filled tables
+
+    Args:
+        school_df (pd.DataFrame): pd.DataFrame filtered with school_filter()
+        template_path (Path): Location of template
+        report_year (int): Year of the report end
+        output_path (Path): Location of the report
+        school_placeholder (string): Placeholder for test
+
+    Returns: The template filler with populated data and appropriate school name saved in the output path"""
+    return write_school_report(_single_school_tables(school_df, report_year), template_path, output_path, school_placeholder)
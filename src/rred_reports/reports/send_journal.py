@@ -0,0 +1,98 @@
+"""Durable record of the report emails sent to each school, so that interrupted sending can be resumed
+
+Every send is recorded in a local SQLite database with the school's recipients and a hash of the attached report.
+A school is only recorded as delivered for that exact report and those recipients, so resending after the report
+or dispatch list changes, or after a UAT run to an override address, still sends the new email.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from rred_reports.reports.dispatcher import SendStatus
+
+SEND_JOURNAL_FILE_NAME = "send_journal.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    school_id TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    report_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (school_id, recipients, report_hash)
+)
+"""
+
+
+class SendJournal:
+    """SQLite journal of report emails, safe to record from several sending threads
+
+    Each send is recorded as `sending` just before the email is sent, then as `sent` or `failed`. Each change is
+    committed straight away, so the journal reflects every email delivered before a crash. An email still recorded
+    as `sending` may or may not have been delivered.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path (Path): SQLite database file, created if it doesn't exist
+        """
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SendJournal":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection"""
+        self._connection.close()
+
+    @staticmethod
+    def _recipients_key(recipients: list[str]) -> str:
+        """Recipients in a form that doesn't depend on their order"""
+        return json.dumps(sorted(recipient.lower() for recipient in recipients))
+
+    def status(self, school_id: str, recipients: list[str], report_hash: str) -> Optional[SendStatus]:
+        """Recorded status of sending a report to a school's recipients
+
+        Args:
+            school_id (str): school ID
+            recipients (list[str]): email addresses the report is sent to
+            report_hash (str): hash of the report file
+
+        Returns:
+            Optional[SendStatus]: latest status, or None if this report has never been sent to these recipients
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status FROM sends WHERE school_id = ? AND recipients = ? AND report_hash = ?",
+                (school_id, self._recipients_key(recipients), report_hash),
+            ).fetchone()
+        return None if row is None else SendStatus(row[0])
+
+    def record(self, school_id: str, recipients: list[str], report_hash: str, status: SendStatus, error: Optional[str] = None) -> None:
+        """Record the status of sending a report to a school's recipients, committing it immediately
+
+        Args:
+            school_id (str): school ID
+            recipients (list[str]): email addresses the report is sent to
+            report_hash (str): hash of the report file
+            status (SendStatus): status of the send
+            error (Optional[str]): error if the send failed
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sends (school_id, recipients, report_hash, status, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (school_id, self._recipients_key(recipients), report_hash, status.value, error, datetime.now(timezone.utc).isoformat()),
+            )
@@ -0,0 +1,229 @@
+"""Splitting school report generation into shards that can run on separate machines
+
+Each shard is given a deterministic subset of the schools, generates their reports into its own directory and records
+which schools it was given. Once every shard has finished, the shard directories are merged into the school report
+directory, checking that every school was generated by exactly one shard.
+"""
+import hashlib
+import json
+import shutil
+from collections import Counter
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+from loguru import logger
+
+from rred_reports.reports.manifest import ReportManifest
+
+SHARD_RECORD_FILE_NAME = "shard.json"
+
+
+class ShardStrategy(str, Enum):
+    """How schools are assigned to shards"""
+
+    HASH = "hash"
+    ROWS = "rows"
+
+
+class ShardMergeException(Exception):
+    """Custom exception generator for merging shards"""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def __repr__(self) -> str:
+        return self.message
+
+
+@dataclass(frozen=True)
+class Shard:
+    """One of `count` shards, numbered from 1"""
+
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, shard: str) -> "Shard":
+        """Parse a shard from `i/N` text
+
+        Args:
+            shard (str): shard number and total number of shards, e.g. `2/4`
+
+        Raises:
+            ValueError: If the text isn't in the form `i/N`, with i between 1 and N
+
+        Returns:
+            Shard: parsed shard
+        """
+        try:
+            index, count = (int(part) for part in shard.split("/"))
+        except ValueError as error:
+            msg = f"Shard must be given as i/N, e.g. 2/4, not '{shard}'"
+            raise ValueError(msg) from error
+        if not 1 <= index <= count:
+            msg = f"Shard number must be between 1 and {count}, not {index}"
+            raise ValueError(msg)
+        return cls(index, count)
+
+    @property
+    def directory_name(self) -> str:
+        """Name of the shard's output directory"""
+        return f"shard_{self.index}_of_{self.count}"
+
+
+def _stable_hash(school_id: str) -> int:
+    """Hash of a school ID that is the same on every machine, unlike the built in hash"""
+    return int(hashlib.md5(school_id.encode(), usedforsecurity=False).hexdigest(), 16)
+
+
+def assign_shards(school_row_counts: dict[str, int], shard_count: int, strategy: ShardStrategy = ShardStrategy.HASH) -> dict[str, int]:
+    """Assign each school to a shard, giving the same assignment on every machine for the same masterfile
+
+    Hashing the school ID keeps a school in the same shard when other schools are added or removed.
+    Balancing by rows gives each shard a similar number of masterfile rows to render, by assigning the
+    largest schools first, each to the shard with the fewest rows so far.
+
+    Args:
+        school_row_counts (dict[str, int]): number of masterfile rows for each school
+        shard_count (int): number of shards
+        strategy (ShardStrategy): hash of the school ID, or balanced by row count
+
+    Returns:
+        dict[str, int]: shard number, from 1, for each school
+    """
+    if strategy == ShardStrategy.HASH:
+        return {school_id: _stable_hash(school_id) % shard_count + 1 for school_id in school_row_counts}
+
+    shard_rows = [0] * shard_count
+    assignment = {}
+    for school_id, row_count in sorted(school_row_counts.items(), key=lambda school: (-school[1], school[0])):
+        shard_index = shard_rows.index(min(shard_rows))
+        shard_rows[shard_index] += row_count
+        assignment[school_id] = shard_index + 1
+    return assignment
+
+
+def shard_school_ids(school_row_counts: dict[str, int], shard: Shard, strategy: ShardStrategy = ShardStrategy.HASH) -> list[str]:
+    """Sorted school IDs assigned to a shard
+
+    Args:
+        school_row_counts (dict[str, int]): number of masterfile rows for each school
+        shard (Shard): shard to select schools for
+        strategy (ShardStrategy): hash of the school ID, or balanced by row count
+
+    Returns:
+        list[str]: school IDs for the shard
+    """
+    assignment = assign_shards(school_row_counts, shard.count, strategy)
+    return sorted(school_id for school_id, shard_index in assignment.items() if shard_index == shard.index)
+
+
+def write_shard_record(
+    shard_dir: Path, shard: Shard, strategy: ShardStrategy, masterfile_hash: str, school_ids: list[str], failed: list[str]
+) -> None:
+    """Record the schools a shard was given once it has finished generating their reports
+
+    Args:
+        shard_dir (Path): shard output directory
+        shard (Shard): shard that was generated
+        strategy (ShardStrategy): strategy used to assign schools to shards
+        masterfile_hash (str): hash of the masterfile the reports were generated from
+        school_ids (list[str]): schools assigned to the shard
+        failed (list[str]): schools whose reports failed to generate
+    """
+    record = {
+        "index": shard.index,
+        "count": shard.count,
+        "strategy": strategy.value,
+        "masterfile_hash": masterfile_hash,
+        "school_ids": school_ids,
+        "failed": failed,
+    }
+    (shard_dir / SHARD_RECORD_FILE_NAME).write_text(json.dumps(record, indent=2))
+
+
+def _read_shard_records(shards_dir: Path) -> list[dict]:
+    """Read the record of each finished shard, checking that the shards belong to one complete run"""
+    records = [json.loads(record_path.read_text()) for record_path in sorted(shards_dir.glob(f"shard_*/{SHARD_RECORD_FILE_NAME}"))]
+    if not records:
+        msg = f"No finished shards found in {shards_dir}"
+        raise ShardMergeException(msg)
+
+    runs = {(record["count"], record["strategy"], record["masterfile_hash"]) for record in records}
+    if len(runs) > 1:
+        msg = f"Shards in {shards_dir} were generated with different shard counts, strategies or masterfiles, remove the out of date shards"
+        raise ShardMergeException(msg)
+
+    shard_count = records[0]["count"]
+    missing_shards = sorted(set(range(1, shard_count + 1)) - {record["index"] for record in records})
+    if missing_shards:
+        msg = f"Shards {missing_shards} of {shard_count} have not finished"
+        raise ShardMergeException(msg)
+    return records
+
+
+def merge_shards(shards_dir: Path, output_dir: Path, school_ids: list[str], masterfile_hash: str) -> list[Path]:
+    """Check that every shard has finished and copy their reports and manifest entries to the report directory
+
+    Only the reports of the schools recorded for each shard are copied.
+
+    Args:
+        shards_dir (Path): directory containing each shard's output directory
+        output_dir (Path): report directory to merge the shards into
+        school_ids (list[str]): every school in the masterfile
+        masterfile_hash (str): hash of the current masterfile
+
+    Raises:
+        ShardMergeException: If any shard is missing, failed schools or was generated from a different masterfile,
+            or if the shards don't cover every school exactly once
+
+    Returns:
+        list[Path]: merged report paths
+    """
+    records = _read_shard_records(shards_dir)
+    if records[0]["masterfile_hash"] != masterfile_hash:
+        msg = "Shards were generated from a different version of the masterfile, generate the shards again"
+        raise ShardMergeException(msg)
+
+    failed = sorted(school_id for record in records for school_id in record["failed"])
+    if failed:
+        msg = f"Report generation failed for schools {failed}, rerun their shards with --resume"
+        raise ShardMergeException(msg)
+
+    assigned = Counter(school_id for record in records for school_id in record["school_ids"])
+    duplicated = sorted(school_id for school_id, shard_count in assigned.items() if shard_count > 1)
+    missing = sorted(set(school_ids) - set(assigned))
+    if duplicated or missing:
+        msg = f"Shards don't cover every school exactly once, missing schools: {missing}, schools in several shards: {duplicated}"
+        raise ShardMergeException(msg)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = ReportManifest.load(output_dir)
+    merged = []
+    for record in records:
+        shard_dir = shards_dir / Shard(record["index"], record["count"]).directory_name
+        shard_manifest = ReportManifest.load(shard_dir)
+        # only the reports of the shard's own schools are merged, the shard directory may hold reports from earlier runs
+        shard_reports = {f"report_{school_id}" for school_id in record["school_ids"]}
+        other_reports = sorted(report_name for report_name in shard_manifest.entries if Path(report_name).stem not in shard_reports)
+        if other_reports:
+            logger.warning("Skipping reports in {shard_dir} for schools outside the shard: {reports}", shard_dir=shard_dir, reports=other_reports)
+        for report_name, entry in shard_manifest.entries.items():
+            if report_name in other_reports:
+                continue
+            report_path = shard_dir / report_name
+            for shard_report in (report_path, report_path.with_suffix(".pdf")):
+                if shard_report.exists():
+                    shutil.copy2(shard_report, output_dir / shard_report.name)
+            manifest.entries[report_name] = entry
+            merged.append(output_dir / report_name)
+    manifest.save()
+    logger.success(
+        "Merged {report_count} reports from {shard_count} shards into {output_dir}",
+        report_count=len(merged),
+        shard_count=len(records),
+        output_dir=output_dir,
+    )
+    return sorted(merged)
@@ -0,0 +1,316 @@
+"""Sending report emails, with interchangeable mail server backends
+
+Exchange Web Services sends through the delegated Office 365 mailbox. SMTP sends through a mail server such as a
+local relay, keeping a pool of open, authenticated connections that each send many emails in turn.
+"""
+import queue
+import smtplib
+import ssl
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from email.message import EmailMessage
+from enum import Enum
+from pathlib import Path
+from typing import Any, Optional
+
+from dynaconf.base import Settings
+from loguru import logger
+
+from rred_reports.reports.auth import ExchangeSession
+from rred_reports.reports.dispatcher import SendNotAttemptedError
+from rred_reports.reports.emails import (
+    ReportEmailer,
+    build_group_email,
+    build_school_email,
+    formatted_group_mail_content,
+    formatted_mail_content,
+    group_attachment_name,
+    school_report_path,
+)
+from rred_reports.reports.grouping import EmailGroup
+
+
+class TransportType(str, Enum):
+    """TransportType class
+
+    Provides mail server backends as enums
+    """
+
+    EWS = "ews"
+    SMTP = "smtp"
+
+
+class MailTransport(ABC):
+    """Interface for building and sending school report emails"""
+
+    @abstractmethod
+    def build_school_email(self, school_id: str, year: int, mail_info: dict, report_name: str, reports_dir: Optional[Path] = None) -> Any:
+        """Build a school's report email, ready to send
+
+        Args:
+            school_id (str): School ID
+            year (int): Starting year of report coverage
+            mail_info (dict): Details of emails
+            report_name (str): Name of attached file
+            reports_dir (Path, optional): Path where the reports should be found
+
+        Returns:
+            Any: Email in the form the transport sends
+        """
+
+    @abstractmethod
+    def build_group_email(
+        self, group: EmailGroup, year: int, mail_info: dict[str, dict], report_name: str, reports_dir: Optional[Path] = None
+    ) -> Any:
+        """Build an email to a group's recipients with every one of the group's school reports attached
+
+        Args:
+            group (EmailGroup): Schools and recipients of the email
+            year (int): Starting year of report coverage
+            mail_info (dict[str, dict]): Details of emails for each school
+            report_name (str): Name of attached file, suffixed with the school ID when several reports are attached
+            reports_dir (Path, optional): Path where the reports should be found
+
+        Returns:
+            Any: Email in the form the transport sends
+        """
+
+    @abstractmethod
+    def send_batch(self, messages: dict[str, Any]) -> dict[str, Optional[Exception]]:
+        """Send built emails
+
+        Args:
+            messages (dict[str, Any]): Built emails, by a key such as the school ID
+
+        Returns:
+            dict[str, Optional[Exception]]: For each key, None if the email was sent or the error if it wasn't
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release any connections held by the transport"""
+
+
+class EwsTransport(MailTransport):
+    """Sending through Exchange Web Services, each batch of emails in a single request"""
+
+    def __init__(self, session: ExchangeSession):
+        """
+        Args:
+            session (ExchangeSession): Authenticated session shared between emails
+        """
+        self.session = session
+
+    def build_school_email(self, school_id: str, year: int, mail_info: dict, report_name: str, reports_dir: Optional[Path] = None) -> Any:
+        return build_school_email(school_id, year, mail_info, report_name, self.session.account, reports_dir)
+
+    def build_group_email(
+        self, group: EmailGroup, year: int, mail_info: dict[str, dict], report_name: str, reports_dir: Optional[Path] = None
+    ) -> Any:
+        return build_group_email(group, year, mail_info, report_name, self.session.account, reports_dir)
+
+    def send_batch(self, messages: dict[str, Any]) -> dict[str, Optional[Exception]]:
+        return ReportEmailer.send_emails(self.session.account, messages, chunk_size=len(messages))
+
+    def close(self) -> None:
+        """Nothing to release, exchangelib closes its pooled HTTP sessions itself"""
+        return
+
+
+class SmtpConnectionPool:
+    """Pool of open SMTP connections, reused for many emails and shared between threads
+
+    Connections are opened as needed, up to the pool size. A connection that fails is closed rather than returned to
+    the pool, so that a broken or timed out connection is replaced on next use.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        size: int = 4,
+        timeout: float = 60,
+    ):
+        """
+        Args:
+            host (str): SMTP server host name
+            port (int): SMTP server port
+            username (Optional[str]): User to log in as, no login if not given
+            password (Optional[str]): Password to log in with
+            starttls (bool): Upgrade each connection to TLS before logging in
+            size (int): Maximum number of open connections
+            timeout (float): Seconds to wait for the server before failing
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[smtplib.SMTP] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self) -> smtplib.SMTP:
+        """Open and authenticate a new connection"""
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls(context=ssl.create_default_context())
+            if self.username:
+                connection.login(self.username, self.password)
+        except Exception:
+            connection.close()
+            raise
+        logger.debug("Opened SMTP connection to {host}:{port}", host=self.host, port=self.port)
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """Use an idle connection, or a new connection if none are idle, returning it to the pool afterwards
+
+        Raises:
+            smtplib.SMTPException: If a new connection can't be opened
+            OSError: If a new connection can't be opened
+
+        Yields:
+            smtplib.SMTP: Open connection
+        """
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._open()
+            try:
+                yield connection
+            except Exception:
+                connection.close()
+                raise
+            # smtplib closes the connection itself when the server says it is closing it
+            if connection.sock is not None:
+                self._idle.put(connection)
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                connection.close()
+
+
+class SmtpTransport(MailTransport):
+    """Sending through an SMTP server over pooled connections, each batch of emails over a single connection
+
+    SMTP doesn't save a copy of each email to a sent mailbox, unlike sending through Exchange.
+    """
+
+    def __init__(self, pool: SmtpConnectionPool, sender: str):
+        """
+        Args:
+            pool (SmtpConnectionPool): Connections to the SMTP server
+            sender (str): Address the emails are sent from
+        """
+        self.pool = pool
+        self.sender = sender
+
+    @classmethod
+    def from_settings(cls, settings: Settings, pool_size: int = 4) -> "SmtpTransport":
+        """Create a transport from the `smtp` settings, sending as the `send_emails_as` address
+
+        Args:
+            settings (Settings): Dynaconf settings
+            pool_size (int): Maximum number of open connections
+
+        Returns:
+            SmtpTransport: SMTP transport
+        """
+        smtp_settings = settings.get("smtp", {})
+        pool = SmtpConnectionPool(
+            host=smtp_settings.get("host", "localhost"),
+            port=smtp_settings.get("port", 25),
+            username=smtp_settings.get("username"),
+            password=smtp_settings.get("password"),
+            starttls=smtp_settings.get("starttls", False),
+            size=pool_size,
+            timeout=smtp_settings.get("timeout", 60),
+        )
+        return cls(pool, settings.send_emails_as)
+
+    def build_school_email(self, school_id: str, year: int, mail_info: dict, report_name: str, reports_dir: Optional[Path] = None) -> EmailMessage:
+        message = self._message(mail_info["mailing_list"], formatted_mail_content(mail_info["school_label"], year, year + 1))
+        report_path = school_report_path(school_id, year, reports_dir)
+        message.add_attachment(report_path.read_bytes(), maintype="application", subtype="pdf", filename=report_name)
+        return message
+
+    def build_group_email(
+        self, group: EmailGroup, year: int, mail_info: dict[str, dict], report_name: str, reports_dir: Optional[Path] = None
+    ) -> EmailMessage:
+        school_names = [mail_info[school_id]["school_label"] for school_id in group.school_ids]
+        message = self._message(group.recipients, formatted_group_mail_content(school_names, year, year + 1))
+        for school_id in group.school_ids:
+            report_path = school_report_path(school_id, year, reports_dir)
+            filename = group_attachment_name(group, report_name, school_id)
+            message.add_attachment(report_path.read_bytes(), maintype="application", subtype="pdf", filename=filename)
+        return message
+
+    def _message(self, recipients: list[str], content_template: dict) -> EmailMessage:
+        """Email with a subject and HTML body, without attachments"""
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = ", ".join(recipients)
+        message["Subject"] = content_template["subject"]
+        message.set_content(str(content_template["body_html"]), subtype="html")
+        return message
+
+    def send_batch(self, messages: dict[str, Any]) -> dict[str, Optional[Exception]]:
+        """Send emails one after another over one pooled connection
+
+        An email rejected by the server fails alone. If the connection fails while an email is being sent, that email
+        fails with the connection error, as the server may have accepted it. The emails after it, or every email if
+        the connection couldn't be opened, fail with a SendNotAttemptedError as they were never sent. A server reply
+        refusing the connection or login is given to every email instead, so that a permanent refusal isn't retried.
+
+        Args:
+            messages (dict[str, Any]): Built emails, by a key such as the school ID
+
+        Returns:
+            dict[str, Optional[Exception]]: For each key, None if the email was sent or the error if it wasn't
+        """
+        errors = {}
+        in_flight = None
+        try:
+            with self.pool.connection() as connection:
+                for key, message in messages.items():
+                    in_flight = key
+                    try:
+                        refused = connection.send_message(message)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as error:
+                        errors[key] = error
+                        continue
+                    if refused:
+                        logger.warning("Email for {key} was not sent to some recipients: {refused}", key=key, refused=refused)
+                    errors[key] = None
+        except (smtplib.SMTPException, OSError) as error:
+            # Only replies to opening the connection or logging in reach here, as replies to an email are caught above
+            opening_refused = in_flight is None and isinstance(error, smtplib.SMTPResponseException)
+            for key in messages:
+                if key in errors:
+                    continue
+                if key == in_flight or opening_refused:
+                    errors[key] = error
+                else:
+                    errors[key] = SendNotAttemptedError(f"Not sent as the SMTP connection failed: {error!r}")
+                    errors[key].__cause__ = error
+        return errors
+
+    def close(self) -> None:
+        self.pool.close()
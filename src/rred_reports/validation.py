@@ -1,13 +1,26 @@
 """Validation of data used by redcap and for reporting"""
+import json
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, Optional
 
 import pandas as pd
 from loguru import logger
 
-from rred_reports.reports.schools import filter_by_entry_and_exit
+from rred_reports import __version__
+from rred_reports.input_cache import read_excel_cached
+from rred_reports.reports.manifest import file_hash
+from rred_reports.reports.schools import entry_and_exit_mask
 
 KEY_FOR_COLUMNS = "---\nkey:\nDL_ = Dispatch List, MF_ = Master File\n---\n"
+VALIDATION_CACHE_FILE = "validation_cache.json"
+# Increase when the cache's layout changes, so older caches are ignored
+VALIDATION_CACHE_FORMAT = 1
+# Columns identifying each masterfile row in data quality issues
+ROW_ID_COLUMNS = ["pupil_no", "rred_user_id", "school_id"]
+# Number of invalid rows logged for each data quality rule, all of them are written to the issues file
+LOGGED_ROWS = 20
 
 
 @dataclass
@@ -28,28 +41,56 @@ def log_school_id_inconsistencies(masterfile_df: pd.DataFrame, dispatch_path: Pa
         dispatch_path (Path): path to dispatch list
         year (int): starting year of the study period
     """
-    dispatch_df = pd.read_excel(dispatch_path)
+    dispatch_df = read_excel_cached(dispatch_path)
     dispatch_df.columns = "DL_" + dispatch_df.columns
 
-    # only keep rows in the trial period
-    masterfile_for_period = filter_by_entry_and_exit(masterfile_df, year)
-    school_changed = _schools_changed(dispatch_df, masterfile_for_period)
+    masterfile_keys = _masterfile_keys(masterfile_df, year)
+    school_changed = _schools_changed(dispatch_df, masterfile_keys)
     # issues encountered, updated in each `_check_..` method
     issues = []
 
     _check_schools_changed(issues, school_changed)
-    schools_differ = _check_schools_differ(dispatch_df, issues, masterfile_for_period, school_changed)
+    schools_differ = _check_schools_differ(dispatch_df, issues, masterfile_keys, school_changed)
 
-    no_match = _mismatch_schools(dispatch_df, masterfile_for_period)
+    no_match = _mismatch_schools(dispatch_df, masterfile_keys)
 
     _check_not_in_masterfile(issues, no_match, school_changed, schools_differ)
-    _check_not_in_dispatch_list(issues, masterfile_for_period, no_match, school_changed, schools_differ, year)
+    _check_not_in_dispatch_list(issues, masterfile_keys, no_match, school_changed, schools_differ)
 
     return issues
 
 
-def _schools_changed(dispatch_df: pd.DataFrame, masterfile_for_period: pd.DataFrame) -> pd.DataFrame:
-    teacher_schools = masterfile_for_period[["rred_user_id", "school_id"]].copy().drop_duplicates()
+def _masterfile_keys(masterfile_df: pd.DataFrame, year: int) -> pd.DataFrame:
+    """
+    Distinct teacher and school ID pairs in the study period, with whether their rows are missing a school name and
+    whether they are from the current survey
+
+    The checks only need these keys, so reducing the masterfile to them in one pass over its rows means that the checks
+    scale with the number of teachers and schools rather than the number of pupils.
+
+    Args:
+        masterfile_df (pd.DataFrame): masterfile data
+        year (int): starting year of the study period
+
+    Returns:
+        pd.DataFrame: distinct "rred_user_id", "school_id", "missing_school_name" and "in_current_survey" rows,
+            in the order they are first found in the masterfile
+    """
+    # only keep rows in the trial period
+    masterfile_for_period = masterfile_df.loc[entry_and_exit_mask(masterfile_df, year)]
+    masterfile_keys = pd.DataFrame(
+        {
+            "rred_user_id": masterfile_for_period["rred_user_id"],
+            "school_id": masterfile_for_period["school_id"],
+            "missing_school_name": masterfile_for_period["rrcp_school"].isna(),
+            "in_current_survey": masterfile_for_period["pupil_no"].astype(str).str.contains(str(year), regex=False),
+        }
+    )
+    return masterfile_keys.drop_duplicates(ignore_index=True)
+
+
+def _schools_changed(dispatch_df: pd.DataFrame, masterfile_keys: pd.DataFrame) -> pd.DataFrame:
+    teacher_schools = masterfile_keys[["rred_user_id", "school_id"]].drop_duplicates()
     school_counts = teacher_schools.groupby("rred_user_id").count()
     multiple_schools = school_counts[school_counts["school_id"] > 1].copy()
 
@@ -65,10 +106,11 @@ def _schools_changed(dispatch_df: pd.DataFrame, masterfile_for_period: pd.DataFr
 
 
 def _check_schools_differ(
-    dispatch_df: pd.DataFrame, issues: list[ValidationIssue], masterfile_for_period: pd.DataFrame, school_changed: pd.DataFrame
+    dispatch_df: pd.DataFrame, issues: list[ValidationIssue], masterfile_keys: pd.DataFrame, school_changed: pd.DataFrame
 ) -> pd.DataFrame:
-    inner_joined = pd.merge(dispatch_df, masterfile_for_period, how="inner", left_on="DL_UserID", right_on="rred_user_id")
-    schools_differ = inner_joined[inner_joined["rrcp_school"].isna() & (~inner_joined["DL_UserID"].isin(school_changed["rred_user_id"]))]
+    missing_school_name = masterfile_keys.loc[masterfile_keys["missing_school_name"], ["rred_user_id", "school_id"]].drop_duplicates()
+    inner_joined = pd.merge(dispatch_df, missing_school_name, how="inner", left_on="DL_UserID", right_on="rred_user_id")
+    schools_differ = inner_joined[~inner_joined["DL_UserID"].isin(school_changed["rred_user_id"])]
     output_mismatch = schools_differ[["DL_UserID", "DL_RRED School ID", "DL_School Label", "rred_user_id", "school_id"]].copy().drop_duplicates()
     if output_mismatch.size != 0:
         output_mismatch.rename({"school_id": "MF_school_id"}, axis=1, inplace=True)
@@ -82,8 +124,9 @@ def _check_schools_differ(
     return schools_differ
 
 
-def _mismatch_schools(dispatch_df: pd.DataFrame, masterfile_for_period: pd.DataFrame):
-    outer_joined = pd.merge(dispatch_df, masterfile_for_period, how="outer", left_on="DL_RRED School ID", right_on="school_id")
+def _mismatch_schools(dispatch_df: pd.DataFrame, masterfile_keys: pd.DataFrame):
+    masterfile_schools = masterfile_keys[["school_id"]].drop_duplicates()
+    outer_joined = pd.merge(dispatch_df, masterfile_schools, how="outer", left_on="DL_RRED School ID", right_on="school_id")
     no_match = outer_joined[outer_joined["school_id"] != outer_joined["DL_RRED School ID"]]
     return no_match[["DL_RRED School ID", "DL_School Label", "school_id"]].copy().drop_duplicates()
 
@@ -117,11 +160,10 @@ def _check_not_in_masterfile(
 
 def _check_not_in_dispatch_list(
     issues: list[ValidationIssue],
-    masterfile_for_period: pd.DataFrame,
+    masterfile_keys: pd.DataFrame,
     no_match: pd.DataFrame,
     school_changed: pd.DataFrame,
     schools_differ: pd.DataFrame,
-    year: int,
 ) -> None:
     not_in_dispatch_list = no_match[
         (~no_match["school_id"].isin(schools_differ["school_id"]))
@@ -130,7 +172,7 @@ def _check_not_in_dispatch_list(
         & (no_match["DL_RRED School ID"].isna())
     ]
     if not_in_dispatch_list.size != 0:
-        data_in_current_survey = masterfile_for_period.loc[masterfile_for_period["pupil_no"].str.contains(str(year)), ["school_id"]].drop_duplicates()
+        data_in_current_survey = masterfile_keys.loc[masterfile_keys["in_current_survey"], ["school_id"]].drop_duplicates()
         data_in_current_survey["in_current_survey"] = True
         output_not_in_dispatch = pd.merge(not_in_dispatch_list, data_in_current_survey, how="left", on="school_id")
         output_not_in_dispatch.loc[output_not_in_dispatch["in_current_survey"].isna(), "in_current_survey"] = False
@@ -145,6 +187,147 @@ def _check_not_in_dispatch_list(
         issues.append(ValidationIssue("not_in_dispatch_list", message, output_not_in_dispatch))
 
 
+@dataclass
+class DataQualityRule:
+    """Rule flagging masterfile rows with impossible values, as a vectorized expression over whole columns"""
+
+    # sheet name in the issues file, so at most 31 characters
+    title: str
+    description: str
+    columns: list[str]
+    invalid: Callable[[pd.DataFrame], pd.Series]
+
+
+def _numbers(masterfile_df: pd.DataFrame, column: str) -> pd.Series:
+    """Column as numbers, with any text that isn't a number as missing"""
+    values = masterfile_df[column]
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    return pd.to_numeric(values, errors="coerce")
+
+
+def _dates(masterfile_df: pd.DataFrame, column: str) -> pd.Series:
+    """Column as dates, with any text that isn't a date as missing"""
+    values = masterfile_df[column]
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, errors="coerce")
+
+
+def _flagged(mask: pd.Series) -> pd.Series:
+    """Boolean mask with missing values, which can't be checked, not flagged"""
+    return mask.fillna(False).astype(bool)
+
+
+def score_range_rule(measure: str, columns: list[str], maximum: Optional[int] = None) -> DataQualityRule:
+    """
+    Rule flagging rows with a score below zero or above the maximum for the assessment
+
+    Args:
+        measure (str): assessment measure, used in the rule title
+        columns (list[str]): score columns for the measure at each assessment
+        maximum (Optional[int]): highest possible score, only negative scores are flagged if not given
+
+    Returns:
+        DataQualityRule: score range rule
+    """
+
+    def invalid(masterfile_df: pd.DataFrame) -> pd.Series:
+        flagged = pd.Series(False, index=masterfile_df.index)
+        for column in columns:
+            scores = _numbers(masterfile_df, column)
+            out_of_range = scores < 0 if maximum is None else (scores < 0) | (scores > maximum)
+            flagged |= _flagged(out_of_range)
+        return flagged
+
+    score_range = "below 0" if maximum is None else f"outside 0 to {maximum}"
+    return DataQualityRule(f"{measure}_out_of_range", f"have {measure} scores {score_range}", columns, invalid)
+
+
+def date_order_rule(title: str, earlier: str, later: str) -> DataQualityRule:
+    """
+    Rule flagging rows where one date is before another date that it should come after
+
+    Args:
+        title (str): rule title
+        earlier (str): column of the date that should be first
+        later (str): column of the date that should be on or after the first date
+
+    Returns:
+        DataQualityRule: date order rule
+    """
+
+    def invalid(masterfile_df: pd.DataFrame) -> pd.Series:
+        return _flagged(_dates(masterfile_df, later) < _dates(masterfile_df, earlier))
+
+    return DataQualityRule(title, f"have {later} before {earlier}", [earlier, later], invalid)
+
+
+LESSON_COUNT_COLUMNS = [
+    "exit_num_weeks",
+    "exit_num_lessons",
+    "exit_lessons_missed_ca",
+    "exit_lessons_missed_cu",
+    "exit_lessons_missed_ta",
+    "exit_lessons_missed_tu",
+]
+
+
+def _impossible_lesson_counts(masterfile_df: pd.DataFrame) -> pd.Series:
+    """Negative lesson counts, or more lessons than one for each school day of the weeks in the programme"""
+    flagged = _flagged(_numbers(masterfile_df, "exit_num_lessons") > 5 * _numbers(masterfile_df, "exit_num_weeks"))
+    for column in LESSON_COUNT_COLUMNS:
+        flagged |= _flagged(_numbers(masterfile_df, column) < 0)
+    return flagged
+
+
+DATA_QUALITY_RULES = [
+    score_range_rule("bl", ["entry_bl_result", "exit_bl_result", "month3_bl_result", "month6_bl_result"]),
+    score_range_rule("li", ["entry_li_result", "exit_li_result"], maximum=54),
+    score_range_rule("cap", ["entry_cap_result", "exit_cap_result"], maximum=24),
+    score_range_rule("wt", ["entry_wt_result", "exit_wt_result"]),
+    score_range_rule("wv", ["entry_wv_result", "exit_wv_result", "month3_wv_result", "month6_wv_result"]),
+    score_range_rule("hrsw", ["entry_hrsw_result", "exit_hrsw_result"], maximum=37),
+    score_range_rule("bas", ["entry_bas_result", "exit_bas_result", "month3_bas_result", "month6_bas_result"], maximum=90),
+    date_order_rule("born_after_entry", "entry_dob", "entry_date"),
+    date_order_rule("exit_before_entry", "entry_date", "exit_date"),
+    date_order_rule("month3_test_before_exit", "exit_date", "month3_testdate"),
+    date_order_rule("month6_test_before_exit", "exit_date", "month6_testdate"),
+    date_order_rule("month6_test_before_month3", "month3_testdate", "month6_testdate"),
+    DataQualityRule(
+        "impossible_lesson_counts",
+        "have negative lesson counts, or more than 5 lessons a week",
+        LESSON_COUNT_COLUMNS,
+        _impossible_lesson_counts,
+    ),
+]
+
+
+def log_data_quality_issues(masterfile_df: pd.DataFrame, rules: Optional[list[DataQualityRule]] = None) -> list[ValidationIssue]:
+    """
+    Log masterfile rows with impossible values, such as out of range scores or dates in the wrong order
+
+    Args:
+        masterfile_df (pd.DataFrame): masterfile data
+        rules (Optional[list[DataQualityRule]]): rules to check, defaults to `DATA_QUALITY_RULES`
+
+    Returns:
+        list[ValidationIssue]: an issue for each rule with invalid rows, of the rows' IDs and the columns checked
+    """
+    if rules is None:
+        rules = DATA_QUALITY_RULES
+
+    issues = []
+    for rule in rules:
+        invalid_rows = masterfile_df.loc[rule.invalid(masterfile_df), [*ROW_ID_COLUMNS, *rule.columns]]
+        if invalid_rows.empty:
+            continue
+        message = f"{invalid_rows.shape[0]} Masterfile rows {rule.description}:"
+        logger.warning("{message}\n{invalid}", message=message, invalid=invalid_rows.head(LOGGED_ROWS).to_string(index=False))
+        issues.append(ValidationIssue(rule.title, message, invalid_rows))
+    return issues
+
+
 def write_issues_if_exist(issues: list[ValidationIssue], issues_path: Path) -> None:
     """
     Writes out issues to Excel file if there are any.
@@ -165,3 +348,92 @@ def write_issues_if_exist(issues: list[ValidationIssue], issues_path: Path) -> N
             sheet = writer.sheets[issue.title]
             for index, line in enumerate(description_lines):
                 sheet.cell(index + 1, 1, value=line)
+
+
+def _read_validation_cache(cache_path: Path) -> dict:
+    """Cached validations by key, or an empty dict if the cache is missing or out of date"""
+    if not cache_path.exists():
+        return {}
+    cache = json.loads(cache_path.read_text())
+    if cache.get("format") != VALIDATION_CACHE_FORMAT:
+        return {}
+    return cache["validations"]
+
+
+def _issues_file_unchanged(cached: dict) -> bool:
+    """Whether the issues file written by a cached validation still has the issues it was written with"""
+    issues_file = Path(cached["issues_file"])
+    return issues_file.exists() and file_hash(issues_file) == cached["issues_file_hash"]
+
+
+def _check_once(check_name: str, key: str, issues_path: Path, check: Callable[[], list[ValidationIssue]]) -> None:
+    """
+    Run a check and write out its issues, unless the check has already been run on the same inputs
+
+    Args:
+        check_name (str): name of what is checked, for logging
+        key (str): key of the check in the cache, which changes whenever the check's inputs change
+        issues_path (Path): Excel file to write any issues to, with the cache next to it
+        check (Callable[[], list[ValidationIssue]]): the check
+    """
+    cache_path = issues_path.parent / VALIDATION_CACHE_FILE
+    key = f"{key}:{__version__}"
+    validations = _read_validation_cache(cache_path)
+    cached = validations.get(key)
+    if cached and (not cached["issues"] or _issues_file_unchanged(cached)):
+        if cached["issues"]:
+            logger.warning(
+                "{check_name} were already checked for these inputs on {checked}, with {issues} issue types in {issues_file}",
+                check_name=check_name,
+                checked=cached["checked"],
+                issues=len(cached["issues"]),
+                issues_file=cached["issues_file"],
+            )
+        else:
+            logger.info(
+                "{check_name} were already checked for these inputs on {checked}, with no issues", check_name=check_name, checked=cached["checked"]
+            )
+        return
+
+    issues = check()
+    write_issues_if_exist(issues, issues_path)
+
+    validations[key] = {
+        "checked": datetime.now().isoformat(timespec="seconds"),
+        "issues": [issue.title for issue in issues],
+        "issues_file": str(issues_path),
+        "issues_file_hash": file_hash(issues_path) if issues else None,
+    }
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps({"format": VALIDATION_CACHE_FORMAT, "validations": validations}, indent=2, sort_keys=True))
+
+
+def check_school_ids(masterfile_df: pd.DataFrame, masterfile_hash: str, dispatch_path: Path, year: int, issues_path: Path) -> None:
+    """
+    Log and write out inconsistencies in school ids, unless the same masterfile and dispatch list have already been checked
+
+    Each check is recorded in a cache next to the issues file, keyed by the contents of the masterfile and dispatch list,
+    so extracting and then repeatedly generating reports from the same files only validates them once.
+
+    Args:
+        masterfile_df (pd.DataFrame): masterfile data
+        masterfile_hash (str): hash of the masterfile file the data is from, see `file_hash`
+        dispatch_path (Path): path to dispatch list
+        year (int): starting year of the study period
+        issues_path (Path): Excel file to write any issues to
+    """
+    key = f"school_ids:{year}:{masterfile_hash}:{file_hash(dispatch_path)}"
+    _check_once("School IDs", key, issues_path, lambda: log_school_id_inconsistencies(masterfile_df, dispatch_path, year))
+
+
+def check_data_quality(masterfile_df: pd.DataFrame, masterfile_hash: str, issues_path: Path) -> None:
+    """
+    Log and write out masterfile rows with impossible values, unless the same masterfile has already been checked
+
+    Args:
+        masterfile_df (pd.DataFrame): masterfile data
+        masterfile_hash (str): hash of the masterfile file the data is from, see `file_hash`
+        issues_path (Path): Excel file to write any issues to
+    """
+    key = f"data_quality:{issues_path.name}:{masterfile_hash}"
+    _check_once("Data quality rules", key, issues_path, lambda: log_data_quality_issues(masterfile_df))
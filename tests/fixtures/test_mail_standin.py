@@ -0,0 +1,278 @@
+"""Local stand-ins for the Exchange Web Services endpoint and an SMTP server, so that sending emails can be tested
+without a mail server
+
+The stand-ins accept emails and record them instead of delivering them. Emails to recipients given an error are
+rejected with that error, as a real server would reject them. A response delay simulates the time the server takes
+to accept each request or email.
+"""
+import base64
+import email
+import socketserver
+import threading
+import time
+from dataclasses import dataclass
+from email import policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from xml.etree import ElementTree
+
+import pytest
+from exchangelib import DELEGATE, Account, Build, Configuration, Version
+from exchangelib.transport import NOAUTH
+
+TYPES_NS = "http://schemas.microsoft.com/exchange/services/2006/types"
+MESSAGES_NS = "http://schemas.microsoft.com/exchange/services/2006/messages"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+_ENVELOPE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    f'<s:Envelope xmlns:s="{SOAP_NS}"><s:Header>'
+    f'<h:ServerVersionInfo xmlns:h="{TYPES_NS}" MajorVersion="15" MinorVersion="1" MajorBuildNumber="2507" MinorBuildNumber="6" Version="V2017_07_11"/>'
+    f'</s:Header><s:Body><m:{{response}} xmlns:m="{MESSAGES_NS}" xmlns:t="{TYPES_NS}"><m:ResponseMessages>{{messages}}</m:ResponseMessages>'
+    "</m:{response}></s:Body></s:Envelope>"
+)
+
+_SENT_ITEMS_FOLDER = (
+    '<m:GetFolderResponseMessage ResponseClass="Success"><m:ResponseCode>NoError</m:ResponseCode><m:Folders><t:Folder>'
+    '<t:FolderId Id="sentitems" ChangeKey="ck"/><t:FolderClass>IPF.Note</t:FolderClass><t:DisplayName>Sent Items</t:DisplayName>'
+    "<t:TotalCount>0</t:TotalCount><t:ChildFolderCount>0</t:ChildFolderCount><t:UnreadCount>0</t:UnreadCount>"
+    "</t:Folder></m:Folders></m:GetFolderResponseMessage>"
+)
+
+_CREATED = '<m:CreateItemResponseMessage ResponseClass="Success"><m:ResponseCode>NoError</m:ResponseCode><m:Items/></m:CreateItemResponseMessage>'
+
+_REJECTED = (
+    '<m:CreateItemResponseMessage ResponseClass="Error"><m:MessageText>Rejected by the stand-in server</m:MessageText>'
+    "<m:ResponseCode>{code}</m:ResponseCode><m:DescriptiveLinkKey>0</m:DescriptiveLinkKey><m:Items/></m:CreateItemResponseMessage>"
+)
+
+
+@dataclass
+class ReceivedEmail:
+    """Email accepted by the stand-in server"""
+
+    subject: str
+    to_recipients: list[str]
+    attachment_names: list[str]
+
+
+class EwsStandIn:
+    """Exchange Web Services endpoint on localhost, recording the emails it is sent"""
+
+    def __init__(self, response_delay: float = 0.0):
+        """
+        Args:
+            response_delay (float): Seconds to wait before responding to each request that sends emails
+        """
+        self.response_delay = response_delay
+        self.received: list[ReceivedEmail] = []
+        self.create_requests = 0
+        self.bytes_received = 0
+        self.recipient_errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        """URL of the EWS endpoint"""
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/EWS/Exchange.asmx"
+
+    def start(self) -> None:
+        """Start serving requests in a background thread"""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving requests"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def account(self, address: str = "rred-sender@example.org", max_connections: int = 4) -> Account:
+        """Account sending through the stand-in server, without authentication or autodiscovery
+
+        Args:
+            address (str): Sender address
+            max_connections (int): Maximum number of connections to the server
+
+        Returns:
+            Account: exchangelib account
+        """
+        config = Configuration(
+            service_endpoint=self.endpoint, auth_type=NOAUTH, version=Version(build=Build(15, 1, 2507, 6)), max_connections=max_connections
+        )
+        return Account(address, config=config, autodiscover=False, access_type=DELEGATE)
+
+    def _respond(self, body: bytes) -> bytes:
+        """Response to a SOAP request, recording the emails in a CreateItem request"""
+        request = ElementTree.fromstring(body)
+        operation = request.find(f"{{{SOAP_NS}}}Body")[0]
+        if operation.tag == f"{{{MESSAGES_NS}}}GetFolder":
+            return _ENVELOPE.format(response="GetFolderResponse", messages=_SENT_ITEMS_FOLDER).encode()
+
+        time.sleep(self.response_delay)
+        responses = []
+        with self._lock:
+            self.create_requests += 1
+            self.bytes_received += len(body)
+            for message in operation.iter(f"{{{TYPES_NS}}}Message"):
+                to_recipients = [
+                    address.text for address in message.findall(f"{{{TYPES_NS}}}ToRecipients/{{{TYPES_NS}}}Mailbox/{{{TYPES_NS}}}EmailAddress")
+                ]
+                error_codes = [self.recipient_errors[address] for address in to_recipients if address in self.recipient_errors]
+                if error_codes:
+                    responses.append(_REJECTED.format(code=error_codes[0]))
+                    continue
+                attachment_names = [attachment.findtext(f"{{{TYPES_NS}}}Name") for attachment in message.iter(f"{{{TYPES_NS}}}FileAttachment")]
+                self.received.append(ReceivedEmail(message.findtext(f"{{{TYPES_NS}}}Subject"), to_recipients, attachment_names))
+                responses.append(_CREATED)
+        return _ENVELOPE.format(response="CreateItemResponse", messages="".join(responses)).encode()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                response = standin._respond(self.rfile.read(int(self.headers["Content-Length"])))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *_args):
+                return
+
+        return Handler
+
+
+@pytest.fixture()
+def ews_standin():
+    standin = EwsStandIn()
+    standin.start()
+    yield standin
+    standin.stop()
+
+
+class SmtpStandIn:
+    """SMTP server on localhost, recording the emails it is sent and the connections made to it"""
+
+    def __init__(self, response_delay: float = 0.0, username: Optional[str] = None, password: Optional[str] = None):
+        """
+        Args:
+            response_delay (float): Seconds to wait before accepting each email
+            username (Optional[str]): User that must log in, no login if not given
+            password (Optional[str]): Password the user must log in with
+        """
+        self.response_delay = response_delay
+        self.username = username
+        self.password = password
+        self.received: list[ReceivedEmail] = []
+        self.connections = 0
+        self.logins = 0
+        self.bytes_received = 0
+        self.messages_per_connection: Optional[int] = None
+        self.recipient_errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def host(self) -> str:
+        """Host the server listens on"""
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        """Port the server listens on"""
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        """Start serving connections in a background thread"""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving connections"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _login(self, command: str) -> str:
+        """Reply to an AUTH PLAIN command"""
+        _, user, password = base64.b64decode(command.split()[-1]).decode().split("\0")
+        if (user, password) != (self.username, self.password):
+            return "535 5.7.8 Authentication credentials invalid"
+        with self._lock:
+            self.logins += 1
+        return "235 2.7.0 Authentication successful"
+
+    def _record(self, recipients: list[str], data: bytes) -> None:
+        """Record an accepted email"""
+        message = email.message_from_bytes(data, policy=policy.default)
+        attachment_names = [attachment.get_filename() for attachment in message.iter_attachments()]
+        with self._lock:
+            self.bytes_received += len(data)
+            self.received.append(ReceivedEmail(message["Subject"], recipients, attachment_names))
+
+    def _handler(self) -> type[socketserver.StreamRequestHandler]:
+        standin = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, *lines: str) -> None:
+                self.wfile.write("".join(f"{line}\r\n" for line in lines).encode())
+
+            def read_data(self) -> bytes:
+                lines = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                return b"".join(lines)
+
+            def handle(self):
+                with standin._lock:
+                    standin.connections += 1
+                self.reply("220 rred-standin ESMTP")
+                recipients = []
+                messages = 0
+                while line := self.rfile.readline():
+                    command = line.decode().rstrip("\r\n")
+                    verb = command[:4].upper()
+                    if verb == "EHLO":
+                        self.reply("250-rred-standin", "250-AUTH PLAIN" if standin.username else "250-SIZE 52428800", "250 8BITMIME")
+                    elif verb == "AUTH":
+                        self.reply(standin._login(command))
+                    elif verb in ("MAIL", "RSET"):
+                        recipients = []
+                        self.reply("250 2.0.0 OK")
+                    elif verb == "RCPT":
+                        address = command.split(":", 1)[1].strip().strip("<>")
+                        if address in standin.recipient_errors:
+                            self.reply(standin.recipient_errors[address])
+                        else:
+                            recipients.append(address)
+                            self.reply("250 2.1.5 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = self.read_data()
+                        time.sleep(standin.response_delay)
+                        standin._record(recipients, data)
+                        self.reply("250 2.0.0 Queued")
+                        messages += 1
+                        if standin.messages_per_connection is not None and messages >= standin.messages_per_connection:
+                            return
+                    elif verb == "NOOP":
+                        self.reply("250 2.0.0 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 2.0.0 Bye")
+                        return
+                    else:
+                        self.reply("502 5.5.2 Command not recognised")
+
+        return Handler
+
+
+@pytest.fixture()
+def smtp_standin():
+    standin = SmtpStandIn(username="rred-sender", password="secret")
+    standin.start()
+    yield standin
+    standin.stop()
@@ -0,0 +1,24 @@
+from benchmarks.benchmark_data_quality import run_data_quality_benchmark
+
+
+def test_data_quality_benchmark():
+    """
+    Given a synthetic masterfile with blocks of 10 invalid rows
+    When the data quality benchmark is run
+    Then each block is found by its rule and the check is timed
+    """
+    benchmark = run_data_quality_benchmark(rows=1000)
+
+    assert benchmark.issues == {
+        "bl_out_of_range": 10,
+        "li_out_of_range": 10,
+        "cap_out_of_range": 10,
+        "wt_out_of_range": 10,
+        "wv_out_of_range": 10,
+        "hrsw_out_of_range": 10,
+        "bas_out_of_range": 10,
+        "exit_before_entry": 10,
+        "impossible_lesson_counts": 10,
+    }
+    assert benchmark.rows_per_second > 0
+    assert "rows/second" in benchmark.summary()
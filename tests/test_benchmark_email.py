@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.benchmark_email import run_email_benchmark
+from rred_reports.reports.transports import TransportType
+
+
+@pytest.mark.parametrize(
+    ("transport", "batch_size", "expected_requests"), [(TransportType.EWS, None, 3), (TransportType.EWS, 2, 2), (TransportType.SMTP, None, 2)]
+)
+def test_email_benchmark(tmp_path, transport, batch_size, expected_requests):
+    """
+    Given three synthetic schools
+    When the email benchmark is run with and without batching, and over SMTP
+    Then every email is sent through the stand-in server and timed
+    """
+    benchmark = run_email_benchmark(tmp_path, school_count=3, workers=2, batch_size=batch_size, response_delay=0, report_kb=4, transport=transport)
+
+    assert benchmark.messages == 3
+    # SMTP opens at most one connection per worker
+    assert benchmark.requests <= expected_requests
+    assert len(benchmark.latencies) == 3
+    assert benchmark.bytes_sent > 3 * 4 * 1024
+    assert benchmark.messages_per_second > 0
+    assert "messages/second" in benchmark.summary()
@@ -1,6 +1,8 @@
+import pandas as pd
 import pytest
 
-from rred_reports.dispatch_list import DispatchListException, get_mailing_info, get_unique_schools
+from rred_reports.dispatch_list import DispatchDirectory, DispatchListException, get_mailing_info, get_unique_schools
+from rred_reports.input_cache import clear_input_cache
 
 
 def test_non_unique_school_raises_exception(data_path):
@@ -59,3 +61,46 @@ def test_get_mailing_info_failure_multiple_rred_ids(data_path):
     with pytest.raises(DispatchListException) as error:
         get_mailing_info(test_id, dispatch_list)
     assert str(error.value) == "Multiple school labels in resulting DataFrame"
+
+
+def test_dispatch_directory_matches_exact_school_id():
+    """
+    Given a dispatch list with school IDs RRS10 and RRS100, where one is a prefix of the other
+    When looking up each school, and a school only matching by prefix
+    Then each school gets only its own contacts, and the prefix isn't found
+    """
+    dispatch_df = pd.DataFrame(
+        {
+            "RRED School ID": ["RRS100", "RRS10"],
+            "School Label": ["School 100", "School 10"],
+            "Email": ["school_100@null.com", "school_10@null.com"],
+            "TL Email": ["leader_100@null.com", None],
+        }
+    )
+    directory = DispatchDirectory(dispatch_df)
+
+    assert directory.mailing_info("RRS10")["mailing_list"] == ["school_10@null.com"]
+    assert directory.mailing_info("RRS100")["mailing_list"] == ["school_100@null.com", "leader_100@null.com"]
+    assert "RRS1" not in directory
+    with pytest.raises(DispatchListException, match="School not found in dispatch list: RRS1."):
+        directory.mailing_info("RRS1")
+
+
+def test_dispatch_directory_reads_dispatch_list_once(mocker, data_path):
+    """
+    Given the test dispatch list
+    When looking up every school in a dispatch directory
+    Then each school's mailing info matches looking it up on its own, with the dispatch list only parsed once
+    """
+    dispatch_list = data_path / "dispatch_list.xlsx"
+    school_ids = ["RRS100", "RRS101", "RRS180"]
+    clear_input_cache()
+    read_excel = mocker.spy(pd, "read_excel")
+    expected = {school_id: get_mailing_info(school_id, dispatch_list) for school_id in school_ids}
+
+    directory = DispatchDirectory.from_excel(dispatch_list)
+    mail_info = {school_id: directory.mailing_info(school_id) for school_id in school_ids}
+
+    assert mail_info == expected
+    assert read_excel.call_count == 1
+    assert len(directory) == 3
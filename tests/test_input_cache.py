@@ -0,0 +1,106 @@
+import json
+import pickle
+
+import pandas as pd
+import pytest
+
+from rred_reports import get_config
+from rred_reports.input_cache import SIDECAR_FORMAT, clear_input_cache, read_excel_cached, sidecar_path
+
+
+@pytest.fixture()
+def excel_file(tmp_path):
+    clear_input_cache()
+    path = tmp_path / "dispatch_list.xlsx"
+    pd.DataFrame({"RRED School ID": ["RRS100", "RRS101"]}).to_excel(path, index=False)
+    yield path
+    clear_input_cache()
+
+
+def test_read_excel_cached_reuses_data_until_file_changes(mocker, excel_file):
+    """
+    Given an excel file that has been read and the returned data changed by the caller
+    When reading it again, then again after the file has been rewritten
+    Then the second read reuses the unchanged data without parsing, and the third parses the new file
+    """
+    read_excel = mocker.spy(pd, "read_excel")
+
+    first_read = read_excel_cached(excel_file)
+    first_read.loc[0, "RRED School ID"] = "changed by caller"
+    second_read = read_excel_cached(excel_file)
+    pd.DataFrame({"RRED School ID": ["RRS100", "RRS101", "RRS102"]}).to_excel(excel_file, index=False)
+    third_read = read_excel_cached(excel_file)
+
+    assert second_read["RRED School ID"].tolist() == ["RRS100", "RRS101"]
+    assert third_read["RRED School ID"].tolist() == ["RRS100", "RRS101", "RRS102"]
+    assert read_excel.call_count == 2
+
+
+def test_read_excel_cached_sidecar_used_by_later_process(mocker, excel_file):
+    """
+    Given an excel file read with a sidecar, and the in-memory cache cleared as it would be in a later command
+    When reading it again, then again after the file has been rewritten
+    Then the second read comes from the sidecar without parsing, and the out of date sidecar is replaced
+    """
+    read_excel_cached(excel_file, sidecar=True)
+    clear_input_cache()
+    read_excel = mocker.spy(pd, "read_excel")
+
+    from_sidecar = read_excel_cached(excel_file, sidecar=True)
+    parses_from_sidecar = read_excel.call_count
+    pd.DataFrame({"RRED School ID": ["RRS102"]}).to_excel(excel_file, index=False)
+    clear_input_cache()
+    after_change = read_excel_cached(excel_file, sidecar=True)
+
+    assert sidecar_path(excel_file).exists()
+    assert parses_from_sidecar == 0
+    assert from_sidecar["RRED School ID"].tolist() == ["RRS100", "RRS101"]
+    assert after_change["RRED School ID"].tolist() == ["RRS102"]
+    assert read_excel.call_count == 1
+
+
+def test_get_config_reads_changed_file(tmp_path):
+    """
+    Given a config file that has been loaded
+    When the file is changed and loaded again
+    Then the new config is returned
+    """
+    config_file = tmp_path / "report_config.toml"
+    config_file.write_text("[school]\nn_tables = 7\n")
+    get_config(config_file)["school"]["n_tables"] = 0
+
+    unchanged = get_config(config_file)
+    config_file.write_text("[school]\nn_tables = 10\n")
+
+    assert unchanged["school"]["n_tables"] == 7
+    assert get_config(config_file)["school"]["n_tables"] == 10
+
+
+def test_read_excel_cached_sidecar_is_json(mocker, tmp_path):
+    """
+    Given an excel file with text, number and date columns read with a sidecar, and a second file whose sidecar has been
+        replaced with a pickle
+    When both are read again by a later command
+    Then the data from the JSON sidecar matches the excel file, and the replaced sidecar is ignored rather than unpickled
+    """
+    clear_input_cache()
+    excel_file = tmp_path / "dispatch_list.xlsx"
+    expected = pd.DataFrame({"RRED School ID": ["RRS100", "RRS101"], "Pupils": [3, 4], "Sent": pd.to_datetime(["2022-06-01", "2022-07-01"])})
+    expected.to_excel(excel_file, index=False)
+    tampered_file = tmp_path / "tampered.xlsx"
+    expected.to_excel(tampered_file, index=False)
+    read_excel_cached(excel_file, sidecar=True)
+    read_excel_cached(tampered_file, sidecar=True)
+    sidecar_path(tampered_file).write_bytes(pickle.dumps({"data": "not json"}))
+    clear_input_cache()
+    read_excel = mocker.spy(pd, "read_excel")
+
+    from_sidecar = read_excel_cached(excel_file, sidecar=True)
+    from_tampered = read_excel_cached(tampered_file, sidecar=True)
+    parses = read_excel.call_count
+    clear_input_cache()
+
+    assert json.loads(sidecar_path(excel_file).read_text())["format"] == SIDECAR_FORMAT
+    pd.testing.assert_frame_equal(from_sidecar, pd.read_excel(excel_file))
+    pd.testing.assert_frame_equal(from_tampered, pd.read_excel(tampered_file))
+    assert parses == 1
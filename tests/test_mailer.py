@@ -1,9 +1,10 @@
 import pytest
 from exchangelib import Message
+from exchangelib.errors import ErrorInvalidRecipients, ErrorMailRecipientNotFound
 
 from rred_reports.dispatch_list import get_mailing_info
-from rred_reports.reports.auth import RREDAuthenticator
-from rred_reports.reports.emails import EmailContent, ReportEmailer, ReportEmailerException, school_mailer
+from rred_reports.reports.auth import ExchangeSession, RREDAuthenticator
+from rred_reports.reports.emails import EmailContent, ReportEmailer, ReportEmailerException, build_school_email, school_mailer
 
 
 def test_build_email_with_report(mock_ews_account, template_report_path):
@@ -161,3 +162,121 @@ def test_school_mailer_failure(data_path, dispatch_list):
         school_mailer(school_id, year, email_info, report_name, reports_dir)
 
     assert "not found" in error.value.message
+
+
+class FakeClock:
+    """Clock whose time only changes when advanced"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def token_authenticator(mocker):
+    authenticator = mocker.MagicMock(name="authenticator", spec=RREDAuthenticator)
+    authenticator.acquire_token.side_effect = [{"access_token": f"token_{number}", "expires_in": 3600} for number in range(3)]
+    authenticator.get_account.return_value = mocker.MagicMock(name="account")
+    return authenticator
+
+
+def test_exchange_session_authenticates_once(token_authenticator):
+    """
+    Given a new session
+    When the account is used for several emails within the token's lifetime
+    Then a token is only acquired and the account only created once
+    """
+    session = ExchangeSession(token_authenticator, clock=FakeClock())
+
+    accounts = [session.account for _ in range(5)]
+
+    assert all(account is accounts[0] for account in accounts)
+    token_authenticator.acquire_token.assert_called_once()
+    token_authenticator.get_account.assert_called_once()
+
+
+def test_exchange_session_refreshes_token_before_expiry(token_authenticator):
+    """
+    Given a session whose token expires in an hour
+    When the account is used with less than the refresh margin left
+    Then a new token is acquired and set on the same account's credentials
+    """
+    clock = FakeClock()
+    session = ExchangeSession(token_authenticator, refresh_margin=300, clock=clock)
+    account = session.account
+
+    clock.now = 3299
+    assert session.account is account
+    clock.now = 3301
+    assert session.account is account
+
+    assert token_authenticator.acquire_token.call_count == 2
+    token_authenticator.get_account.assert_called_once()
+    token_authenticator.get_credentials.assert_called_with({"access_token": "token_1", "expires_in": 3600})
+    assert account.protocol.credentials == token_authenticator.get_credentials.return_value
+
+
+def test_run_with_session_uses_session_account(mocker, mock_ews_account, template_report_path):
+    mocker.patch("exchangelib.Message.send")
+    authenticator_get_account = mocker.patch.object(RREDAuthenticator, "get_account")
+    session = mocker.MagicMock(name="session", spec=ExchangeSession, account=mock_ews_account)
+
+    output = ReportEmailer(session).run("test_school", 3000, 3020, ["recipient@domain.com"], report=template_report_path)
+
+    assert output is True
+    authenticator_get_account.assert_not_called()
+
+
+def test_send_emails_in_bulk(ews_standin, data_path, dispatch_list):
+    """
+    Given report emails built for several schools
+    When they are sent in bulk with a chunk size of two
+    Then every email is sent in two requests, with its report attached
+    """
+    account = ews_standin.account()
+    reports_dir = data_path / "output" / "reports" / "2021" / "schools"
+    email_info = get_mailing_info("AAAAA", dispatch_list)
+    messages = {f"school_{number}": build_school_email("AAAAA", 2021, email_info, "test_report.pdf", account, reports_dir) for number in range(3)}
+
+    errors = ReportEmailer.send_emails(account, messages, chunk_size=2)
+
+    assert errors == {"school_0": None, "school_1": None, "school_2": None}
+    assert ews_standin.create_requests == 2
+    assert len(ews_standin.received) == 3
+    assert ews_standin.received[0].to_recipients == email_info["mailing_list"]
+    assert ews_standin.received[0].attachment_names == ["test_report.pdf"]
+
+
+def test_send_emails_in_bulk_maps_rejected_emails(ews_standin, template_report_path):
+    """
+    Given a batch of emails where the server rejects one recipient
+    When they are sent in bulk
+    Then the rejection is returned for that school only and the other emails are sent
+    """
+    account = ews_standin.account()
+    ews_standin.recipient_errors["bad@domain.com"] = "ErrorInvalidRecipients"
+    ews_standin.recipient_errors["unknown@domain.com"] = "ErrorMailRecipientNotFound"
+    messages = {}
+    recipients = [("AAAAA", "good@domain.com"), ("BBBBB", "bad@domain.com"), ("CCCCC", "other@domain.com"), ("DDDDD", "unknown@domain.com")]
+    for school_id, recipient in recipients:
+        content = EmailContent(account, [recipient], [], "Test", "Test", template_report_path, "test_report.pdf")
+        messages[school_id] = ReportEmailer.build_email(content)
+
+    errors = ReportEmailer.send_emails(account, messages)
+
+    assert errors["AAAAA"] is None
+    assert isinstance(errors["BBBBB"], ErrorInvalidRecipients)
+    assert errors["CCCCC"] is None
+    assert isinstance(errors["DDDDD"], ErrorMailRecipientNotFound)
+    assert [email.to_recipients for email in ews_standin.received] == [["good@domain.com"], ["other@domain.com"]]
+
+
+def test_send_emails_request_failure(mocker, ews_standin, mock_message):
+    mocker.patch("rred_reports.reports.emails.CreateItem.call", side_effect=ConnectionError("no route to host"))
+
+    with pytest.raises(ReportEmailerException) as error:
+        ReportEmailer.send_emails(ews_standin.account(), {"AAAAA": mock_message})
+
+    assert isinstance(error.value.__cause__, ConnectionError)
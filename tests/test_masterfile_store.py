@@ -0,0 +1,89 @@
+import json
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import rred_reports.masterfile_store
+from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports.masterfile_store import load_school_rows, masterfile_store_dir
+from rred_reports.reports.manifest import file_hash
+
+
+@pytest.fixture()
+def masterfile_path(data_path: Path, tmp_path: Path) -> Path:
+    masterfile_copy = tmp_path / "masterfile.xlsx"
+    shutil.copy(data_path / "example_masterfile.xlsx", masterfile_copy)
+    return masterfile_copy
+
+
+def test_load_school_rows_builds_store_once(mocker, masterfile_path: Path):
+    """
+    Given a masterfile without a school store
+    When one school's rows are loaded twice
+    Then the masterfile is only processed the first time, and both loads match the school's rows in the processed masterfile
+    """
+    processed = read_and_process_masterfile(masterfile_path)
+    expected_rows = processed[processed["school_id"] == "RRS2030220"]
+    process_spy = mocker.spy(rred_reports.masterfile_store, "read_and_process_masterfile")
+
+    first_load = load_school_rows(masterfile_path, ["RRS2030220"])
+    second_load = load_school_rows(masterfile_path, ["RRS2030220"])
+
+    assert process_spy.call_count == 1
+    assert first_load.equals(expected_rows)
+    assert second_load.equals(expected_rows)
+    assert (masterfile_store_dir(masterfile_path) / "store.json").exists()
+
+
+def test_load_school_rows_rebuilds_store_when_masterfile_changes(mocker, data_path: Path, masterfile_path: Path):
+    load_school_rows(masterfile_path, ["RRS2030220"])
+    shutil.copy(data_path / "masterfile_teacher_moved_school.xlsx", masterfile_path)
+    process_spy = mocker.spy(rred_reports.masterfile_store, "read_and_process_masterfile")
+
+    load_school_rows(masterfile_path, ["RRS2030220"])
+
+    process_spy.assert_called_once()
+
+
+def test_load_school_rows_missing_school(masterfile_path: Path, loguru_caplog):
+    school_rows = load_school_rows(masterfile_path, ["RRS2030220", "RRS_MISSING"])
+
+    assert set(school_rows["school_id"]) == {"RRS2030220"}
+    assert "No masterfile data found for schools: ['RRS_MISSING']" in loguru_caplog.text
+
+
+def test_load_school_rows_rebuilds_store_when_school_file_changed(mocker, masterfile_path: Path):
+    """
+    Given a school store where a school's file has been replaced with a different pickle
+    When the school's rows are loaded
+    Then the replaced file is not unpickled, and the store is rebuilt from the masterfile before loading the school's rows
+    """
+    expected_rows = load_school_rows(masterfile_path, ["RRS2030220"])
+    store_dir = masterfile_store_dir(masterfile_path)
+    metadata = json.loads((store_dir / "store.json").read_text())
+    school_file = store_dir / metadata["schools"]["RRS2030220"]
+    pd.DataFrame({"school_id": ["RRS_REPLACED"]}).to_pickle(school_file)
+    unpickle_spy = mocker.spy(pd, "read_pickle")
+    process_spy = mocker.spy(rred_reports.masterfile_store, "read_and_process_masterfile")
+
+    school_rows = load_school_rows(masterfile_path, ["RRS2030220"])
+
+    process_spy.assert_called_once()
+    assert unpickle_spy.call_count == 1
+    assert school_rows.equals(expected_rows)
+
+
+def test_load_school_rows_hashes_masterfile_once(mocker, masterfile_path: Path):
+    """
+    Given the hash of a masterfile that has already been hashed by the caller
+    When a school's rows are loaded, building the store
+    Then the masterfile isn't hashed again
+    """
+    masterfile_hash = file_hash(masterfile_path)
+    hash_spy = mocker.spy(rred_reports.masterfile_store, "file_hash")
+
+    load_school_rows(masterfile_path, ["RRS2030220"], masterfile_hash)
+
+    assert masterfile_path not in [call.args[0] for call in hash_spy.call_args_list]
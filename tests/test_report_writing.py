@@ -3,14 +3,20 @@ from pathlib import Path
 import pandas as pd
 import pytest
 
-from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports import ReportType
+from rred_reports.masterfile import read_and_process_masterfile, sort_masterfile
 from rred_reports.reports.schools import (
     filter_by_entry_and_exit,
     filter_for_three_four,
     filter_six,
     populate_school_data,
+    precompute_report_tables,
+    precompute_school_tables,
     school_filter,
     summary_table,
+    table_one_columns,
+    table_six_columns,
+    table_three_columns,
 )
 
 
@@ -183,3 +189,82 @@ def test_table_6_filter(example_school_data):
 
     six_filter = test_filter_six.loc[test_filter_six.pupil_no.isin(["1_2021-22-test", "4_2021-22-test"])]
     assert six_filter.shape[0] == 2
+
+
+def _per_school_summary_counts(school_df: pd.DataFrame, report_year: int) -> dict:
+    """Summary counts computed for one school on its own, as before tables were precomputed"""
+    filtered = filter_by_entry_and_exit(school_df, report_year)[["rred_user_id", "pupil_no", "exit_outcome"]].drop_duplicates()
+    outcomes = filtered["exit_outcome"].str.lower().str.strip().value_counts()
+    return {
+        "number_of_rr_teachers": filtered["rred_user_id"].nunique(),
+        "number_of_pupils_served": (filtered["pupil_no"] + "-" + filtered["rred_user_id"]).nunique(),
+        "po_discontinued": outcomes.get("discontinued", 0),
+        "po_referred_to_school": outcomes.get("referred to school", 0),
+        "po_incomplete": outcomes.get("incomplete", 0),
+        "po_left_school": outcomes.get("left school", 0),
+        "po_ongoing": outcomes.get("ongoing", 0),
+    }
+
+
+def test_precomputed_tables_match_per_school_filtering(data_path: Path):
+    """
+    Given a masterfile with data for 10 schools
+    When the tables for all schools are precomputed in a single pass
+    Then each school's summary and tables should match filtering and sorting that school on its own
+    """
+    masterfile = read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+
+    precomputed = precompute_school_tables(masterfile, 2021)
+
+    assert list(precomputed.keys()) == sorted(masterfile["school_id"].unique())
+    for school_id, school_tables in precomputed.items():
+        school_df = school_filter(masterfile, school_id)
+        assert school_tables.summary.to_dict("records") == [_per_school_summary_counts(school_df, 2021)]
+        expected_table_one = sort_masterfile(filter_by_entry_and_exit(school_df, 2021))[table_one_columns].drop_duplicates()
+        expected_table_three = sort_masterfile(filter_for_three_four(school_df, 2021))[table_three_columns].drop_duplicates()
+        expected_table_six = sort_masterfile(filter_six(school_df, 2021))[table_six_columns].drop_duplicates()
+        assert school_tables.tables[0].equals(expected_table_one)
+        assert school_tables.tables[2].equals(expected_table_three)
+        assert school_tables.tables[5].equals(expected_table_six)
+
+
+def test_precomputed_lost_lessons_column(example_school_data: pd.DataFrame):
+    """
+    Given a masterfile filtered to school RRS2030220
+    When the tables for the school are precomputed
+    Then table four should include the total of all lessons missed, without modifying the input data
+    """
+    school_tables = precompute_school_tables(example_school_data, 2021)["RRS2030220"]
+
+    table_four = school_tables.tables[3]
+    lost_lesson_cols = [col for col in table_four if col.startswith("exit_lessons_missed")]
+    assert (table_four["total_lost_lessons"] == table_four[lost_lesson_cols].sum(axis=1)).all()
+    assert "total_lost_lessons" not in example_school_data
+
+
+def test_precomputed_centre_and_national_rollups(data_path: Path):
+    """
+    Given a masterfile with data for 10 schools in 7 centres
+    When the tables for every level are precomputed in a single pass
+    Then each centre and the national report should count teachers and pupils once across their schools,
+        without any tables listing individual pupils
+    """
+    masterfile = read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+
+    precomputed = precompute_report_tables(masterfile, 2021)
+
+    assert list(precomputed[ReportType.SCHOOL]) == sorted(masterfile["school_id"].unique())
+    assert list(precomputed[ReportType.CENTRE]) == sorted(masterfile["rrcp_area"].unique())
+    assert list(precomputed[ReportType.NATIONAL]) == ["National"]
+
+    filtered = filter_by_entry_and_exit(masterfile, 2021)
+    for centre, centre_tables in precomputed[ReportType.CENTRE].items():
+        centre_rows = filtered[filtered["rrcp_area"] == centre]
+        assert centre_tables.school_name == str(centre)
+        assert centre_tables.summary.loc[0, "number_of_rr_teachers"] == centre_rows["rred_user_id"].nunique()
+        assert centre_tables.tables == []
+
+    national = precomputed[ReportType.NATIONAL]["National"]
+    assert national.summary.loc[0, "number_of_rr_teachers"] == filtered["rred_user_id"].nunique()
+    assert national.summary.loc[0, "number_of_pupils_served"] == len(filtered[["pupil_no", "rred_user_id"]].drop_duplicates())
+    assert national.tables == []
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+
+from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports.reports.checkpoint import JOURNAL_FILE_NAME, GenerationJournal
+from rred_reports.reports.filler import TemplateFillerException
+from rred_reports.reports.generate import generate_report_school
+
+FAILING_SCHOOL = "RRS2030220"
+
+
+@pytest.fixture(scope="module")
+def example_masterfile(data_path: Path):
+    return read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+
+
+def _write_report_failing_one_school(school_tables, _template_file, output_path):
+    if school_tables.school_id == FAILING_SCHOOL:
+        message = "Template broken for this school"
+        raise TemplateFillerException(message)
+    output_path.touch()
+
+
+def test_failed_school_is_recorded_and_run_continues(mocker, example_masterfile, template_report_path: Path, tmp_path: Path):
+    """
+    Given a school whose report fails to render
+    When school reports are generated
+    Then the failure is recorded in the journal and returned, and every other school's report is written
+    """
+    mocker.patch("rred_reports.reports.generate.write_school_report", side_effect=_write_report_failing_one_school)
+
+    failed_schools = generate_report_school(example_masterfile, template_report_path, tmp_path, 2021)
+
+    assert failed_schools == [FAILING_SCHOOL]
+    journal = GenerationJournal.open(tmp_path, resume=True)
+    assert set(journal.completed) == set(example_masterfile["school_id"].unique()) - {FAILING_SCHOOL}
+    assert "Template broken for this school" in journal.failed[FAILING_SCHOOL]
+
+
+def test_resume_only_generates_incomplete_schools(mocker, example_masterfile, template_report_path: Path, tmp_path: Path):
+    """
+    Given a run where one school failed, and which was killed before its manifest was saved
+    When the run is resumed with forced regeneration
+    Then only the failed school is generated, and the manifest includes the schools completed by the first run
+    """
+    write_mock = mocker.patch("rred_reports.reports.generate.write_school_report", side_effect=_write_report_failing_one_school)
+    generate_report_school(example_masterfile, template_report_path, tmp_path, 2021)
+    (tmp_path / "manifest.json").unlink()
+    write_mock.reset_mock(side_effect=True)
+
+    failed_schools = generate_report_school(example_masterfile, template_report_path, tmp_path, 2021, force=True, resume=True)
+
+    assert failed_schools == []
+    assert [call.args[0].school_id for call in write_mock.call_args_list] == [FAILING_SCHOOL]
+    assert (tmp_path / "manifest.json").read_text().count('"data_hash"') == example_masterfile["school_id"].nunique()
+
+
+def test_journal_ignores_incomplete_last_line(tmp_path: Path):
+    journal = GenerationJournal.open(tmp_path)
+    journal.record_done("RRS1", tmp_path / "report_RRS1.docx", "data", "template")
+    with (tmp_path / JOURNAL_FILE_NAME).open("a") as handle:
+        handle.write('{"school_id": "RRS2", "sta')
+
+    resumed = GenerationJournal.open(tmp_path, resume=True)
+
+    assert list(resumed.completed) == ["RRS1"]
+    assert resumed.is_complete("RRS1", "data", "template")
+    assert not resumed.is_complete("RRS1", "changed data", "template")
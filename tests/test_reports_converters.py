@@ -0,0 +1,120 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+from rred_reports.reports.converters import ConverterType, FakeConverter, LibreOfficeConverter, ReportConversionException, get_converter
+from rred_reports.reports.generate import convert_all_reports
+
+
+@pytest.fixture()
+def docx_reports(tmp_path: Path) -> list[Path]:
+    reports = [tmp_path / f"report_{school_id}.docx" for school_id in ["AAAAA", "BBBBB", "CCCCC"]]
+    for report in reports:
+        report.write_text("docx")
+    return reports
+
+
+@pytest.fixture()
+def soffice_available(mocker):
+    return mocker.patch("rred_reports.reports.converters.shutil.which", return_value="/usr/bin/soffice")
+
+
+def _write_soffice_output(command, **_kwargs):
+    report_path = Path(command[-1])
+    output_dir = Path(command[command.index("--outdir") + 1])
+    FakeConverter().convert([report_path], [output_dir / f"{report_path.stem}.pdf"])
+
+
+def test_fake_converter_produces_valid_reports(docx_reports):
+    """
+    Given three docx reports
+    When they are converted using the fake backend
+    Then each should have a valid PDF with the expected number of pages
+    """
+    pdf_paths = [report.with_suffix(".pdf") for report in docx_reports]
+
+    convert_all_reports(docx_reports, pdf_paths, get_converter(ConverterType.FAKE))
+
+    assert all(len(PdfReader(pdf_path).pages) == 10 for pdf_path in pdf_paths)
+
+
+@pytest.mark.usefixtures("soffice_available")
+def test_libreoffice_uses_separate_profile_per_worker(mocker, docx_reports):
+    run_mock = mocker.patch("rred_reports.reports.converters.subprocess.run", side_effect=_write_soffice_output)
+    pdf_paths = [report.with_suffix(".pdf") for report in docx_reports]
+
+    LibreOfficeConverter(workers=2).convert(docx_reports, pdf_paths)
+
+    assert run_mock.call_count == 3
+    assert all(pdf_path.exists() for pdf_path in pdf_paths)
+    profiles = {call.args[0][1] for call in run_mock.call_args_list}
+    assert all(profile.startswith("-env:UserInstallation=file://") for profile in profiles)
+    assert len(profiles) <= 2
+
+
+@pytest.mark.usefixtures("soffice_available")
+def test_libreoffice_retries_after_timeout(mocker, docx_reports):
+    def time_out_first_attempt(command, **kwargs):
+        if run_mock.call_count == 1:
+            raise subprocess.TimeoutExpired(cmd="soffice", timeout=1)
+        _write_soffice_output(command, **kwargs)
+
+    run_mock = mocker.patch("rred_reports.reports.converters.subprocess.run", side_effect=time_out_first_attempt)
+
+    LibreOfficeConverter(workers=1, retries=1).convert(docx_reports[:1], [docx_reports[0].with_suffix(".pdf")])
+
+    assert run_mock.call_count == 2
+    assert docx_reports[0].with_suffix(".pdf").exists()
+
+
+@pytest.mark.usefixtures("soffice_available")
+def test_libreoffice_raises_after_retries(mocker, docx_reports):
+    mocker.patch("rred_reports.reports.converters.subprocess.run", side_effect=subprocess.CalledProcessError(1, "soffice", stderr=b"error"))
+
+    with pytest.raises(ReportConversionException) as error:
+        LibreOfficeConverter(workers=2, retries=1).convert(docx_reports, [report.with_suffix(".pdf") for report in docx_reports])
+
+    assert "failed for 3 reports" in error.value.message
+
+
+@pytest.mark.usefixtures("soffice_available")
+def test_libreoffice_ignores_stale_pdf(mocker, docx_reports):
+    """
+    Given a report with a PDF left from an earlier run
+    When converting the report fails
+    Then the failure is raised rather than the old PDF being treated as the converted report, and the old PDF is removed
+    """
+    pdf_path = docx_reports[0].with_suffix(".pdf")
+    FakeConverter().convert(docx_reports[:1], [pdf_path])
+    mocker.patch("rred_reports.reports.converters.subprocess.run", side_effect=subprocess.CalledProcessError(1, "soffice", stderr=b"error"))
+
+    with pytest.raises(ReportConversionException):
+        LibreOfficeConverter(workers=1, retries=0).convert(docx_reports[:1], [pdf_path])
+
+    assert not pdf_path.exists()
+
+
+def test_libreoffice_missing_executable(mocker):
+    mocker.patch("rred_reports.reports.converters.shutil.which", return_value=None)
+
+    with pytest.raises(ReportConversionException):
+        LibreOfficeConverter()
+
+
+@pytest.mark.usefixtures("soffice_available")
+def test_convert_bytes_uses_temporary_files(mocker, docx_reports):
+    """
+    Given a converter backend that only converts files
+    When docx reports held in memory are converted
+    Then the PDFs are returned as bytes, keyed by PDF file name, and nothing is written next to the original reports
+    """
+    mocker.patch("rred_reports.reports.converters.subprocess.run", side_effect=_write_soffice_output)
+    docx_bytes = {report.name: report.read_bytes() for report in docx_reports}
+
+    pdf_reports = LibreOfficeConverter(workers=2).convert_bytes(docx_bytes)
+
+    assert sorted(pdf_reports) == [report.with_suffix(".pdf").name for report in docx_reports]
+    assert all(pdf_bytes.startswith(b"%PDF") for pdf_bytes in pdf_reports.values())
+    assert not list(docx_reports[0].parent.glob("*.pdf"))
@@ -0,0 +1,243 @@
+import threading
+
+import pytest
+from exchangelib.errors import ErrorInvalidRecipients, ErrorServerBusy
+
+from rred_reports.reports.dispatcher import MailDispatcher, RateLimiter, SendStatus, is_ambiguous, is_retryable
+from rred_reports.reports.emails import ReportEmailerException
+
+
+class FakeClock:
+    """Clock that only moves forward when slept on"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+
+def wrapped_server_busy(back_off=None) -> ReportEmailerException:
+    """Server busy error wrapped by the emailer, as raised by school_mailer"""
+    error = ReportEmailerException("An error occurred emailing this report.")
+    error.__cause__ = ErrorServerBusy("Server busy", back_off=back_off)
+    return error
+
+
+def test_is_retryable_checks_wrapped_errors():
+    assert is_retryable(wrapped_server_busy())
+    assert not is_retryable(ReportEmailerException("Invalid recipient"))
+    assert not is_retryable(ErrorInvalidRecipients("Invalid recipient"))
+
+
+def test_dropped_connections_are_ambiguous_rather_than_retryable():
+    dropped = ReportEmailerException("An error occurred emailing this report.")
+    dropped.__cause__ = ConnectionError("Connection reset by peer")
+
+    assert is_ambiguous(dropped)
+    assert not is_retryable(dropped)
+    assert not is_ambiguous(wrapped_server_busy())
+    assert not is_ambiguous(ErrorInvalidRecipients("Invalid recipient"))
+
+
+def test_rate_limiter_reserves_slots_for_batches():
+    clock = FakeClock()
+    limiter = RateLimiter(30, clock=clock, sleep=clock.sleep)
+
+    limiter.wait(5)
+    limiter.wait()
+
+    assert clock.sleeps == [10.0]
+
+
+def test_rate_limiter_spaces_calls():
+    clock = FakeClock()
+    limiter = RateLimiter(30, clock=clock, sleep=clock.sleep)
+
+    for _ in range(4):
+        limiter.wait()
+
+    assert clock.sleeps == [2.0, 2.0, 2.0]
+
+
+def test_dispatcher_retries_throttled_sends_and_records_failures():
+    """
+    Given one school whose first two sends are throttled, and one school whose send fails with a non-transient error
+    When emails are dispatched to three schools
+    Then the throttled school is sent on the third attempt after backing off, the failing school is recorded
+        without retrying, and the other school is still sent
+    """
+    attempts = {"RRS1": 0, "RRS2": 0, "RRS3": 0}
+
+    def send(school_id: str) -> None:
+        attempts[school_id] += 1
+        if school_id == "RRS1" and attempts[school_id] <= 2:
+            raise wrapped_server_busy()
+        if school_id == "RRS2":
+            message = "Invalid recipient"
+            raise ReportEmailerException(message)
+
+    clock = FakeClock()
+    dispatcher = MailDispatcher(send, workers=3, messages_per_minute=6000, backoff_seconds=1, sleep=clock.sleep)
+    dispatcher.rate_limiter = RateLimiter(6000, clock=clock, sleep=clock.sleep)
+
+    outcomes = dispatcher.run(["RRS1", "RRS2", "RRS3"])
+
+    assert [(outcome.school_id, outcome.status, outcome.attempts) for outcome in outcomes] == [
+        ("RRS1", SendStatus.SENT, 3),
+        ("RRS2", SendStatus.FAILED, 1),
+        ("RRS3", SendStatus.SENT, 1),
+    ]
+    assert "Invalid recipient" in outcomes[1].error
+    assert 1 in clock.sleeps
+    assert 2 in clock.sleeps
+
+
+@pytest.mark.parametrize(("back_off", "expected_delay"), [(None, 4.0), (30, 30.0)])
+def test_dispatcher_gives_up_after_max_attempts(back_off, expected_delay):
+    clock = FakeClock()
+
+    def send(_school_id: str) -> None:
+        raise wrapped_server_busy(back_off)
+
+    dispatcher = MailDispatcher(send, workers=1, messages_per_minute=6000, max_attempts=3, backoff_seconds=2, sleep=clock.sleep)
+    dispatcher.rate_limiter = RateLimiter(6000, clock=clock, sleep=clock.sleep)
+
+    [outcome] = dispatcher.run(["RRS1"])
+
+    assert outcome.status == SendStatus.FAILED
+    assert outcome.attempts == 3
+    assert "ErrorServerBusy" in outcome.error
+    assert max(clock.sleeps) == expected_delay
+
+
+def test_dispatcher_batches_retry_only_throttled_emails():
+    """
+    Given five schools sent in batches of two, where one email is throttled once, one is rejected and one can't be built
+    When the emails are dispatched in batches
+    Then only the throttled email is retried, in a batch of its own, and every school has an outcome
+    """
+    batches = []
+
+    def build_message(school_id: str) -> str:
+        if school_id == "RRS5":
+            message = "Report not found"
+            raise ReportEmailerException(message)
+        return f"email to {school_id}"
+
+    def send_batch(messages: dict[str, str]) -> dict[str, Exception]:
+        batches.append(sorted(messages))
+        errors = {school_id: None for school_id in messages}
+        if "RRS1" in messages and len(batches) == 1:
+            errors["RRS1"] = ErrorServerBusy("Server busy")
+        if "RRS2" in messages:
+            errors["RRS2"] = ErrorInvalidRecipients("Invalid recipient")
+        return errors
+
+    clock = FakeClock()
+    dispatcher = MailDispatcher(print, workers=1, messages_per_minute=6000, backoff_seconds=1, sleep=clock.sleep)
+    dispatcher.rate_limiter = RateLimiter(6000, clock=clock, sleep=clock.sleep)
+
+    outcomes = dispatcher.run_batched(["RRS1", "RRS2", "RRS3", "RRS4", "RRS5"], build_message, send_batch, batch_size=2)
+
+    assert batches == [["RRS1", "RRS2"], ["RRS1"], ["RRS3", "RRS4"]]
+    assert [(outcome.school_id, outcome.status, outcome.attempts) for outcome in outcomes] == [
+        ("RRS1", SendStatus.SENT, 2),
+        ("RRS2", SendStatus.FAILED, 1),
+        ("RRS3", SendStatus.SENT, 1),
+        ("RRS4", SendStatus.SENT, 1),
+        ("RRS5", SendStatus.FAILED, 0),
+    ]
+    assert "Report not found" in outcomes[4].error
+
+
+def test_dispatcher_batch_request_failure_applies_to_every_email():
+    clock = FakeClock()
+
+    def send_batch(_messages: dict[str, str]) -> dict[str, Exception]:
+        raise wrapped_server_busy()
+
+    dispatcher = MailDispatcher(print, workers=2, messages_per_minute=6000, max_attempts=2, backoff_seconds=1, sleep=clock.sleep)
+    dispatcher.rate_limiter = RateLimiter(6000, clock=clock, sleep=clock.sleep)
+
+    outcomes = dispatcher.run_batched(["RRS1", "RRS2", "RRS3"], str, send_batch, batch_size=2)
+
+    assert [(outcome.status, outcome.attempts) for outcome in outcomes] == [(SendStatus.FAILED, 2)] * 3
+
+
+def test_dispatcher_leaves_ambiguous_failures_as_sending():
+    """
+    Given one school whose send times out, and one school sent in a batch whose connection drops
+    When the emails are dispatched, one at a time and in batches
+    Then neither is retried, as the server may have accepted them, and both are left as sending
+    """
+    attempts = []
+
+    def send(school_id: str) -> None:
+        attempts.append(school_id)
+        if school_id == "RRS1":
+            message = "timed out"
+            raise TimeoutError(message)
+
+    def send_batch(messages: dict[str, str]) -> dict[str, Exception]:
+        attempts.extend(messages)
+        return {school_id: ConnectionError("Connection reset by peer") if school_id == "RRS3" else None for school_id in messages}
+
+    clock = FakeClock()
+    dispatcher = MailDispatcher(send, workers=1, messages_per_minute=6000, backoff_seconds=1, sleep=clock.sleep)
+    dispatcher.rate_limiter = RateLimiter(6000, clock=clock, sleep=clock.sleep)
+
+    outcomes = dispatcher.run(["RRS1", "RRS2"]) + dispatcher.run_batched(["RRS3", "RRS4"], str, send_batch, batch_size=2)
+
+    assert attempts == ["RRS1", "RRS2", "RRS3", "RRS4"]
+    assert [(outcome.school_id, outcome.status, outcome.attempts) for outcome in outcomes] == [
+        ("RRS1", SendStatus.SENDING, 1),
+        ("RRS2", SendStatus.SENT, 1),
+        ("RRS3", SendStatus.SENDING, 1),
+        ("RRS4", SendStatus.SENT, 1),
+    ]
+    assert "TimeoutError" in outcomes[0].error
+    assert all(delay < 1 for delay in clock.sleeps)
+
+
+def test_dispatcher_sends_batches_while_building_the_rest():
+    """
+    Given 40 schools sent in batches of 2 by 2 workers
+    When the emails are dispatched in batches
+    Then the first batch is sent before the last email is built, and only a few batches of emails are held at once
+    """
+    lock = threading.Lock()
+    events = []
+    held = {"now": 0, "most": 0}
+
+    def build_message(school_id: str) -> str:
+        with lock:
+            events.append(f"build {school_id}")
+            held["now"] += 1
+            held["most"] = max(held["most"], held["now"])
+        return f"email to {school_id}"
+
+    def send_batch(messages: dict[str, str]) -> dict[str, Exception]:
+        with lock:
+            events.append("send")
+            held["now"] -= len(messages)
+        return {school_id: None for school_id in messages}
+
+    clock = FakeClock()
+    dispatcher = MailDispatcher(print, workers=2, messages_per_minute=6000, sleep=clock.sleep)
+    dispatcher.rate_limiter = RateLimiter(6000, clock=clock, sleep=clock.sleep)
+    school_ids = [f"RRS{number}" for number in range(40)]
+
+    outcomes = dispatcher.run_batched(school_ids, build_message, send_batch, batch_size=2)
+
+    assert [outcome.status for outcome in outcomes] == [SendStatus.SENT] * 40
+    assert events.index("send") < events.index("build RRS39")
+    # Emails building ahead, the batch being filled and the batches being sent
+    assert held["most"] <= 2 * 2 + 2 + 2 * 2
@@ -1,44 +1,101 @@
 from pathlib import Path
 
-import pandas as pd
 import pytest
 from _pytest.logging import LogCaptureFixture
+from docx import Document
 from pypdf import PdfMerger, PdfReader
 from pypdf.errors import EmptyFileError, PdfReadError
 
+from rred_reports import ReportType
+from rred_reports.masterfile import read_and_process_masterfile
 from rred_reports.reports.generate import (
+    PdfValidationSummary,
     ReportConversionException,
     concatenate_pdf_reports,
     convert_all_reports,
     generate_report_school,
+    generate_rollup_reports,
+    merge_pdf_reports,
     validate_pdf,
+    validate_pdfs,
 )
+from rred_reports.reports.schools import precompute_report_tables
 
 
 def test_generate_report_school(temp_data_directories, data_path, mocker):
     output_dir = temp_data_directories["output"]
 
-    populate_school_data_mock = mocker.patch("rred_reports.reports.generate.populate_school_data")
+    write_school_report_mock = mocker.patch("rred_reports.reports.generate.write_school_report")
 
     template_file_path = data_path / "RRED_Report_Template_Single_Category.docx"
-    example_processed_data = {
-        "school_id": [1, 2, 3, 4],
-        "reg_rr_title": ["RR Teacher + Support Role", "RR Teacher + Class Leader", "RR Teacher + Support Role", "RR Teacher + Class Leader"],
-        "rrcp_school": [f"RRS{x}" for x in range(4)],
-    }
-    example_masterfile_df = pd.DataFrame.from_dict(example_processed_data)
+    example_masterfile_df = read_and_process_masterfile(data_path / "example_masterfile.xlsx")
 
     generate_report_school(example_masterfile_df, template_file_path, output_dir, 2021)
-    assert populate_school_data_mock.call_count == len(example_processed_data["school_id"])
+    assert write_school_report_mock.call_count == example_masterfile_df["school_id"].nunique()
+    rendered_school_ids = [call.args[0].school_id for call in write_school_report_mock.call_args_list]
+    assert rendered_school_ids == sorted(example_masterfile_df["school_id"].unique())
+
+
+def test_generate_rollup_reports(temp_data_directories, data_path, mocker):
+    """
+    Given a masterfile with schools in 7 centres
+    When centre and national reports are generated together
+    Then a report is written for each centre and the national report, and unchanged reports are skipped when run again
+    """
+    output_dir = temp_data_directories["output"]
+    write_school_report_mock = mocker.patch("rred_reports.reports.generate.write_school_report")
+    template_file_path = data_path / "RRED_Report_Template_Single_Category.docx"
+    example_masterfile_df = read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+    level_outputs = {
+        ReportType.CENTRE: (template_file_path, output_dir / "centres"),
+        ReportType.NATIONAL: (template_file_path, output_dir / "national"),
+    }
+
+    generate_rollup_reports(example_masterfile_df, 2021, level_outputs)
+
+    report_paths = [call.args[2] for call in write_school_report_mock.call_args_list]
+    expected_centres = [output_dir / "centres" / f"report_{centre}.docx" for centre in sorted(example_masterfile_df["rrcp_area"].unique())]
+    assert report_paths == [*expected_centres, output_dir / "national" / "report_National.docx"]
+
+    for report_path in report_paths:
+        report_path.touch()
+    generate_rollup_reports(example_masterfile_df, 2021, level_outputs)
+    assert write_school_report_mock.call_count == len(report_paths)
+
+
+def test_generate_rollup_reports_from_summary_template(tmp_path, data_path, templates_dir):
+    """
+    Given a rollup template with only the summary table of the 2021 school template
+    When centre and national reports are generated from it
+    Then each report is written with its summary filled in
+    """
+    template = Document(templates_dir / "2021/2021-22_template.docx")
+    for table in template.tables[1:]:
+        table._element.getparent().remove(table._element)  # pylint: disable=protected-access
+    template_file_path = tmp_path / "rollup_template.docx"
+    template.save(template_file_path)
+    example_masterfile_df = read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+    level_outputs = {
+        ReportType.CENTRE: (template_file_path, tmp_path / "centres"),
+        ReportType.NATIONAL: (template_file_path, tmp_path / "national"),
+    }
+
+    generate_rollup_reports(example_masterfile_df, 2021, level_outputs)
+
+    national_report = Document(tmp_path / "national" / "report_National.docx")
+    assert len(national_report.tables) == 1
+    national_summary = precompute_report_tables(example_masterfile_df, 2021)[ReportType.NATIONAL]["National"].summary
+    assert [cell.text for cell in national_report.tables[0].rows[-1].cells] == [str(value) for value in national_summary.iloc[0]]
+    assert len(list((tmp_path / "centres").glob("report_*.docx"))) == example_masterfile_df["rrcp_area"].nunique()
 
 
 def test_convert_single_report_success(mocker, template_report_path: Path, temp_out_dir: Path):
     output_file_path = temp_out_dir / "converted_report.pdf"
-    pdf_conversion_mock = mocker.patch("rred_reports.reports.generate.convert")
-    pdf_validity_check_mock = mocker.patch("rred_reports.reports.generate.validate_pdf")
+    pdf_conversion_mock = mocker.patch("rred_reports.reports.converters.convert")
+    pdf_validity_check_mock = mocker.patch("rred_reports.reports.generate.validate_pdfs", return_value=PdfValidationSummary(valid=[output_file_path]))
     convert_all_reports([template_report_path], [output_file_path])
     pdf_conversion_mock.assert_called_once()
-    pdf_validity_check_mock.assert_called_once()
+    pdf_validity_check_mock.assert_called_once_with([output_file_path])
 
 
 def test_validate_pdf_with_unexpected_number_of_pages(template_report_pdf_path: Path, loguru_caplog: LogCaptureFixture):
@@ -74,6 +131,36 @@ def test_validate_pdf_failure_no_metadata(mocker, template_report_pdf_path):
     assert error.value.message.startswith("Report conversion failed - error reading resulting PDF")
 
 
+def test_validate_pdfs_collects_all_problems(template_report_pdf_path: Path, temp_out_dir: Path):
+    """
+    Given a valid PDF, a missing PDF, an empty PDF and a PDF that isn't a PDF
+    When the PDFs are validated together
+    Then each problem is categorised and all failures are listed in a single exception
+    """
+    empty_pdf = temp_out_dir / "empty.pdf"
+    empty_pdf.touch()
+    not_a_pdf = temp_out_dir / "not_a.pdf"
+    not_a_pdf.write_text("not a pdf")
+    missing_pdf = temp_out_dir / "missing.pdf"
+
+    summary = validate_pdfs([template_report_pdf_path, missing_pdf, empty_pdf, not_a_pdf], workers=2)
+
+    assert summary.valid == [template_report_pdf_path]
+    assert summary.missing == [missing_pdf]
+    assert summary.empty == [empty_pdf]
+    assert summary.unreadable == [not_a_pdf]
+    assert summary.unexpected_page_count == {template_report_pdf_path: 2}
+    with pytest.raises(ReportConversionException) as error:
+        summary.raise_if_failed()
+    assert error.value.message.startswith("Report conversion failed for 3 PDFs")
+
+
+def test_validate_pdfs_logs_page_counts(template_report_pdf_path: Path, loguru_caplog: LogCaptureFixture):
+    summary = validate_pdfs([template_report_pdf_path])
+    summary.report()
+    assert "did not have the 10 pages expected" in loguru_caplog.text
+
+
 def test_concatenate_pdf_reports_success(template_report_pdf_path: Path, temp_out_dir: Path):
     # Original template file is 2 pages long
     files_to_concat = [template_report_pdf_path] * 5
@@ -113,3 +200,57 @@ def test_concatenate_pdf_reports_failure_empty_list_passed(temp_out_dir: Path):
         concatenate_pdf_reports(files_to_concat, temp_out_dir)
     expected_error_message = "Concatenation error - no PDFs provided"
     assert expected_error_message in error.value.message
+
+
+@pytest.fixture()
+def school_pdfs(template_report_pdf_path: Path, temp_out_dir: Path) -> list[Path]:
+    """Seven copies of the 2 page template PDF, named as school reports"""
+    pdf_paths = []
+    for school_number in range(7):
+        pdf_path = temp_out_dir / f"report_RRS{school_number}.pdf"
+        pdf_path.write_bytes(template_report_pdf_path.read_bytes())
+        pdf_paths.append(pdf_path)
+    return pdf_paths
+
+
+def test_merge_pdf_reports_tree_merge_with_bookmarks(school_pdfs: list[Path], temp_out_dir: Path):
+    """
+    Given seven 2 page school reports
+    When they are merged in batches of 2, needing several levels of merging
+    Then a single PDF is written with all pages, a bookmark per school in order, and no intermediate files left
+    """
+    output_paths = merge_pdf_reports(school_pdfs, temp_out_dir, batch_size=2, workers=2)
+
+    assert output_paths == [temp_out_dir / "uat_combined.pdf"]
+    reader = PdfReader(output_paths[0])
+    assert len(reader.pages) == 14
+    assert [item.title for item in reader.outline] == [f"RRS{school_number}" for school_number in range(7)]
+    assert [reader.get_destination_page_number(item) for item in reader.outline] == list(range(0, 14, 2))
+    assert not list(temp_out_dir.glob(".merge_*"))
+
+
+def test_merge_pdf_reports_volumes(school_pdfs: list[Path], temp_out_dir: Path):
+    output_paths = merge_pdf_reports(school_pdfs, temp_out_dir, batch_size=2, volume_size=3, workers=2)
+
+    assert [path.name for path in output_paths] == ["uat_combined_volume_001.pdf", "uat_combined_volume_002.pdf", "uat_combined_volume_003.pdf"]
+    assert [len(PdfReader(path).pages) for path in output_paths] == [6, 6, 2]
+    assert [item.title for item in PdfReader(output_paths[1]).outline] == ["RRS3", "RRS4", "RRS5"]
+
+
+def test_merge_pdf_reports_single_volume_keeps_output_name(school_pdfs: list[Path], temp_out_dir: Path):
+    """
+    Given seven school reports
+    When they are merged with a volume size larger than the number of reports, as by default
+    Then a single PDF is written without a volume number in its name
+    """
+    output_paths = merge_pdf_reports(school_pdfs, temp_out_dir, batch_size=2, volume_size=10, workers=2)
+
+    assert output_paths == [temp_out_dir / "uat_combined.pdf"]
+    assert len(PdfReader(output_paths[0]).pages) == 14
+
+
+def test_merge_pdf_reports_failure_empty_file(school_pdfs: list[Path], temp_out_dir: Path):
+    school_pdfs[3].write_bytes(b"")
+    with pytest.raises(ReportConversionException) as error:
+        merge_pdf_reports(school_pdfs, temp_out_dir)
+    assert error.value.message.startswith("Concatenation error - empty file included in concatenation")
@@ -0,0 +1,40 @@
+from rred_reports.reports.grouping import EmailGroup, group_by_recipients, split_by_attachment_size
+
+
+def school_mail_info(*mailing_list: str) -> dict:
+    return {"school_label": "School", "mailing_list": list(mailing_list)}
+
+
+def test_group_by_recipients_sends_teacher_leader_one_email():
+    """
+    Given three schools covered by one teacher leader, one with two teachers and one teacher at two schools
+    When grouping emails by recipient
+    Then the teacher leader gets one email for all three schools, and each teacher only gets their own schools
+    """
+    mail_info = {
+        "AAAAA": school_mail_info("teacher.a@school.org", "second.a@school.org", "leader@centre.org"),
+        "BBBBB": school_mail_info("teacher.bc@school.org", "Leader@Centre.org"),
+        "CCCCC": school_mail_info("teacher.bc@school.org", "leader@centre.org"),
+    }
+
+    groups = group_by_recipients(mail_info)
+
+    assert groups == [
+        EmailGroup("group_1", ["teacher.a@school.org", "second.a@school.org"], ["AAAAA"]),
+        EmailGroup("group_2", ["leader@centre.org"], ["AAAAA", "BBBBB", "CCCCC"]),
+        EmailGroup("group_3", ["teacher.bc@school.org"], ["BBBBB", "CCCCC"]),
+    ]
+
+
+def test_split_by_attachment_size():
+    groups = [EmailGroup("group_1", ["leader@centre.org"], ["AAAAA", "BBBBB", "CCCCC", "DDDDD"]), EmailGroup("group_2", ["a@b.org"], ["AAAAA"])]
+    report_sizes = {"AAAAA": 40, "BBBBB": 50, "CCCCC": 150, "DDDDD": 10}
+
+    split_groups = split_by_attachment_size(groups, report_sizes, max_attachment_bytes=100)
+
+    assert [(group.key, group.school_ids) for group in split_groups] == [
+        ("group_1_part_1", ["AAAAA", "BBBBB"]),
+        ("group_1_part_2", ["CCCCC"]),
+        ("group_1_part_3", ["DDDDD"]),
+        ("group_2", ["AAAAA"]),
+    ]
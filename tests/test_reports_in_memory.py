@@ -0,0 +1,73 @@
+import zipfile
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports.reports.converters import FakeConverter, PdfConverter, ReportConversionException
+from rred_reports.reports.in_memory import DirectorySink, ZipSink, create_school_reports_in_memory
+
+
+@pytest.fixture(scope="module")
+def example_masterfile(data_path: Path):
+    return read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+
+
+@pytest.fixture()
+def template_file(templates_dir: Path) -> Path:
+    return templates_dir / "2021/2021-22_template.docx"
+
+
+def test_create_reports_in_memory_to_zip(example_masterfile, template_file: Path, tmp_path: Path):
+    """
+    Given a masterfile with 10 schools
+    When the reports are created in memory and written to a zip archive
+    Then the archive contains a PDF for each school and the UAT PDF with a bookmark per school, and no other files are written
+    """
+    archive_path = tmp_path / "reports.zip"
+
+    with ZipSink(archive_path) as sink:
+        validation = create_school_reports_in_memory(example_masterfile, template_file, 2021, FakeConverter(), sink, batch_size=4)
+
+    school_ids = sorted(example_masterfile["school_id"].unique())
+    assert len(validation.valid) == len(school_ids)
+    assert list(tmp_path.iterdir()) == [archive_path]
+    with zipfile.ZipFile(archive_path) as archive:
+        assert sorted(archive.namelist()) == sorted([f"report_{school_id}.pdf" for school_id in school_ids] + ["uat_combined.pdf"])
+        archive.extract("uat_combined.pdf", tmp_path)
+    combined = PdfReader(tmp_path / "uat_combined.pdf")
+    assert len(combined.pages) == 10 * len(school_ids)
+    assert [item.title for item in combined.outline] == school_ids
+
+
+def test_create_reports_in_memory_in_volumes(example_masterfile, template_file: Path, tmp_path: Path):
+    """
+    Given a masterfile with 10 schools
+    When the reports are created in memory with volumes of 4 reports
+    Then the UAT PDF is written as three volumes, each with a bookmark for its reports
+    """
+    with DirectorySink(tmp_path) as sink:
+        create_school_reports_in_memory(example_masterfile, template_file, 2021, FakeConverter(), sink, batch_size=3, volume_size=4)
+
+    school_ids = sorted(example_masterfile["school_id"].unique())
+    volumes = sorted(tmp_path.glob("uat_combined*.pdf"))
+    assert [volume.name for volume in volumes] == ["uat_combined_volume_001.pdf", "uat_combined_volume_002.pdf", "uat_combined_volume_003.pdf"]
+    bookmarks = [[item.title for item in PdfReader(volume).outline] for volume in volumes]
+    assert bookmarks == [school_ids[:4], school_ids[4:8], school_ids[8:]]
+
+
+class _DroppingConverter(PdfConverter):
+    """Converter that fails to produce a PDF for the first report"""
+
+    def convert(self, docx_report_paths: list[Path], output_pdf_paths: list[Path]) -> None:
+        FakeConverter().convert(docx_report_paths[1:], output_pdf_paths[1:])
+
+
+def test_create_reports_in_memory_missing_pdf(example_masterfile, template_file: Path, tmp_path: Path):
+    with pytest.raises(ReportConversionException) as error, DirectorySink(tmp_path) as sink:
+        create_school_reports_in_memory(example_masterfile, template_file, 2021, _DroppingConverter(), sink, batch_size=20, keep_docx=True)
+
+    assert error.value.message.startswith("Report conversion failed for 1 PDFs")
+    assert len(list(tmp_path.glob("*.docx"))) == example_masterfile["school_id"].nunique()
+    assert not (tmp_path / "uat_combined.pdf").exists()
@@ -4,12 +4,22 @@ from pathlib import Path
 import pandas as pd
 import pytest
 import tomli
+import typer
+from dynaconf import Dynaconf
 
 from rred_reports import ReportType, get_config
-from rred_reports.masterfile import masterfile_columns
+from rred_reports.dispatch_list import DispatchDirectory
+from rred_reports.masterfile import masterfile_columns, read_and_process_masterfile
 from rred_reports.reports import emails
+from rred_reports.reports.converters import ConverterType
+from rred_reports.reports.dispatcher import SendStatus
 from rred_reports.reports.emails import ReportEmailer
-from rred_reports.reports.interface import convert, create, generate, send_school, validate_data_sources
+from rred_reports.reports.generate import DEFAULT_VOLUME_SIZE
+from rred_reports.reports.interface import convert, create, generate, generate_all, merge_shard_reports, plan, send_school, validate_data_sources
+from rred_reports.reports.manifest import ReportManifest, file_hash
+from rred_reports.reports.send_journal import SEND_JOURNAL_FILE_NAME, SendJournal
+from rred_reports.reports.shards import ShardStrategy
+from rred_reports.reports.transports import TransportType
 
 example_data_dict = {column: list(range(4)) for column in masterfile_columns()}
 
@@ -57,7 +67,8 @@ def test_validate_data_sources_passes(temp_data_directories: dict):
     example_dispatch_list.to_excel(dispatch_list_path, index=False)
     validated_data = validate_data_sources(2099, template_file_standin_path, processed_data_path, dispatch_list_path, top_level_dir=top_level_dir)
     assert isinstance(validated_data, dict)
-    assert len(validated_data) == 3
+    assert len(validated_data) == 4
+    assert validated_data["masterfile_hash"] == file_hash(processed_data_path)
 
 
 def test_validate_data_sources_fails_processed_data_missing(temp_data_directories: dict):
@@ -106,7 +117,7 @@ def test_get_config_failure():
 
 
 def test_generate_school_reports(mocker, temp_data_directories: dict, data_path):
-    mocker.patch("rred_reports.reports.interface.generate_report_school")
+    mocker.patch("rred_reports.reports.interface.generate_report_school", return_value=[])
     top_level_dir = temp_data_directories["top_level"]
 
     processed_data_path = top_level_dir / "processed_data.xlsx"
@@ -123,6 +134,143 @@ def test_generate_school_reports(mocker, temp_data_directories: dict, data_path)
     assert "output/reports/2099/schools" in "/".join(result.parts)
 
 
+def test_generate_centre_reports(mocker, temp_data_directories: dict, data_path):
+    rollup_patch = mocker.patch("rred_reports.reports.interface.generate_rollup_reports")
+    top_level_dir = temp_data_directories["top_level"]
+
+    processed_data_path = top_level_dir / "processed_data.xlsx"
+    dispatch_list_path = top_level_dir / "tests/data/dispatch_list_single_test_school.xlsx"
+    dispatch_list_path.parent.mkdir(parents=True)
+    template_file_standin_path = top_level_dir / "template_file_standin.csv"
+    example_processed_data.to_excel(processed_data_path, index=False)
+    example_processed_data.to_csv(template_file_standin_path)
+    example_dispatch_list.to_excel(dispatch_list_path, index=False)
+    test_config_file = data_path / "report_config.toml"
+
+    result = generate(ReportType("centre"), 2099, config_file=test_config_file, top_level_dir=top_level_dir)
+
+    assert "output/reports/2099/centres" in "/".join(result.parts)
+    level_outputs = rollup_patch.call_args.args[2]
+    assert level_outputs == {ReportType.CENTRE: (template_file_standin_path, result)}
+
+
+def test_generate_all_skips_levels_without_rollup_template(mocker, tmp_path: Path):
+    """
+    Given a report config with a school template, but no centre or national rollup template for the year
+    When reports are generated for every level
+    Then only school reports are generated
+    """
+    mocker.patch("rred_reports.reports.interface._load_generation_inputs", return_value={"processed_data": example_processed_data})
+    rollup_patch = mocker.patch("rred_reports.reports.interface.generate_rollup_reports")
+    config_file = tmp_path / "report_config.toml"
+    config_file.write_text(
+        '[school.2099]\ntemplate = "template.docx"\nmasterfile = "masterfile.xlsx"\ndispatch_list = "dispatch.xlsx"\n[centre]\nn_tables = 1\n'
+    )
+
+    output_dirs = generate_all(2099, config_file=config_file, top_level_dir=tmp_path)
+
+    assert list(output_dirs) == [ReportType.SCHOOL]
+    assert list(rollup_patch.call_args.args[2]) == [ReportType.SCHOOL]
+
+
+def test_generate_selected_schools(mocker, temp_data_directories: dict, data_path):
+    """
+    Given a masterfile with 10 schools
+    When reports are generated for one school ID
+    Then only that school's rows are used, without validating the whole masterfile
+    """
+    generate_patch = mocker.patch("rred_reports.reports.interface.generate_report_school", return_value=[])
+    validate_patch = mocker.patch("rred_reports.reports.interface.validate_data_sources")
+    top_level_dir = temp_data_directories["top_level"]
+    shutil.copy(data_path / "example_masterfile.xlsx", top_level_dir / "processed_data.xlsx")
+    (top_level_dir / "template_file_standin.csv").touch()
+
+    result = generate(ReportType("school"), 2099, config_file=data_path / "report_config.toml", top_level_dir=top_level_dir, school_id=["RRS2030220"])
+
+    assert "output/reports/2099/schools" in "/".join(result.parts)
+    validate_patch.assert_not_called()
+    school_rows = generate_patch.call_args.args[0]
+    assert set(school_rows["school_id"]) == {"RRS2030220"}
+    assert generate_patch.call_args.kwargs["force"]
+
+
+def test_generate_shards_and_merge(mocker, temp_data_directories: dict, data_path):
+    """
+    Given a masterfile with 10 schools
+    When reports are generated in 3 shards balanced by row count, and the shards are merged
+    Then each shard only renders its own schools' rows, and every school's report is merged into the school report directory
+    """
+
+    def write_reports(school_rows, _template_file, output_dir, _year, **_kwargs):
+        manifest = ReportManifest.load(output_dir)
+        for school_id in school_rows["school_id"].unique():
+            report_path = output_dir / f"report_{school_id}.docx"
+            report_path.parent.mkdir(parents=True, exist_ok=True)
+            report_path.touch()
+            manifest.record_report(report_path, "data", "template")
+        manifest.save()
+        return []
+
+    generate_patch = mocker.patch("rred_reports.reports.interface.generate_report_school", side_effect=write_reports)
+    top_level_dir = temp_data_directories["top_level"]
+    shutil.copy(data_path / "example_masterfile.xlsx", top_level_dir / "processed_data.xlsx")
+    (top_level_dir / "template_file_standin.csv").touch()
+    config_file = data_path / "report_config.toml"
+
+    for index in range(1, 4):
+        generate(ReportType.SCHOOL, 2099, config_file=config_file, top_level_dir=top_level_dir, shard=f"{index}/3", shard_strategy=ShardStrategy.ROWS)
+    report_dir = merge_shard_reports(ReportType.SCHOOL, 2099, config_file=config_file, top_level_dir=top_level_dir)
+
+    shard_schools = [set(call.args[0]["school_id"]) for call in generate_patch.call_args_list]
+    assert all(shard_schools)
+    assert not set.intersection(*shard_schools)
+    assert len(list(report_dir.glob("report_*.docx"))) == len(set.union(*shard_schools)) == 10
+
+
+def test_plan(mocker, temp_data_directories: dict, data_path, tmp_path: Path):
+    """
+    Given the example masterfile and table capacities of 1 row for the summary and 30 rows for every other table
+    When school reports are planned
+    Then every school is planned, with none predicted to overflow, and the plan is written to csv
+    """
+    top_level_dir = temp_data_directories["top_level"]
+    masterfile_path = top_level_dir / "processed_data.xlsx"
+    shutil.copy(data_path / "example_masterfile.xlsx", masterfile_path)
+    processed_data = read_and_process_masterfile(masterfile_path)
+    mocker.patch(
+        "rred_reports.reports.interface.validate_data_sources",
+        return_value={
+            "data": processed_data,
+            "masterfile_hash": file_hash(masterfile_path),
+            "template_file": top_level_dir / "template_file_standin.csv",
+            "output_dir": tmp_path,
+        },
+    )
+    plan_csv = tmp_path / "plan.csv"
+
+    plans = plan(ReportType.SCHOOL, 2099, config_file=data_path / "report_config.toml", top_level_dir=top_level_dir, output=plan_csv)
+
+    assert plans
+    assert not any(report_plan.overflows for report_plan in plans)
+    assert len(pd.read_csv(plan_csv)) == len(plans) + 1
+
+
+def test_plan_requires_measured_table_capacities(mocker, tmp_path: Path):
+    """
+    Given a report config without table capacities for the year
+    When school reports are planned
+    Then planning stops before loading the masterfile, rather than using made up capacities
+    """
+    config_file = tmp_path / "report_config.toml"
+    config_file.write_text('[school]\nn_tables = 7\n\n[school.2099]\ntemplate = "template.docx"\n')
+    load_patch = mocker.patch("rred_reports.reports.interface._load_generation_inputs")
+
+    with pytest.raises(typer.Exit):
+        plan(ReportType.SCHOOL, 2099, config_file=config_file)
+
+    load_patch.assert_not_called()
+
+
 def test_convert(mocker, temp_out_dir: Path):
     convert_single_patch = mocker.patch("rred_reports.reports.interface.convert_all_reports")
     concatenate_patch = mocker.patch("rred_reports.reports.interface.concatenate_pdf_reports")
@@ -137,8 +285,23 @@ def test_convert(mocker, temp_out_dir: Path):
     concatenate_patch.assert_called_once()
 
 
-def test_create(mocker):
-    generate_patch = mocker.patch("rred_reports.reports.interface.generate")
+def test_convert_batched_merge_split_into_volumes(mocker, temp_out_dir: Path):
+    """
+    Given a report directory
+    When converting with a merge batch size but no volume size
+    Then the combined PDF is split into volumes of the default size, to bound memory use
+    """
+    mocker.patch("rred_reports.reports.interface.convert_all_reports")
+    merge_patch = mocker.patch("rred_reports.reports.interface.merge_pdf_reports")
+    (temp_out_dir / "report_RRS1.docx").touch()
+
+    convert(temp_out_dir, merge_batch_size=20)
+
+    assert merge_patch.call_args.kwargs == {"batch_size": 20, "volume_size": DEFAULT_VOLUME_SIZE}
+
+
+def test_create(mocker, tmp_path: Path):
+    generate_patch = mocker.patch("rred_reports.reports.interface._generate_reports", return_value=(tmp_path, []))
     convert_patch = mocker.patch("rred_reports.reports.interface.convert")
 
     level = ReportType("school")
@@ -151,6 +314,93 @@ def test_create(mocker):
     convert_patch.assert_called_once()
 
 
+def test_create_converts_reports_before_exiting_for_failed_schools(mocker, tmp_path: Path):
+    """
+    Given a school whose report fails to generate
+    When reports are created
+    Then the reports that were generated are still converted and combined, before exiting with an error
+    """
+    mocker.patch("rred_reports.reports.interface._generate_reports", return_value=(tmp_path, ["RRS2"]))
+    convert_patch = mocker.patch("rred_reports.reports.interface.convert")
+
+    with pytest.raises(typer.Exit) as exit_info:
+        create(ReportType("school"), 2021, config_file="tests/data/report_config.toml")
+
+    convert_patch.assert_called_once()
+    assert exit_info.value.exit_code == 1
+
+
+def test_generate_resume_rejected_for_centre_reports(mocker):
+    load_patch = mocker.patch("rred_reports.reports.interface._load_generation_inputs")
+
+    with pytest.raises(typer.Exit):
+        generate(ReportType("centre"), 2099, config_file="tests/data/report_config.toml", resume=True)
+
+    load_patch.assert_not_called()
+
+
+def test_create_in_memory_rejects_unsupported_options(mocker):
+    """
+    Given options that in memory creation can't honour, such as merging the combined PDF in batches
+    When reports are created in memory
+    Then creation stops before generating any reports, rather than ignoring the options
+    """
+    in_memory_patch = mocker.patch("rred_reports.reports.interface._create_in_memory")
+
+    with pytest.raises(typer.Exit):
+        create(ReportType("school"), 2021, config_file="tests/data/report_config.toml", in_memory=True, merge_batch_size=20)
+
+    in_memory_patch.assert_not_called()
+
+
+def test_create_pipeline(mocker, tmp_path: Path):
+    """
+    Given a report directory with two school reports and the combined PDF from a previous run
+    When reports are created with the pipeline
+    Then only the school reports' PDFs are combined, without nesting the previous combined PDF
+    """
+    for file_name in ["report_RRS1.docx", "report_RRS1.pdf", "report_RRS2.docx", "report_RRS2.pdf", "uat_combined.pdf"]:
+        (tmp_path / file_name).touch()
+    pipeline_patch = mocker.patch("rred_reports.reports.interface._create_pipelined", return_value=(tmp_path, []))
+    convert_patch = mocker.patch("rred_reports.reports.interface.convert")
+    concatenate_patch = mocker.patch("rred_reports.reports.interface.concatenate_pdf_reports")
+
+    create(ReportType("school"), 2021, config_file="tests/data/report_config.toml", converter=ConverterType.FAKE, pipeline=True)
+
+    pipeline_patch.assert_called_once()
+    convert_patch.assert_not_called()
+    assert concatenate_patch.call_args.args[0] == [tmp_path / "report_RRS1.pdf", tmp_path / "report_RRS2.pdf"]
+
+
+def test_create_pipeline_rejects_word_conversion(mocker):
+    """
+    Given the default docx2pdf converter, which drives Microsoft Word
+    When reports are created with the pipeline
+    Then creation stops before generating any reports
+    """
+    pipeline_patch = mocker.patch("rred_reports.reports.interface._create_pipelined")
+
+    with pytest.raises(typer.Exit):
+        create(ReportType("school"), 2021, config_file="tests/data/report_config.toml", pipeline=True)
+
+    pipeline_patch.assert_not_called()
+
+
+def _dispatch_directory(teacher_leader_email=None) -> DispatchDirectory:
+    """Dispatch list of three schools, each with its own teacher and optionally sharing a teacher leader"""
+    school_ids = ["AAAAA", "BBBBB", "CCCCC"]
+    return DispatchDirectory(
+        pd.DataFrame(
+            {
+                "RRED School ID": school_ids,
+                "School Label": [f"School {school_id}" for school_id in school_ids],
+                "Email": [f"{school_id.lower()}@null.com" for school_id in school_ids],
+                "TL Email": [teacher_leader_email] * len(school_ids),
+            }
+        )
+    )
+
+
 def test_send_school(mocker, temp_data_directories, data_path):
     school_mailer = mocker.patch("rred_reports.reports.interface.school_mailer")
     top_level_dir = temp_data_directories["top_level"]
@@ -169,6 +419,151 @@ def test_send_school(mocker, temp_data_directories, data_path):
     school_mailer.assert_called_once()
 
 
+def test_send_school_resume(mocker, temp_data_directories, data_path):
+    """
+    Given a school whose report was sent in a previous run
+    When sending is resumed
+    Then the school isn't sent again unless its report has changed
+    """
+    school_mailer = mocker.patch("rred_reports.reports.interface.school_mailer")
+    top_level_dir = temp_data_directories["top_level"]
+    test_config_file = data_path / "report_config.toml"
+    dispatch_path = top_level_dir / "tests/data/dispatch_list_single_test_school.xlsx"
+    dispatch_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy(data_path / "dispatch_list_single_test_school.xlsx", dispatch_path)
+    report_path = top_level_dir / "output" / "reports" / "2021" / "schools" / "report_AAAAA.pdf"
+    report_path.parent.mkdir(parents=True)
+    report_path.write_bytes(b"report")
+
+    send_school(2021, ["AAAAA"], config_file=test_config_file, top_level_dir=top_level_dir)
+    send_school(2021, ["AAAAA"], config_file=test_config_file, top_level_dir=top_level_dir, resume=True)
+    assert school_mailer.call_count == 1
+
+    report_path.write_bytes(b"corrected report")
+    send_school(2021, ["AAAAA"], config_file=test_config_file, top_level_dir=top_level_dir, resume=True)
+    assert school_mailer.call_count == 2
+
+
+def test_send_school_leaves_dropped_connection_as_sending(mocker, temp_data_directories, data_path):
+    """
+    Given a school whose send fails with a dropped connection, so may have been sent
+    When sending reports for three schools, then resuming
+    Then that school isn't retried or sent again on resuming, is left as sending in the journal, and the run exits with an error
+    """
+
+    def mailer(school_id, *_args, **_kwargs):
+        if school_id == "BBBBB":
+            message = "An error occurred emailing this report."
+            raise emails.ReportEmailerException(message) from ConnectionError("Connection reset by peer")
+
+    school_mailer = mocker.patch("rred_reports.reports.interface.school_mailer", side_effect=mailer)
+    mocker.patch("rred_reports.reports.interface.ExchangeSession")
+    mocker.patch("rred_reports.reports.interface.DispatchDirectory.from_excel", return_value=_dispatch_directory())
+    top_level_dir = temp_data_directories["top_level"]
+    report_dir = top_level_dir / "output" / "reports" / "2021" / "schools"
+    report_dir.mkdir(parents=True)
+    for school_id in ["AAAAA", "BBBBB", "CCCCC"]:
+        (report_dir / f"report_{school_id}.pdf").write_bytes(f"report {school_id}".encode())
+    send_options = {"config_file": data_path / "report_config.toml", "top_level_dir": top_level_dir, "messages_per_minute": 6000}
+
+    with pytest.raises(typer.Exit) as exit_info:
+        send_school(2021, transport=TransportType.EWS, **send_options)
+    send_school(2021, transport=TransportType.EWS, resume=True, **send_options)
+
+    assert exit_info.value.exit_code == 1
+    assert sorted(call.args[0] for call in school_mailer.call_args_list) == ["AAAAA", "BBBBB", "CCCCC"]
+    with SendJournal(report_dir / SEND_JOURNAL_FILE_NAME) as journal:
+        assert journal.status("BBBBB", ["bbbbb@null.com"], file_hash(report_dir / "report_BBBBB.pdf")) == SendStatus.SENDING
+
+
+def test_send_school_batched(mocker, ews_standin, temp_data_directories, data_path):
+    """
+    Given reports for two schools
+    When sending in batches through a stand-in Exchange server
+    Then both emails are sent in a single request and recorded as sent
+    """
+    mocker.patch("rred_reports.reports.interface.ExchangeSession").return_value.account = ews_standin.account()
+    mocker.patch("rred_reports.reports.interface.DispatchDirectory.from_excel", return_value=_dispatch_directory())
+    top_level_dir = temp_data_directories["top_level"]
+    report_dir = top_level_dir / "output" / "reports" / "2021" / "schools"
+    report_dir.mkdir(parents=True)
+    for school_id in ["AAAAA", "BBBBB"]:
+        shutil.copy(data_path / "output" / "reports" / "2021" / "schools" / "report_AAAAA.pdf", report_dir / f"report_{school_id}.pdf")
+
+    outcomes = send_school(2021, config_file=data_path / "report_config.toml", top_level_dir=top_level_dir, batch_size=10)
+
+    assert [(outcome.school_id, outcome.status) for outcome in outcomes] == [("AAAAA", SendStatus.SENT), ("BBBBB", SendStatus.SENT)]
+    assert ews_standin.create_requests == 1
+    assert sorted(email.to_recipients[0] for email in ews_standin.received) == ["aaaaa@null.com", "bbbbb@null.com"]
+    with SendJournal(report_dir / SEND_JOURNAL_FILE_NAME) as journal:
+        assert journal.status("BBBBB", ["bbbbb@null.com"], file_hash(report_dir / "report_BBBBB.pdf")) == SendStatus.SENT
+
+
+def test_send_school_smtp_from_settings(mocker, smtp_standin, temp_data_directories, data_path):
+    """
+    Given the SMTP transport selected in the settings
+    When sending reports for three schools without batching
+    Then each email is sent over the same pooled SMTP connection, without using Exchange
+    """
+    settings = Dynaconf(
+        MAIL_TRANSPORT="smtp",
+        SEND_EMAILS_AS="rred@example.org",
+        SMTP={"host": smtp_standin.host, "port": smtp_standin.port, "username": "rred-sender", "password": "secret"},
+    )
+    mocker.patch("rred_reports.reports.interface.get_settings", return_value=settings)
+    exchange_session = mocker.patch("rred_reports.reports.interface.ExchangeSession")
+    mocker.patch("rred_reports.reports.interface.DispatchDirectory.from_excel", return_value=_dispatch_directory())
+    top_level_dir = temp_data_directories["top_level"]
+    report_dir = top_level_dir / "output" / "reports" / "2021" / "schools"
+    report_dir.mkdir(parents=True)
+    for school_id in ["AAAAA", "BBBBB", "CCCCC"]:
+        shutil.copy(data_path / "output" / "reports" / "2021" / "schools" / "report_AAAAA.pdf", report_dir / f"report_{school_id}.pdf")
+
+    outcomes = send_school(2021, config_file=data_path / "report_config.toml", top_level_dir=top_level_dir, workers=1, messages_per_minute=6000)
+
+    assert {outcome.status for outcome in outcomes} == {SendStatus.SENT}
+    assert len(smtp_standin.received) == 3
+    assert smtp_standin.connections == 1
+    exchange_session.assert_not_called()
+
+
+def test_send_school_grouped_by_recipient(mocker, smtp_standin, temp_data_directories, data_path):
+    """
+    Given three schools with their own teachers and one teacher leader covering all of them
+    When sending grouped by recipient, then resuming
+    Then each teacher gets their school's report and the teacher leader gets one email with all three, sent only once
+    """
+    settings = Dynaconf(
+        SEND_EMAILS_AS="rred@example.org",
+        SMTP={"host": smtp_standin.host, "port": smtp_standin.port, "username": "rred-sender", "password": "secret"},
+    )
+    mocker.patch("rred_reports.reports.interface.get_settings", return_value=settings)
+    mocker.patch("rred_reports.reports.interface.DispatchDirectory.from_excel", return_value=_dispatch_directory("leader@null.com"))
+    top_level_dir = temp_data_directories["top_level"]
+    report_dir = top_level_dir / "output" / "reports" / "2021" / "schools"
+    report_dir.mkdir(parents=True)
+    for school_id in ["AAAAA", "BBBBB", "CCCCC"]:
+        shutil.copy(data_path / "output" / "reports" / "2021" / "schools" / "report_AAAAA.pdf", report_dir / f"report_{school_id}.pdf")
+    send_options = {
+        "config_file": data_path / "report_config.toml",
+        "top_level_dir": top_level_dir,
+        "transport": TransportType.SMTP,
+        "group_by_recipient": True,
+        "messages_per_minute": 6000,
+    }
+
+    outcomes = send_school(2021, **send_options)
+    send_school(2021, resume=True, **send_options)
+
+    assert len(outcomes) == 6
+    assert {outcome.status for outcome in outcomes} == {SendStatus.SENT}
+    emails_by_recipient = {tuple(email.to_recipients): email for email in smtp_standin.received}
+    assert sorted(emails_by_recipient) == [("aaaaa@null.com",), ("bbbbb@null.com",), ("ccccc@null.com",), ("leader@null.com",)]
+    assert emails_by_recipient[("aaaaa@null.com",)].attachment_names == ["RRED_report.pdf"]
+    assert emails_by_recipient[("leader@null.com",)].attachment_names == ["RRED_report_AAAAA.pdf", "RRED_report_BBBBB.pdf", "RRED_report_CCCCC.pdf"]
+    assert emails_by_recipient[("leader@null.com",)].subject == "Reading Recovery Annual Reports for 3 schools 21-22"
+
+
 @pytest.fixture()
 def tmp_top_level_dir(temp_data_directories) -> Path:
     """
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import pytest
+
+from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports.reports.generate import generate_report_school
+from rred_reports.reports.interface import convert
+from rred_reports.reports.manifest import MANIFEST_FILE_NAME, ReportManifest, partition_hashes
+
+
+@pytest.fixture()
+def masterfile(data_path: Path):
+    return read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+
+
+@pytest.fixture()
+def mock_write_report(mocker):
+    def touch_report(_school_tables, _template_path, output_path):
+        output_path.write_text("report")
+
+    return mocker.patch("rred_reports.reports.generate.write_school_report", side_effect=touch_report)
+
+
+def test_partition_hashes_only_change_for_edited_school(masterfile):
+    """
+    Given a masterfile with 10 schools
+    When a value for one pupil is changed
+    Then only the hash for that pupil's school should change
+    """
+    original_hashes = partition_hashes(masterfile, 2021)
+    edited = masterfile.copy()
+    edited.loc[edited["school_id"] == "RRS2030220", "exit_num_lessons"] = 99
+
+    edited_hashes = partition_hashes(edited, 2021)
+
+    changed = [school_id for school_id, data_hash in edited_hashes.items() if original_hashes[school_id] != data_hash]
+    assert changed == ["RRS2030220"]
+
+
+def test_generate_skips_unchanged_reports(masterfile, data_path, tmp_path, mock_write_report):
+    """
+    Given reports which have already been generated from a masterfile
+    When reports are generated again after changing one school's data
+    Then only that school's report should be written again, unless all reports are forced
+    """
+    template = data_path / "RRED_Report_Template_Single_Category.docx"
+    school_count = masterfile["school_id"].nunique()
+
+    generate_report_school(masterfile, template, tmp_path, 2021)
+    assert mock_write_report.call_count == school_count
+    assert (tmp_path / MANIFEST_FILE_NAME).exists()
+
+    edited = masterfile.copy()
+    edited.loc[edited["school_id"] == "RRS2030220", "exit_num_lessons"] = 99
+    generate_report_school(edited, template, tmp_path, 2021)
+    assert mock_write_report.call_count == school_count + 1
+    assert mock_write_report.call_args.args[0].school_id == "RRS2030220"
+
+    generate_report_school(edited, template, tmp_path, 2021, force=True)
+    assert mock_write_report.call_count == 2 * school_count + 1
+
+
+def test_convert_skips_up_to_date_pdfs(mocker, tmp_path):
+    """
+    Given two docx reports that have both been converted to PDF
+    When one docx report is changed and conversion is run again
+    Then only the changed report should be converted
+    """
+
+    def write_pdfs(_docx_paths, pdf_paths, _converter):
+        for pdf_path in pdf_paths:
+            pdf_path.write_text("pdf")
+
+    convert_mock = mocker.patch("rred_reports.reports.interface.convert_all_reports", side_effect=write_pdfs)
+    mocker.patch("rred_reports.reports.interface.concatenate_pdf_reports")
+    for school_id in ["AAAAA", "BBBBB"]:
+        (tmp_path / f"report_{school_id}.docx").write_text(school_id)
+
+    convert(tmp_path)
+    assert len(convert_mock.call_args.args[0]) == 2
+
+    (tmp_path / "report_BBBBB.docx").write_text("changed")
+    convert(tmp_path)
+    assert convert_mock.call_args.args[0] == [tmp_path / "report_BBBBB.docx"]
+    assert "pdf_source_hash" in ReportManifest.load(tmp_path).entries["report_BBBBB.docx"]
@@ -0,0 +1,107 @@
+import dataclasses
+from pathlib import Path
+
+import pytest
+import tomli_w
+from docx import Document
+from pypdf import PdfReader
+
+from rred_reports.masterfile import read_and_process_masterfile
+from rred_reports.reports.converters import FakeConverter
+from rred_reports.reports.filler import TemplateFiller
+from rred_reports.reports.pdf_renderer import PdfLayout, render_school_pdf, write_layout_docx
+from rred_reports.reports.schools import precompute_school_tables
+
+
+@pytest.fixture(scope="module")
+def school_tables(data_path: Path):
+    masterfile = read_and_process_masterfile(data_path / "example_masterfile.xlsx")
+    return precompute_school_tables(masterfile, 2021)["RRS2030220"]
+
+
+@pytest.fixture()
+def template_path(templates_dir: Path) -> Path:
+    return templates_dir / "2021/2021-22_template.docx"
+
+
+def _write_layout(layout_dir: Path, table_rows: int) -> Path:
+    static_pdf = layout_dir / "static.pdf"
+    static_pdf.with_suffix(".docx").write_text("docx")
+    FakeConverter(page_count=10).convert([static_pdf.with_suffix(".docx")], [static_pdf])
+    layout = {
+        "static_pdf": "static.pdf",
+        "school_name": {"page": 0, "x": 40.0, "y": 500.0},
+        "tables": [{"page": index + 1, "top": 700.0, "rows": 1 if index == 0 else table_rows} for index in range(7)],
+    }
+    layout_file = layout_dir / "layout.toml"
+    with layout_file.open("wb") as handle:
+        tomli_w.dump(layout, handle)
+    return layout_file
+
+
+def test_render_school_pdf_matches_docx_tables(school_tables, template_path, tmp_path):
+    """
+    Given the precomputed tables for school RRS2030220 and a layout for the 2021 template
+    When the school report is rendered directly to PDF
+    Then the school name and every table cell written to the docx report should be on the page for that table
+    """
+    layout = PdfLayout.load(_write_layout(tmp_path, table_rows=30), template_path)
+    output_pdf = tmp_path / "report_RRS2030220.pdf"
+
+    page_count = render_school_pdf(school_tables, layout, output_pdf)
+
+    reader = PdfReader(output_pdf)
+    assert page_count == len(reader.pages) == 10
+    assert school_tables.school_name in reader.pages[0].extract_text()
+    for table, table_layout in zip([school_tables.summary, *school_tables.tables], layout.tables):
+        page_text = reader.pages[table_layout.page].extract_text()
+        for row in table.itertuples(index=False):
+            assert all(TemplateFiller.cell_text(value) in page_text for value in row)
+
+
+def test_render_school_pdf_overflow_adds_pages(school_tables, template_path, tmp_path):
+    """
+    Given a layout with space for a single row in each table
+    When a school with multiple pupils is rendered
+    Then extra pages should be added for the rows that don't fit
+    """
+    layout = PdfLayout.load(_write_layout(tmp_path, table_rows=1), template_path)
+
+    page_count = render_school_pdf(school_tables, layout, tmp_path / "report.pdf")
+
+    expected_extra_pages = sum(1 for table in school_tables.tables if table.shape[0] > 1)
+    assert page_count == 10 + expected_extra_pages
+
+
+def test_layout_columns_from_template(template_path, tmp_path):
+    """
+    Given the 2021 template
+    When a layout is loaded without column positions
+    Then each table should have a column position for each template column, starting at the page margin
+    """
+    layout = PdfLayout.load(_write_layout(tmp_path, table_rows=30), template_path)
+
+    assert [len(table.column_x) for table in layout.tables] == [7, 10, 4, 7, 8, 18, 12]
+    assert all(table.column_x[0] == pytest.approx(32.6, abs=0.1) for table in layout.tables)
+
+
+def test_layout_fingerprint_includes_continuation_top(template_path, tmp_path):
+    layout = PdfLayout.load(_write_layout(tmp_path, table_rows=30), template_path)
+
+    assert dataclasses.replace(layout, continuation_top=layout.continuation_top - 100).fingerprint != layout.fingerprint
+
+
+def test_write_layout_docx_reserves_rows(template_path, tmp_path):
+    """
+    Given a layout file reserving 30 rows for each table
+    When the layout docx is written
+    Then each table should have 30 blank rows after its header
+    """
+    layout_file = _write_layout(tmp_path, table_rows=30)
+    output_docx = tmp_path / "layout.docx"
+
+    write_layout_docx(template_path, layout_file, output_docx)
+
+    tables = Document(output_docx).tables
+    header_rows = [2, 1, 1, 1, 1, 2, 2]
+    assert [len(table.rows) - headers for table, headers in zip(tables, header_rows)] == [1, 30, 30, 30, 30, 30, 30]
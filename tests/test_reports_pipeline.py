@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from rred_reports.reports.converters import Docx2PdfConverter, FakeConverter, ReportConversionException
+from rred_reports.reports.manifest import ReportManifest
+from rred_reports.reports.pipeline import ReportPipeline
+
+
+def write_reports(report_dir: Path, school_ids: list[str]) -> Callable[[Callable[[Path], None]], None]:
+    """Report generation stand-in, writing an empty docx for each school"""
+
+    def generate_reports(on_report_written: Callable[[Path], None]) -> None:
+        for school_id in school_ids:
+            report_path = report_dir / f"report_{school_id}.docx"
+            report_path.touch()
+            on_report_written(report_path)
+
+    return generate_reports
+
+
+def test_pipeline_converts_and_validates_each_report(tmp_path: Path):
+    """
+    Given more reports than fit in the pipeline queues
+    When the pipeline is run with a converter writing 10 page PDFs
+    Then every report is converted and validated, and the PDFs are recorded in the manifest
+    """
+    school_ids = [f"RRS{school_number}" for school_number in range(10)]
+
+    validation = ReportPipeline(FakeConverter(), queue_size=2, batch_size=3).run(write_reports(tmp_path, school_ids), tmp_path)
+
+    assert sorted(validation.valid) == sorted(tmp_path / f"report_{school_id}.pdf" for school_id in school_ids)
+    assert not validation.failed
+    assert not validation.unexpected_page_count
+    manifest = ReportManifest.load(tmp_path)
+    assert all(manifest.pdf_is_current(tmp_path / f"report_{school_id}.docx", tmp_path / f"report_{school_id}.pdf") for school_id in school_ids)
+
+
+def test_pipeline_converts_existing_reports_with_stale_pdfs(tmp_path: Path):
+    (tmp_path / "report_RRS100.docx").touch()
+
+    validation = ReportPipeline(FakeConverter()).run(write_reports(tmp_path, ["RRS1"]), tmp_path)
+
+    assert sorted(validation.valid) == [tmp_path / "report_RRS1.pdf", tmp_path / "report_RRS100.pdf"]
+
+
+def test_pipeline_stops_on_conversion_error(tmp_path: Path):
+    """
+    Given a generator that writes reports indefinitely
+    When conversion fails
+    Then generation is stopped and the conversion error is raised
+    """
+
+    def generate_forever(on_report_written: Callable[[Path], None]) -> None:
+        while True:
+            # Reports are never written, so the converter fails on the first one
+            on_report_written(tmp_path / "report_missing.docx")
+
+    with pytest.raises(ReportConversionException) as error:
+        ReportPipeline(FakeConverter(), queue_size=1).run(generate_forever, tmp_path)
+
+    assert error.value.message.startswith("Report conversion failed - docx report does not exist")
+
+
+def test_pipeline_rejects_word_converter():
+    with pytest.raises(ReportConversionException):
+        ReportPipeline(Docx2PdfConverter())
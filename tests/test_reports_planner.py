@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from rred_reports import ReportType
+from rred_reports.reports.planner import TableCapacities, plan_reports, plan_table, predict_pages
+from rred_reports.reports.schools import SchoolTables
+
+CAPACITIES = TableCapacities(table_rows=[1, 30, 30, 30, 30, 30, 30], continuation_rows=40)
+
+
+def school_tables(school_id: str, table_rows: int, school_name: str = "School") -> SchoolTables:
+    """Tables for a school with the same number of rows in every table except the summary"""
+    return SchoolTables(school_id, school_name, pd.DataFrame({"count": [1]}), [pd.DataFrame({"row": range(table_rows)}) for _ in range(6)])
+
+
+@pytest.mark.parametrize(
+    ("row_counts", "expected_pages"),
+    [
+        ([1, 30, 30, 30, 30, 30, 30], 10),
+        ([1, 31, 0, 0, 0, 0, 0], 11),
+        ([1, 71, 0, 0, 0, 0, 0], 12),
+        ([1, 31, 0, 0, 0, 0, 31], 12),
+    ],
+)
+def test_predict_pages(row_counts: list[int], expected_pages: int):
+    assert predict_pages(row_counts, CAPACITIES) == expected_pages
+
+
+def test_plan_reports_flags_overflowing_schools():
+    """
+    Given one school whose tables fit and one with a table row over capacity, and a school without a name
+    When reports are planned
+    Then only the school with too many rows is predicted to overflow, and the unnamed school isn't planned
+    """
+    tables = {"RRS2": school_tables("RRS2", 31), "RRS1": school_tables("RRS1", 30), "RRS3": school_tables("RRS3", 50, None)}
+
+    plans = plan_reports(tables, CAPACITIES)
+
+    assert [(plan.school_id, plan.overflows) for plan in plans] == [("RRS1", False), ("RRS2", True)]
+    table = plan_table(plans, CAPACITIES)
+    assert table.loc["capacity", "table_1"] == 30
+    assert table.loc["RRS2"].tolist() == [1, 31, 31, 31, 31, 31, 31, 16]
+
+
+def test_table_capacities_from_config_year_override():
+    config = {"school": {"table_capacities": [1, 30], "continuation_rows": 40, "2022": {"table_capacities": [1, 25]}, "2021": {}}}
+
+    assert TableCapacities.from_config(config, ReportType.SCHOOL, 2022) == TableCapacities([1, 25], 40)
+    assert TableCapacities.from_config(config, ReportType.SCHOOL, 2021) == TableCapacities([1, 30], 40)
+    with pytest.raises(KeyError, match="No table_capacities"):
+        TableCapacities.from_config({"centre": {}}, ReportType.CENTRE, 2022)
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from rred_reports.reports.dispatcher import SendStatus
+from rred_reports.reports.send_journal import SendJournal
+
+
+def test_send_journal_persists_status_across_runs(tmp_path: Path):
+    journal_path = tmp_path / "send_journal.sqlite3"
+    with SendJournal(journal_path) as journal:
+        journal.record("RRS1", ["b@school.org", "a@school.org"], "hash", SendStatus.SENDING)
+        journal.record("RRS1", ["b@school.org", "a@school.org"], "hash", SendStatus.SENT)
+        journal.record("RRS2", ["c@school.org"], "hash", SendStatus.FAILED, "Server busy")
+
+    with SendJournal(journal_path) as journal:
+        assert journal.status("RRS1", ["A@school.org", "b@school.org"], "hash") == SendStatus.SENT
+        assert journal.status("RRS2", ["c@school.org"], "hash") == SendStatus.FAILED
+
+
+def test_send_journal_status_depends_on_report_and_recipients(tmp_path: Path):
+    with SendJournal(tmp_path / "send_journal.sqlite3") as journal:
+        journal.record("RRS1", ["a@school.org"], "hash", SendStatus.SENT)
+
+        assert journal.status("RRS1", ["a@school.org"], "changed report") is None
+        assert journal.status("RRS1", ["uat@ucl.ac.uk"], "hash") is None
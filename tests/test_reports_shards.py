@@ -0,0 +1,131 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from rred_reports.reports.manifest import ReportManifest
+from rred_reports.reports.shards import (
+    SHARD_RECORD_FILE_NAME,
+    Shard,
+    ShardMergeException,
+    ShardStrategy,
+    assign_shards,
+    merge_shards,
+    shard_school_ids,
+    write_shard_record,
+)
+
+ROW_COUNTS = {f"RRS{school_number}": school_number + 1 for school_number in range(20)}
+
+
+@pytest.mark.parametrize("strategy", list(ShardStrategy))
+def test_shards_cover_every_school_once(strategy: ShardStrategy):
+    shard_schools = [shard_school_ids(ROW_COUNTS, Shard(index, 3), strategy) for index in range(1, 4)]
+
+    all_assigned = [school_id for school_ids in shard_schools for school_id in school_ids]
+    assert sorted(all_assigned) == sorted(ROW_COUNTS)
+
+
+def test_hash_assignment_is_stable_when_schools_are_removed():
+    fewer_schools = {school_id: rows for school_id, rows in ROW_COUNTS.items() if school_id != "RRS0"}
+
+    full_assignment = assign_shards(ROW_COUNTS, 4)
+    reduced_assignment = assign_shards(fewer_schools, 4)
+
+    assert all(reduced_assignment[school_id] == full_assignment[school_id] for school_id in fewer_schools)
+
+
+def test_row_assignment_balances_rows():
+    """
+    Given 20 schools with between 1 and 20 rows, 210 rows in total
+    When the schools are assigned to 3 shards balanced by row count
+    Then every shard has within a row of 70 rows
+    """
+    assignment = assign_shards(ROW_COUNTS, 3, ShardStrategy.ROWS)
+
+    shard_rows = [sum(ROW_COUNTS[school_id] for school_id, shard in assignment.items() if shard == index) for index in range(1, 4)]
+    assert max(shard_rows) - min(shard_rows) <= 2
+
+
+@pytest.mark.parametrize("shard_text", ["2", "0/3", "4/3", "a/b"])
+def test_shard_parse_rejects_invalid_shards(shard_text: str):
+    with pytest.raises(ValueError, match="Shard"):
+        Shard.parse(shard_text)
+
+
+def write_shard(shards_dir: Path, shard: Shard, school_ids: list[str], failed: tuple[str, ...] = ()) -> None:
+    """Write a finished shard with an empty docx report for each school"""
+    shard_dir = shards_dir / shard.directory_name
+    shard_dir.mkdir(parents=True)
+    manifest = ReportManifest.load(shard_dir)
+    for school_id in school_ids:
+        report_path = shard_dir / f"report_{school_id}.docx"
+        report_path.touch()
+        manifest.record_report(report_path, f"data_{school_id}", "template")
+    manifest.save()
+    write_shard_record(shard_dir, shard, ShardStrategy.HASH, "masterfile", school_ids, list(failed))
+
+
+def test_merge_shards_combines_reports_and_manifests(tmp_path: Path):
+    shards_dir = tmp_path / "schools_shards"
+    write_shard(shards_dir, Shard(1, 2), ["RRS1", "RRS3"])
+    write_shard(shards_dir, Shard(2, 2), ["RRS2"])
+    output_dir = tmp_path / "schools"
+
+    merged = merge_shards(shards_dir, output_dir, ["RRS1", "RRS2", "RRS3"], "masterfile")
+
+    assert merged == [output_dir / f"report_RRS{school_number}.docx" for school_number in range(1, 4)]
+    assert all(report_path.exists() for report_path in merged)
+    manifest = ReportManifest.load(output_dir)
+    assert manifest.report_is_current(output_dir / "report_RRS2.docx", "data_RRS2", "template")
+
+
+def test_merge_shards_only_merges_each_shards_schools(tmp_path: Path):
+    """
+    Given a shard directory that also has a report from an earlier run, for a school now assigned to another shard
+    When the shards are merged
+    Then only the reports of the schools recorded for each shard are merged
+    """
+    shards_dir = tmp_path / "schools_shards"
+    write_shard(shards_dir, Shard(1, 2), ["RRS1"])
+    write_shard(shards_dir, Shard(2, 2), ["RRS2"])
+    stale_dir = shards_dir / Shard(2, 2).directory_name
+    stale_manifest = ReportManifest.load(stale_dir)
+    (stale_dir / "report_RRS1.docx").write_text("stale")
+    stale_manifest.record_report(stale_dir / "report_RRS1.docx", "old_data_RRS1", "template")
+    stale_manifest.save()
+    output_dir = tmp_path / "schools"
+
+    merged = merge_shards(shards_dir, output_dir, ["RRS1", "RRS2"], "masterfile")
+
+    assert merged == [output_dir / "report_RRS1.docx", output_dir / "report_RRS2.docx"]
+    assert (output_dir / "report_RRS1.docx").read_text() == ""
+    assert ReportManifest.load(output_dir).report_is_current(output_dir / "report_RRS1.docx", "data_RRS1", "template")
+
+
+@pytest.mark.parametrize(
+    ("shards", "message"),
+    [
+        ({1: ["RRS1", "RRS2"]}, "Shards [2] of 2 have not finished"),
+        ({1: ["RRS1"], 2: ["RRS1", "RRS2"]}, "schools in several shards: ['RRS1']"),
+        ({1: ["RRS1"], 2: []}, "missing schools: ['RRS2']"),
+    ],
+)
+def test_merge_shards_checks_completeness(tmp_path: Path, shards: dict, message: str):
+    for index, school_ids in shards.items():
+        write_shard(tmp_path, Shard(index, 2), school_ids)
+
+    with pytest.raises(ShardMergeException) as error:
+        merge_shards(tmp_path, tmp_path / "schools", ["RRS1", "RRS2"], "masterfile")
+
+    assert message in error.value.message
+
+
+def test_merge_shards_rejects_failed_and_out_of_date_shards(tmp_path: Path):
+    write_shard(tmp_path, Shard(1, 1), ["RRS1", "RRS2"], failed=("RRS2",))
+
+    with pytest.raises(ShardMergeException, match="failed for schools"):
+        merge_shards(tmp_path, tmp_path / "schools", ["RRS1", "RRS2"], "masterfile")
+    with pytest.raises(ShardMergeException, match="different version of the masterfile"):
+        merge_shards(tmp_path, tmp_path / "schools", ["RRS1", "RRS2"], "changed masterfile")
+    assert json.loads((tmp_path / "shard_1_of_1" / SHARD_RECORD_FILE_NAME).read_text())["failed"] == ["RRS2"]
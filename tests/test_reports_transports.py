@@ -0,0 +1,147 @@
+import smtplib
+import socket
+
+import pytest
+from dynaconf import Dynaconf
+
+from rred_reports.reports.dispatcher import SendNotAttemptedError, is_ambiguous, is_retryable
+from rred_reports.reports.transports import SmtpConnectionPool, SmtpTransport
+
+
+@pytest.fixture()
+def mail_info() -> dict:
+    return {"school_label": "Test School", "mailing_list": ["teacher@school.org", "leader@school.org"]}
+
+
+@pytest.fixture()
+def reports_dir(data_path):
+    return data_path / "output" / "reports" / "2021" / "schools"
+
+
+@pytest.fixture()
+def smtp_transport(smtp_standin) -> SmtpTransport:
+    pool = SmtpConnectionPool(smtp_standin.host, smtp_standin.port, username="rred-sender", password="secret", size=2, timeout=5)
+    transport = SmtpTransport(pool, "rred@example.org")
+    yield transport
+    transport.close()
+
+
+def test_smtp_transport_reuses_pooled_connections(smtp_standin, smtp_transport, mail_info, reports_dir):
+    """
+    Given an SMTP transport with a pool of connections
+    When several batches of emails are sent one after another
+    Then every email is sent over a single connection, logged in once
+    """
+    message = smtp_transport.build_school_email("AAAAA", 2021, mail_info, "test_report.pdf", reports_dir)
+
+    for batch in range(3):
+        errors = smtp_transport.send_batch({f"school_{batch}_{number}": message for number in range(2)})
+        assert set(errors.values()) == {None}
+
+    assert smtp_standin.connections == 1
+    assert smtp_standin.logins == 1
+    assert len(smtp_standin.received) == 6
+    assert smtp_standin.received[0].subject == "Reading Recovery Annual Report for Test School 21-22"
+    assert smtp_standin.received[0].to_recipients == mail_info["mailing_list"]
+    assert smtp_standin.received[0].attachment_names == ["test_report.pdf"]
+
+
+def test_smtp_transport_returns_rejected_emails(smtp_standin, smtp_transport, reports_dir):
+    """
+    Given a batch of emails where the server permanently rejects one recipient and temporarily rejects another
+    When the batch is sent
+    Then each rejection is returned for its school, only the temporary one is retryable, and the other email is sent
+    """
+    smtp_standin.recipient_errors["unknown@school.org"] = "550 5.1.1 Unknown recipient"
+    smtp_standin.recipient_errors["busy@school.org"] = "451 4.3.0 Try again later"
+    messages = {
+        school_id: smtp_transport.build_school_email("AAAAA", 2021, {"school_label": school_id, "mailing_list": [recipient]}, "test.pdf", reports_dir)
+        for school_id, recipient in [("AAAAA", "unknown@school.org"), ("BBBBB", "busy@school.org"), ("CCCCC", "teacher@school.org")]
+    }
+
+    errors = smtp_transport.send_batch(messages)
+
+    assert isinstance(errors["AAAAA"], smtplib.SMTPRecipientsRefused)
+    assert not is_retryable(errors["AAAAA"])
+    assert is_retryable(errors["BBBBB"])
+    assert errors["CCCCC"] is None
+    assert [email.to_recipients for email in smtp_standin.received] == [["teacher@school.org"]]
+
+
+def test_smtp_transport_replaces_dropped_connection(smtp_standin, smtp_transport, mail_info, reports_dir):
+    """
+    Given a server that drops each connection after one email
+    When batches are sent one after another
+    Then the email sent over the dropped connection fails with an error that may have sent it, and the next batch opens
+        a new connection
+    """
+    smtp_standin.messages_per_connection = 1
+    message = smtp_transport.build_school_email("AAAAA", 2021, mail_info, "test_report.pdf", reports_dir)
+
+    first = smtp_transport.send_batch({"AAAAA": message})
+    dropped = smtp_transport.send_batch({"BBBBB": message})
+    retried = smtp_transport.send_batch({"BBBBB": message})
+
+    assert first == {"AAAAA": None}
+    assert is_ambiguous(dropped["BBBBB"])
+    assert not is_retryable(dropped["BBBBB"])
+    assert retried == {"BBBBB": None}
+    assert smtp_standin.connections == 2
+
+
+def test_smtp_transport_dropped_mid_batch_only_in_flight_email_ambiguous(smtp_standin, smtp_transport, mail_info, reports_dir):
+    """
+    Given a server that drops each connection after one email
+    When a batch of three emails is sent over a new connection
+    Then the first is sent, only the email in flight when the connection dropped may have been sent, and the last
+        is retryable as it was never attempted
+    """
+    smtp_standin.messages_per_connection = 1
+    message = smtp_transport.build_school_email("AAAAA", 2021, mail_info, "test_report.pdf", reports_dir)
+
+    errors = smtp_transport.send_batch({"AAAAA": message, "BBBBB": message, "CCCCC": message})
+
+    assert errors["AAAAA"] is None
+    assert is_ambiguous(errors["BBBBB"])
+    assert isinstance(errors["CCCCC"], SendNotAttemptedError)
+    assert is_retryable(errors["CCCCC"])
+    assert not is_ambiguous(errors["CCCCC"])
+
+
+def test_smtp_transport_unreachable_server_is_retryable(mail_info, reports_dir):
+    """
+    Given an SMTP server that isn't running
+    When a batch of emails is sent
+    Then every email is retryable rather than possibly sent, as none were attempted
+    """
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    transport = SmtpTransport(SmtpConnectionPool("127.0.0.1", port, timeout=5), "rred@example.org")
+    message = transport.build_school_email("AAAAA", 2021, mail_info, "test_report.pdf", reports_dir)
+
+    errors = transport.send_batch({"AAAAA": message, "BBBBB": message})
+
+    assert all(isinstance(error, SendNotAttemptedError) and is_retryable(error) and not is_ambiguous(error) for error in errors.values())
+
+
+def test_smtp_transport_login_refused_fails_every_email(smtp_standin, mail_info, reports_dir):
+    transport = SmtpTransport(SmtpConnectionPool(smtp_standin.host, smtp_standin.port, username="rred-sender", password="wrong"), "rred@example.org")
+    message = transport.build_school_email("AAAAA", 2021, mail_info, "test_report.pdf", reports_dir)
+
+    errors = transport.send_batch({"AAAAA": message, "BBBBB": message})
+
+    assert all(isinstance(error, smtplib.SMTPAuthenticationError) for error in errors.values())
+    assert not any(is_retryable(error) or is_ambiguous(error) for error in errors.values())
+    assert smtp_standin.received == []
+
+
+def test_smtp_transport_from_settings(smtp_standin):
+    settings = Dynaconf(SEND_EMAILS_AS="rred@example.org", SMTP={"host": smtp_standin.host, "port": smtp_standin.port, "username": "rred-sender"})
+
+    transport = SmtpTransport.from_settings(settings, pool_size=3)
+
+    assert transport.sender == "rred@example.org"
+    assert transport.pool.port == smtp_standin.port
+    assert transport.pool.username == "rred-sender"
+    assert transport.pool.starttls is False
@@ -0,0 +1,123 @@
+import pandas as pd
+import pytest
+
+from rred_reports.input_cache import clear_input_cache
+from rred_reports.reports.manifest import file_hash
+from rred_reports.validation import (
+    DATA_QUALITY_RULES,
+    VALIDATION_CACHE_FILE,
+    check_school_ids,
+    log_data_quality_issues,
+    log_school_id_inconsistencies,
+)
+
+
+@pytest.fixture()
+def dispatch_path(tmp_path):
+    clear_input_cache()
+    path = tmp_path / "dispatch_list.xlsx"
+    pd.DataFrame(
+        {
+            "UserID": ["teacher_1", "teacher_2", "teacher_3", "teacher_4"],
+            "RRED School ID": ["RRS1", "RRS2", "RRS3", "RRS4"],
+            "School Label": ["School 1", "School 2", "School 3", "School 4"],
+        }
+    ).to_excel(path, index=False)
+    yield path
+    clear_input_cache()
+
+
+def _pupils(rred_user_id: str, school_id: str, rrcp_school, survey: str, count: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "rred_user_id": [rred_user_id] * count,
+            "school_id": [school_id] * count,
+            "rrcp_school": [rrcp_school] * count,
+            "pupil_no": [f"{rred_user_id}_{pupil}_{survey}" for pupil in range(count)],
+            "entry_date": pd.Timestamp("2021-09-01"),
+            "exit_date": pd.Timestamp("2022-06-01"),
+        }
+    )
+
+
+def test_school_id_inconsistencies_found_for_each_teacher_and_school(dispatch_path):
+    """
+    Given a masterfile with many pupils for each teacher, where teacher_1 moved school, teacher_2 has an unnamed school
+        not matching the dispatch list, RRS3 has no pupils and RRS6 isn't in the dispatch list
+    When checking school IDs against the dispatch list
+    Then each inconsistency is reported once, no matter how many pupils each teacher has
+    """
+    masterfile = pd.concat(
+        [
+            _pupils("teacher_1", "RRS1", "School 1", "2021-22", 50),
+            _pupils("teacher_1", "RRS5", "School 5", "2021-22", 50),
+            _pupils("teacher_2", "RRS7", None, "2021-22", 50),
+            _pupils("teacher_4", "RRS4", "School 4", "2021-22", 50),
+            _pupils("teacher_5", "RRS6", "School 6", "2020-21", 50),
+        ],
+        ignore_index=True,
+    )
+
+    issues = {issue.title: issue.dataframe for issue in log_school_id_inconsistencies(masterfile, dispatch_path, 2021)}
+
+    assert list(issues) == ["multiple_ids", "school_mismatch", "not_in_masterfile", "not_in_dispatch_list"]
+    assert issues["multiple_ids"].to_dict("records") == [
+        {"rred_user_id": "teacher_1", "DL_RRED School ID": "RRS1", "DL_School Label": "School 1", "MF_school_id_1": "RRS1", "MF_school_id_2": "RRS5"},
+    ]
+    assert issues["school_mismatch"].to_dict("records") == [
+        {"DL_UserID": "teacher_2", "DL_RRED School ID": "RRS2", "DL_School Label": "School 2", "rred_user_id": "teacher_2", "MF_school_id": "RRS7"}
+    ]
+    assert issues["not_in_masterfile"]["DL_RRED School ID"].tolist() == ["RRS3"]
+    assert issues["not_in_dispatch_list"].to_dict("records") == [{"school_id": "RRS6", "in_current_survey": False}]
+
+
+def test_check_school_ids_skipped_for_unchanged_inputs(mocker, dispatch_path, tmp_path):
+    """
+    Given a masterfile and dispatch list that have been checked, writing an issues file
+    When checking them again, then after the issues file is deleted, then after the dispatch list changes
+    Then the second check is skipped, and the inputs are validated again in the last two checks
+    """
+    masterfile = _pupils("teacher_5", "RRS6", "School 6", "2021-22", 5)
+    masterfile_path = tmp_path / "masterfile.xlsx"
+    masterfile.to_excel(masterfile_path, index=False)
+    issues_path = tmp_path / "issues" / "2021_school_id_issues.xlsx"
+    validate = mocker.patch("rred_reports.validation.log_school_id_inconsistencies", wraps=log_school_id_inconsistencies)
+
+    check_school_ids(masterfile, file_hash(masterfile_path), dispatch_path, 2021, issues_path)
+    check_school_ids(masterfile, file_hash(masterfile_path), dispatch_path, 2021, issues_path)
+    calls_before_deleting = validate.call_count
+    issues_path.unlink()
+    check_school_ids(masterfile, file_hash(masterfile_path), dispatch_path, 2021, issues_path)
+    pd.DataFrame({"UserID": ["teacher_5"], "RRED School ID": ["RRS6"], "School Label": ["School 6"]}).to_excel(dispatch_path, index=False)
+    check_school_ids(masterfile, file_hash(masterfile_path), dispatch_path, 2021, issues_path)
+
+    assert calls_before_deleting == 1
+    assert validate.call_count == 3
+    assert issues_path.exists()
+    assert (issues_path.parent / VALIDATION_CACHE_FILE).exists()
+
+
+def test_data_quality_rules_on_text_columns():
+    """
+    Given masterfile rows read as text, as in an extract, with a follow-up test before exit, more lessons than school days
+        and text that isn't a score
+    When checking the data quality rules
+    Then only the follow-up test date and lesson count rows are flagged, and the text isn't treated as an invalid score
+    """
+    masterfile = _pupils("teacher_1", "RRS1", "School 1", "2021-22", 3)
+    masterfile["entry_dob"] = "2015-01-01"
+    masterfile["exit_date"] = ["2022-06-01", "2022-06-01", None]
+    masterfile["month3_testdate"] = ["2022-09-01", "2022-05-01", "2022-05-01"]
+    masterfile["month6_testdate"] = None
+    for rule in DATA_QUALITY_RULES:
+        for column in rule.columns:
+            if column not in masterfile:
+                masterfile[column] = "not assessed"
+    masterfile["exit_num_weeks"] = ["10", "10", "10"]
+    masterfile["exit_num_lessons"] = ["50", "51", None]
+
+    issues = {issue.title: issue.dataframe for issue in log_data_quality_issues(masterfile)}
+
+    assert list(issues) == ["month3_test_before_exit", "impossible_lesson_counts"]
+    assert issues["month3_test_before_exit"]["pupil_no"].tolist() == ["teacher_1_1_2021-22"]
+    assert issues["impossible_lesson_counts"]["pupil_no"].tolist() == ["teacher_1_1_2021-22"]